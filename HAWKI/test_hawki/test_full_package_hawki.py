@@ -63,9 +63,8 @@ class TestLoadUserCommands:
 
 @pytest.mark.slow
 class TestMakeOpticalTrain:
-    def test_works_seamlessly_for_hawki_package(self, capsys):
-        cmd = scopesim.UserCommands(use_instrument="HAWKI")
-        opt = scopesim.OpticalTrain(cmd)
+    def test_works_seamlessly_for_hawki_package(self, optical_train):
+        opt = optical_train("HAWKI")
         opt["detector_1024_window"].include = False
         opt["detector_array_list"].include = True
         opt.update()
@@ -141,16 +140,15 @@ class TestMakeOpticalTrain:
         ndit = opt.cmds["!OBS.ndit"]
         assert np.average(hdu[1].data) == approx(ndit * dit * 0.1, abs=0.5)
 
-    def test_system_transmission_is_similar_to_eso_etc(self):
+    def test_system_transmission_is_similar_to_eso_etc(self, optical_train):
         """
         A ~20% discrepency between the ESO and ScopeSim system throughputs
         """
 
         for filt_name in ["Y", "J", "H", "Ks", "BrGamma", "CH4"]:
 
-            cmd = scopesim.UserCommands(use_instrument="HAWKI")
-            cmd["!OBS.filter_name"] = filt_name
-            opt = scopesim.OpticalTrain(cmd)
+            opt = optical_train("HAWKI",
+                                properties={"!OBS.filter_name": filt_name})
             # TODO: Exclude if it is included?
             # opt["paranal_atmo_default_ter_curve"].include = False
 
@@ -249,11 +247,11 @@ class TestObserveOpticalTrain:
     @pytest.mark.xfail(reason="Apparently this is waaaaay off now.")
     @pytest.mark.parametrize("filter_name, bg_level",
                              [("J", 400), ("H", 2400), ("Ks", 1000)])
-    def test_background_is_similar_to_online_etc(self, filter_name, bg_level):
+    def test_background_is_similar_to_online_etc(self, filter_name, bg_level,
+                                                 optical_train):
 
-        cmd = scopesim.UserCommands(use_instrument="HAWKI")
-        cmd["!OBS.filter_name"] = filter_name
-        opt = scopesim.OpticalTrain(cmd)
+        opt = optical_train("HAWKI",
+                            properties={"!OBS.filter_name": filter_name})
 
         effects = {"paranal_atmo_default_ter_curve": True,
                    "vlt_mirror_list": False,
@@ -274,13 +272,11 @@ class TestObserveOpticalTrain:
 
         assert np.average(opt.image_planes[0].data) == approx(bg_level, rel=0.2)
 
-    def test_actually_produces_stars(self):
-        cmd = scopesim.UserCommands(use_instrument="HAWKI",
-                                    properties={"!OBS.dit": 360,
-                                                "!OBS.ndit": 10})
-        cmd.ignore_effects += ["detector_linearity"]
-
-        opt = scopesim.OpticalTrain(cmd)
+    def test_actually_produces_stars(self, optical_train):
+        opt = optical_train("HAWKI", properties={"!OBS.dit": 360,
+                                                 "!OBS.ndit": 10})
+        cmd = opt.cmds
+        opt["detector_linearity"].include = False
         src = scopesim.source.source_templates.star_field(10000, 5, 15, 440)
 
         # ETC gives 2700 e-/DIT for a 1s DET at airmass=1.2, pwv=2.5
@@ -27,13 +27,10 @@ class TestLoads:
 
     @pytest.mark.parametrize("themode",
                              ["img_lm", "img_n", "lss_l", "lss_m", "lss_n"])
-    def test_scopesim_loads_package(self, themode):
+    def test_scopesim_loads_package(self, themode, optical_train):
         """Load the configuration for all supported modes"""
-        cmd = scopesim.UserCommands(use_instrument="METIS",
-                                    set_modes=[themode])
-        assert isinstance(cmd, scopesim.UserCommands)
-
-        metis = scopesim.OpticalTrain(cmd)
+        metis = optical_train("METIS", [themode], copy_train=False)
+        assert isinstance(metis.cmds, scopesim.UserCommands)
         assert isinstance(metis, scopesim.OpticalTrain)
 
 
@@ -225,13 +222,11 @@ class TestTraceFile:
 @pytest.mark.slow
 class TestObserves:
     """Test basic observations for the main instrument modes"""
-    def test_something_comes_out_img_lm(self):
+    def test_something_comes_out_img_lm(self, optical_train):
         """Basic test for LM imaging"""
         src = star_field(100, 0, 10, width=10, use_grid=True)
 
-        cmds = scopesim.UserCommands(use_instrument="METIS",
-                                     set_modes=['img_lm'])
-        metis = scopesim.OpticalTrain(cmds)
+        metis = optical_train("METIS", ["img_lm"])
         metis['detector_linearity'].include = False
 
         metis.observe(src)
@@ -252,14 +247,11 @@ class TestObserves:
 
         assert mx > med + 3 * std
 
-    def test_something_comes_out_img_n(self):
+    def test_something_comes_out_img_n(self, optical_train):
         """Basic test for N imaging"""
         src = star_field(100, 0, 10, width=10, use_grid=True)
 
-        cmds = scopesim.UserCommands(use_instrument="METIS",
-                                     set_modes=["img_n"])
-
-        metis = scopesim.OpticalTrain(cmds)
+        metis = optical_train("METIS", ["img_n"])
         metis['chop_nod'].include = False
         #metis['detector_linearity'].include = False
 
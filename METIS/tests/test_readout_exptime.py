@@ -12,7 +12,7 @@ sim.rc.__config__["!SIM.file.local_packages_path"] = PKGS_DIR
 PLOTS = False
 
 
-def test_readout_exptime():
+def test_readout_exptime(optical_train):
     """Test whether giving exptime in readout() is respected.
 
     The implementation of Quantization and Autoexposure has lead
@@ -31,10 +31,9 @@ def test_readout_exptime():
     star = sim.source.source_templates.star()
     # Shift the source, so it can be detected through center_of_mass.
     star.shift(0.5, 1.0)
-    cmd_l = sim.UserCommands(use_instrument="METIS", set_modes=["img_lm"])
 
     # The first readout might ignore the exptime.
-    metis_l = sim.OpticalTrain(cmd_l)
+    metis_l = optical_train("METIS", ["img_lm"])
     metis_l["exposure_output"].set_mode("sum")
     metis_l["reference_pixel_mask"].include = False
     metis_l.observe(star, update=True)
@@ -44,7 +43,9 @@ def test_readout_exptime():
     result_first_copy = copy.deepcopy(result_first)
 
     # The second readout might not properly have the detector reset.
-    metis_l = sim.OpticalTrain(cmd_l)
+    # Build it from the same UserCommands as the first, not from a pristine
+    # copy, so the state they share is tested too.
+    metis_l = sim.OpticalTrain(metis_l.cmds)
     metis_l["exposure_output"].set_mode("sum")
     metis_l["reference_pixel_mask"].include = False
     metis_l.observe(star, update=True)
@@ -1,5 +1,54 @@
 import pytest
 
+from irdb.badges import BadgeReport
+from irdb.history import record_run
+from irdb.trains import TRAINS_DIR, OpticalTrainCache
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--pickle-trains",
+        action="store_true",
+        help="Reuse the optical_train fixture's trains in the next session.",
+    )
+
+
+def _is_xdist_worker(config) -> bool:
+    return hasattr(config, "workerinput")
+
+
+def pytest_sessionstart(session):
+    """Remove badge shards left over from an interrupted run."""
+    if _is_xdist_worker(session.config):
+        return
+    for path in BadgeReport().shard_dir.parent.glob("*/*.yaml"):
+        path.unlink()
+
+
+def pytest_sessionfinish(session):
+    """Merge the badge shards of all workers and record them in the history.
+
+    Every report (e.g. badges and performance) is merged into its own files.
+
+    See irdb.badges.BadgeReport and irdb.history.
+    """
+    if _is_xdist_worker(session.config):
+        return
+    for report in BadgeReport.merge_all_shards():
+        record_run(report.dic, report=report.yamlpath.stem)
+
+
+@pytest.fixture(name="optical_train", scope="session")
+def fixture_optical_train(request):
+    """Build (instrument, modes, properties) once, return deep copies.
+
+    >>> metis = optical_train("METIS", ["img_lm"], {"!OBS.dit": 1})
+
+    See irdb.trains.OpticalTrainCache.
+    """
+    pickle_trains = request.config.getoption("--pickle-trains")
+    return OpticalTrainCache(cache_dir=TRAINS_DIR if pickle_trains else None)
+
 
 @pytest.fixture(scope="session")
 def renew_badges():
@@ -2,9 +2,13 @@
 # -*- coding: utf-8 -*-
 """Everything to do with report badges and more."""
 
+import json
+import html
 import logging
+import tempfile
 from pathlib import Path
-from typing import TextIO
+from typing import TextIO, Optional
+from collections.abc import Sequence
 from numbers import Number
 from string import Template
 from datetime import datetime as dt, timezone
@@ -18,6 +22,7 @@ from astar_utils import NestedMapping
 UTC = timezone.utc
 
 PKG_DIR = Path(__file__).parent.parent
+SHARDS_DIRNAME = "shards"
 
 
 def _fix_badge_str(badge_str: str) -> str:
@@ -104,9 +109,70 @@ class BoolBadge(Badge):
 
 
 class NumBadge(Badge):
-    """Key-value Badge for numerical values, lightblue."""
+    """Key-value Badge for numerical values, colour based on budgets.
+
+    Numerical badges are lightblue, unless a budget ``(warn, limit)`` applies
+    to them (see `get_budget` and `set_budget`). Then they are green up to
+    `warn`, orange up to `limit` and red above.
+
+    Budgets apply to the badges in one section of every package, i.e. below
+    ``report[package][section]``. `budgets` holds them as
+    ``{section: {key: (warn, limit)}}``, `package_budgets` overrides them for
+    single packages as ``{package: {section: {key: (warn, limit)}}}``. They
+    are used for the performance badges, see ``irdb.performance``.
+    """
 
     colour = "lightblue"
+    budgets = {
+        "performance": {
+            "user_commands_s": (2, 10),
+            "optical_train_s": (20, 60),
+            "memory_peak_MiB": (250, 1000),
+            "effects": (40, 80),
+            "referenced_MiB": (4, 16),
+            "zip_MiB": (4, 16),
+            },
+        }
+    package_budgets = {
+        "MICADO": {"performance": {"referenced_MiB": (8, 32),
+                                   "zip_MiB": (8, 32)}},
+        "METIS": {"performance": {"referenced_MiB": (8, 32),
+                                  "zip_MiB": (8, 32)}},
+        }
+
+    @classmethod
+    def get_budget(cls, path: Sequence[str], key: str) -> Optional[tuple]:
+        """
+        Return the budget of a badge, None if there is none.
+
+        Parameters
+        ----------
+        path : sequence of str
+            Keys of the dictionaries containing the badge, starting at the
+            top level of the report, e.g. ``("METIS", "performance")``.
+        key : str
+            Key of the badge.
+
+        Returns
+        -------
+        budget : tuple or None
+            ``(warn, limit)``
+        """
+        if len(path) < 2:
+            return None
+        package, section = path[:2]
+        budgets = {**cls.budgets.get(section, {}),
+                   **cls.package_budgets.get(package, {}).get(section, {})}
+        return budgets.get(key)
+
+    def set_budget(self, warn, limit) -> None:
+        """Colour the badge according to the budget."""
+        if self.value <= warn:
+            self.colour = "green"
+        elif self.value <= limit:
+            self.colour = "orange"
+        else:
+            self.colour = "red"
 
 
 class StrBadge(Badge):
@@ -180,16 +246,35 @@ class BadgeReport(NestedMapping):
     test script. `BadgeReport` handles all ``logging.LogRecord`` objects in
     the final `.logs` list.
 
+    With pytest-xdist, every worker has its own fixture instances, so they
+    can't write to the same files. Instead, give each report a `shard` name
+    (e.g. the worker id), which writes the badges and logs to a shard file in
+    ``_REPORTS/shards/<yaml file name without suffix>`` at teardown. Once all
+    workers are done, combine the shards with `BadgeReport.merge_shards`, or
+    those of all reports with `BadgeReport.merge_all_shards`, e.g. in
+    ``pytest_sessionfinish``:
+
+    >>> with BadgeReport(shard=os.getenv("PYTEST_XDIST_WORKER", "main")):
+    >>>     ...
+    >>> BadgeReport.merge_all_shards()
+
     Parameters
     ----------
     filename : str, optional
         Name for yaml file, should end in '.yaml. The default is "badges.yaml".
     report_filename : str, optional
         Name for report file, should end in '.md'. The default is "badges.md".
+    extra_reports : sequence of str, optional
+        Names for the report in other formats, chosen by the suffix (see
+        `RENDERERS`). The default is ("badges.html", "badges.json"). The HTML
+        report doesn't need to load any badge images.
     logs_filename : str, optional
         Name for log file. The default is "badge_report_log.txt".
     save_logs : bool, optional
         Whether to output logs. The default is True.
+    shard : str, optional
+        If given, write a shard file with this prefix at teardown, instead of
+        the yaml, report and log files. The default is None.
 
     Attributes
     ----------
@@ -197,8 +282,12 @@ class BadgeReport(NestedMapping):
         Full path for yaml file.
     report_path : Path
         Full path for report file.
+    extra_report_paths : list of Path
+        Full paths for the reports in other formats.
     log_path : Path
         Full path for log file.
+    shard_dir : Path
+        Folder for shard files.
     logs : list of logging.LogRecord
         List of logging.LogRecord objects to be saved to `logs_filename`.
     """
@@ -207,8 +296,10 @@ class BadgeReport(NestedMapping):
         self,
         filename: str = "badges.yaml",
         report_filename: str = "badges.md",
+        extra_reports: Sequence[str] = ("badges.html", "badges.json"),
         logs_filename: str = "badge_report_log.txt",
         save_logs: bool = True,
+        shard: Optional[str] = None,
     ) -> None:
         logging.debug("REPORT INIT")
         base_path = Path(PKG_DIR, "_REPORTS")
@@ -217,12 +308,22 @@ class BadgeReport(NestedMapping):
         self.yamlpath = base_path / self.filename
         self.report_name = report_filename
         self.report_path = base_path / self.report_name
+        self.extra_report_paths = [base_path / name for name in extra_reports]
 
         self.save_logs = save_logs
         self.logs = []
         logs_name = logs_filename or "badge_report_log.txt"
         self.log_path = base_path / logs_name
 
+        self.shard = shard
+        self.shard_dir = base_path / SHARDS_DIRNAME / self.yamlpath.stem
+        # Stored in the shards, to merge them into the same files
+        self.files = {"filename": filename,
+                      "report_filename": report_filename,
+                      "extra_reports": list(extra_reports),
+                      "logs_filename": logs_filename,
+                      "save_logs": save_logs}
+
         super().__init__()
 
     def __enter__(self):
@@ -242,11 +343,88 @@ class BadgeReport(NestedMapping):
     def __exit__(self, exc_type, exc_value, exc_traceback):
         """Context manager teardown."""
         logging.debug("REPORT EXIT")
+        if self.shard is not None:
+            self.write_shard()
+        else:
+            self.write_all()
+        logging.debug("REPORT DONE")
+
+    def write_all(self) -> None:
+        """Write yaml, report and (if `save_logs`) log files."""
         self.write_yaml()
         self.generate_report()
         if self.save_logs:
             self.write_logs()
-        logging.debug("REPORT DONE")
+
+    def write_shard(self) -> Path:
+        """Dump badges and logs to a new file in `shard_dir`."""
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        # A worker can set up a module fixture more than once, so the shard
+        # name alone isn't unique.
+        fd, path = tempfile.mkstemp(".yaml", f"{self.shard}-", self.shard_dir)
+        logs = [[log.levelname, log.getMessage()] for log in self.logs]
+        with open(fd, "w", encoding="utf-8") as file:
+            yaml.dump({"badges": self.dic, "logs": logs,
+                       "files": self.files}, file, sort_keys=False)
+        return Path(path)
+
+    @classmethod
+    def merge_shards(cls, *args, **kwargs) -> Optional["BadgeReport"]:
+        """
+        Combine all shard files into one report, see class docstring.
+
+        The result doesn't depend on how the tests were distributed over the
+        workers: all keys are sorted and so are the log lines. If shards set
+        the same badge to different values, a warning is logged and the value
+        from the first shard file (by name) is kept. The shard files are
+        deleted after writing the yaml, report and log files.
+
+        Parameters
+        ----------
+        *args, **kwargs
+            Passed on to `BadgeReport`, except `shard`.
+
+        Returns
+        -------
+        report : BadgeReport or None
+            The merged report, or None if there were no shard files.
+        """
+        report = cls(*args, **kwargs)
+        paths = sorted(report.shard_dir.glob("*.yaml"))
+        if not paths:
+            return None
+        merged = {}
+        for path in paths:
+            with path.open(encoding="utf-8") as file:
+                shard = yaml.safe_load(file) or {}
+            _merge_badges(merged, shard.get("badges") or {}, path.name)
+            report.logs.extend(
+                logging.makeLogRecord({"levelname": levelname,
+                                       "msg": message, "message": message})
+                for levelname, message in shard.get("logs") or [])
+        report.dic = _sort_keys(merged)
+        report.logs.sort(key=lambda log: (log.message, log.levelname))
+        report.write_all()
+        for path in paths:
+            path.unlink()
+        return report
+
+    @classmethod
+    def merge_all_shards(cls) -> list["BadgeReport"]:
+        """Merge the shards of every report, see `merge_shards`.
+
+        The file names of each report are taken from its shards.
+        """
+        reports = []
+        shards_dir = Path(PKG_DIR, "_REPORTS", SHARDS_DIRNAME)
+        for shard_dir in sorted(shards_dir.glob("*/")):
+            paths = sorted(shard_dir.glob("*.yaml"))
+            if not paths:
+                continue
+            with paths[0].open(encoding="utf-8") as file:
+                files = (yaml.safe_load(file) or {}).get("files") or {}
+            reports.append(cls.merge_shards(**files))
+        return reports
 
     def write_logs(self) -> None:
         """Dump logs to file (`logs_filename`)."""
@@ -259,33 +437,321 @@ class BadgeReport(NestedMapping):
         dumpstr = yaml.dump(self.dic, sort_keys=False)
         self.yamlpath.write_text(dumpstr, encoding="utf-8")
 
-    def _make_preamble(self) -> str:
-        preamble = ("# IRDB Packages Report\n\n"
-                    f"**Created on UTC {dt.now(UTC):%Y-%m-%d %H:%M:%S}**\n\n"
-                    "For details on errors and conflicts, see badge report "
-                    "log file in this directory.\n\n")
-        return preamble
-
     def generate_report(self) -> None:
-        """Write markdown badge report to `report_filename`."""
-        if not self.report_path.suffix == ".md":
-            logging.warning(("Expected '.md' suffix for report file name, but "
-                             "found %s. Report file might not be readable."),
-                            self.report_path.suffix)
-        with self.report_path.open("w", encoding="utf-8") as file:
-            file.write(self._make_preamble())
-            make_entries(file, self.dic)
+        """Write the badge report to `report_filename` and `extra_reports`.
+
+        The format of each file is chosen by its suffix, see `RENDERERS`.
+        """
+        created = dt.now(UTC)
+        for path in [self.report_path, *self.extra_report_paths]:
+            renderer = RENDERERS.get(path.suffix)
+            if renderer is None:
+                logging.warning(("Expected one of the suffixes %s for report "
+                                 "file name, but found %s. Report file might "
+                                 "not be readable."),
+                                ", ".join(RENDERERS), path.suffix)
+                renderer = MarkdownRenderer
+            with path.open("w", encoding="utf-8") as file:
+                render(file, self.dic, renderer, created)
+
+
+def _merge_badges(target: dict, source: Mapping, shard_name: str) -> None:
+    stack = [(target, source)]
+    while stack:
+        target, source = stack.pop()
+        for key, value in source.items():
+            if isinstance(value, Mapping):
+                if not isinstance(target.get(key, {}), Mapping):
+                    logging.warning("Badge %s in %s conflicts with a value.",
+                                    key, shard_name)
+                    continue
+                stack.append((target.setdefault(key, {}), value))
+            elif key not in target:
+                target[key] = value
+            elif target[key] != value:
+                logging.warning("Badge %s in %s conflicts: %s != %s.", key,
+                                shard_name, value, target[key])
+
+
+def _sort_keys(entry):
+    if not isinstance(entry, Mapping):
+        return entry
+    return {key: _sort_keys(entry[key]) for key in sorted(entry, key=str)}
+
+
+OPEN, BADGE, CLOSE = "open", "badge", "close"
+
+
+def walk_entries(entry: Mapping, level: int = 0):
+    """
+    Yield the keys and values of a nested dictionary in order, iteratively.
+
+    Every sub-dictionary is announced by an ``OPEN`` event and ended by a
+    ``CLOSE`` event (with the same key and level), every other value is a
+    ``BADGE`` event. No recursion is used, so the depth is unlimited.
+
+    Parameters
+    ----------
+    entry : Mapping
+        Nested dictionary, e.g. ``BadgeReport.dic``.
+    level : int, optional
+        Level of the top-level keys. The default is 0.
+
+    Yields
+    ------
+    event : tuple
+        (kind, key, value, level), `value` is None for ``OPEN`` and ``CLOSE``.
+    """
+    if not isinstance(entry, Mapping):
+        return
+    stack = [(None, iter(entry.items()), level)]
+    while stack:
+        parent, items, sublevel = stack[-1]
+        for key, value in items:
+            if isinstance(value, Mapping):
+                yield OPEN, key, None, sublevel
+                stack.append((key, iter(value.items()), sublevel + 1))
+                break
+            yield BADGE, key, value, sublevel
+        else:
+            stack.pop()
+            if stack:
+                yield CLOSE, parent, None, sublevel - 1
+
+
+class ReportRenderer:
+    """Base class for report formats, see `render`.
+
+    Subclasses write the parts of a report to `stream` as the events of
+    `walk_entries` arrive, so the report is never kept in memory. All methods
+    do nothing by default.
 
+    Parameters
+    ----------
+    stream : TextIO
+        I/O stream to write the report to.
+    """
+
+    def __init__(self, stream: TextIO):
+        self.stream = stream
+        # Keys of the open sub-dictionaries, maintained by `render`
+        self.path = []
+
+    def make_badge(self, key: str, value) -> Badge:
+        """Return the badge of `key`, with its budget if one applies."""
+        badge = Badge(key, value)
+        if (isinstance(badge, NumBadge)
+                and (budget := NumBadge.get_budget(self.path, key))):
+            badge.set_budget(*budget)
+        return badge
+
+    def begin(self, created: dt) -> None:
+        """Write anything before the first entry."""
+
+    def open(self, key: str, level: int) -> None:
+        """Start the section of a sub-dictionary."""
+
+    def badge(self, key: str, value, level: int) -> None:
+        """Write one badge."""
+
+    def close(self, key: str, level: int) -> None:
+        """End the section of a sub-dictionary."""
+
+    def end(self) -> None:
+        """Write anything after the last entry."""
+
+
+class MarkdownRenderer(ReportRenderer):
+    """Markdown with shields.io badges, headers for the first levels."""
+
+    def begin(self, created: dt) -> None:
+        """Write title and creation date."""
+        self.stream.write("# IRDB Packages Report\n\n"
+                          f"**Created on UTC {created:%Y-%m-%d %H:%M:%S}**\n\n"
+                          "For details on errors and conflicts, see badge "
+                          "report log file in this directory.\n\n")
+
+    def open(self, key: str, level: int) -> None:
+        """Write header (up to level 2) or list item."""
+        self.stream.write("\n" + "  " * (level - 2))
+        if level > 2:
+            self.stream.write(f"* {key}: ")
+        else:
+            self.stream.write(
+                f"{'#' * (level + 2)} {key.title() if level else key}")
+
+    def badge(self, key: str, value, level: int) -> None:
+        """Write shields.io badge, as list item below level 1."""
+        self.stream.write("\n" + "  " * (level - 2))
+        if level > 1:
+            self.stream.write("* ")
+        self.make_badge(key, value).write(self.stream)
+
+
+class HTMLRenderer(ReportRenderer):
+    """Self-contained HTML, badges are styled spans instead of images."""
+
+    # The shields.io colours used by the badges, other names are CSS colours
+    colours = {
+        "green": "#97ca00",
+        "red": "#e05d44",
+        "orange": "#fe7d37",
+        "yellowgreen": "#a4a61d",
+        "lightgrey": "#9f9f9f",
+        "lightblue": "#4aa3df",
+        }
+    style = (
+        "body{font-family:sans-serif;margin:2em}"
+        "section{margin-left:1em}"
+        "ul{margin:0}"
+        ".badge{display:inline-flex;margin:2px;font-size:12px;"
+        "line-height:20px;border-radius:3px;overflow:hidden;color:#fff;"
+        "white-space:nowrap}"
+        ".badge span{padding:0 6px}"
+        ".badge .key{background:#555}"
+    )
+
+    def begin(self, created: dt) -> None:
+        """Write HTML head with style sheet, title and creation date."""
+        self.stream.write(
+            "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n"
+            "<meta charset=\"utf-8\">\n"
+            "<title>IRDB Packages Report</title>\n"
+            f"<style>{self.style}</style>\n</head>\n<body>\n"
+            "<h1>IRDB Packages Report</h1>\n"
+            f"<p><strong>Created on UTC {created:%Y-%m-%d %H:%M:%S}"
+            "</strong></p>\n"
+            "<p>For details on errors and conflicts, see badge report log "
+            "file in this directory.</p>\n")
+
+    def open(self, key: str, level: int) -> None:
+        """Start section with header (up to level 2) or list."""
+        key = html.escape(str(key))
+        if level > 2:
+            self.stream.write(f"<ul><li>{key}:\n")
+        else:
+            title = key.title() if level else key
+            self.stream.write(f"<section>\n<h{level + 2}>{title}"
+                              f"</h{level + 2}>\n")
+
+    def badge(self, key: str, value, level: int) -> None:
+        """Write badge as styled spans."""
+        badge = self.make_badge(key, value)
+        colour = self.colours.get(badge.colour, badge.colour)
+        self.stream.write("<span class=\"badge\">")
+        if not isinstance(badge, MsgOnlyBadge):
+            self.stream.write(
+                f"<span class=\"key\">{html.escape(str(key))}</span>")
+            key = value
+        self.stream.write(f"<span style=\"background:{colour}\">"
+                          f"{html.escape(str(key))}</span></span>\n")
+
+    def close(self, key: str, level: int) -> None:
+        """End section or list."""
+        self.stream.write("</li></ul>\n" if level > 2 else "</section>\n")
+
+    def end(self) -> None:
+        """Close the HTML document."""
+        self.stream.write("</body>\n</html>\n")
+
+
+class JSONRenderer(ReportRenderer):
+    """JSON object with the creation date and the badges.
+
+    The output is the same as ``json.dump(..., indent=2)``, but it is written
+    while the badges are traversed.
+    """
 
-def _get_nested_header(key: str, level: int) -> str:
-    if level > 2:
-        return f"* {key}: "
-    return f"{'#' * (level + 2)} {key.title() if level else key}"
+    def __init__(self, stream: TextIO):
+        super().__init__(stream)
+        # Number of items written in each open object
+        self._counts = []
+
+    def _key(self, key: str, level: int) -> None:
+        self.stream.write(",\n" if self._counts[-1] else "\n")
+        self._counts[-1] += 1
+        self.stream.write("  " * (level + 2) + json.dumps(str(key)) + ": ")
+
+    def begin(self, created: dt) -> None:
+        """Write creation date and start the badges object."""
+        self.stream.write("{\n  \"created\": "
+                          f"{json.dumps(created.isoformat())},\n"
+                          "  \"badges\": {")
+        self._counts.append(0)
+
+    def open(self, key: str, level: int) -> None:
+        """Start a nested object."""
+        self._key(key, level)
+        self.stream.write("{")
+        self._counts.append(0)
+
+    def badge(self, key: str, value, level: int) -> None:
+        """Write key and value."""
+        self._key(key, level)
+        self.stream.write(json.dumps(value, default=str))
+
+    def close(self, key: str, level: int) -> None:
+        """End a nested object."""
+        if self._counts.pop():
+            self.stream.write("\n" + "  " * (level + 2))
+        self.stream.write("}")
+
+    def end(self) -> None:
+        """End the badges and the outer object."""
+        self.close(None, -1)
+        self.stream.write("\n}\n")
+
+
+RENDERERS = {
+    ".md": MarkdownRenderer,
+    ".html": HTMLRenderer,
+    ".json": JSONRenderer,
+}
+
+
+def render(stream: TextIO, entry: Mapping,
+           renderer: type[ReportRenderer] = MarkdownRenderer,
+           created: Optional[dt] = None) -> None:
+    """
+    Write a complete report of a nested dictionary in a single pass.
+
+    Parameters
+    ----------
+    stream : TextIO
+        I/O stream to write the report to.
+    entry : Mapping
+        Nested dictionary of badges, e.g. ``BadgeReport.dic``.
+    renderer : type of ReportRenderer, optional
+        Report format. The default is MarkdownRenderer.
+    created : datetime, optional
+        Creation time shown in the report, defaults to now.
+
+    Returns
+    -------
+    None
+    """
+    writer = renderer(stream)
+    writer.begin(created or dt.now(UTC))
+    _write_entries(writer, entry)
+    writer.end()
+
+
+def _write_entries(writer: ReportRenderer, entry: Mapping,
+                   level: int = 0) -> None:
+    for kind, key, value, sublevel in walk_entries(entry, level):
+        if kind == OPEN:
+            writer.open(key, sublevel)
+            writer.path.append(key)
+        elif kind == BADGE:
+            writer.badge(key, value, sublevel)
+        else:
+            writer.path.pop()
+            writer.close(key, sublevel)
 
 
 def make_entries(stream: TextIO, entry, level=0) -> None:
     """
-    Recursively write lines of text from a nested dictionary to text stream.
+    Write lines of markdown badges from a nested dictionary to text stream.
 
     Parameters
     ----------
@@ -302,17 +768,4 @@ def make_entries(stream: TextIO, entry, level=0) -> None:
     -------
     None
     """
-    if not isinstance(entry, Mapping):
-        return
-
-    for key, value in entry.items():
-        stream.write("\n")
-        stream.write("  " * (level - 2))
-        if isinstance(value, Mapping):
-            stream.write(_get_nested_header(key, level))
-            # recursive
-            make_entries(stream, value, level=level+1)
-        else:
-            if level > 1:
-                stream.write("* ")
-            Badge(key, value).write(stream)
+    _write_entries(MarkdownRenderer(stream), entry, level)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Check all ``!ALIAS.key`` references of all instrument modes statically.
+
+Values like ``"!OBS.filter_name"`` or ``"!INST.pixel_scale"`` are only
+looked up when ScopeSim builds an optical train, so a typo shows up late in
+the integration tests. Here, the namespace of every mode of every
+observation package is built from the YAML files alone, like ScopeSim does:
+
+- ``default.yaml`` and the files listed under its ``yamls:``,
+- the ``yamls:`` and ``properties`` of the mode(s) in ``mode_yamls``,
+- ScopeSim's own ``defaults.yaml`` (the ``!SIM`` properties), which is read
+  from the installed package without importing it.
+
+The ``properties`` of every document with an ``alias`` are merged into
+``namespace[alias]``, and every ``!``-string in the loaded documents must
+name an existing (possibly nested) key in it.
+
+ScopeSim can combine modes, e.g. MICADO's "SCAO" (an ``instrument`` mode)
+with "IMG_4mas" (an ``observation`` mode). Each mode is checked together
+with those modes from the default ``modes`` that have a different
+``object`` type. Deprecated modes are skipped.
+
+Run from the IRDB root directory to check all packages::
+
+    python -m irdb.bangkeys [PKG ...]
+"""
+
+import argparse
+import importlib.util
+from pathlib import Path
+from typing import Optional
+from dataclasses import dataclass
+
+import yaml
+
+from irdb.references import FileIndex
+from irdb.utils import iter_references
+
+
+@dataclass
+class BangKeyIssue:
+    """A reference that can't be resolved in a mode.
+
+    `value` is the ``!``-string, or the name of a YAML file that wasn't
+    found. `yaml_file` is ``"PKG/file.yaml"``.
+    """
+
+    package: str
+    mode: str
+    yaml_file: str
+    location: str
+    value: str
+
+
+def scopesim_defaults() -> list:
+    """Documents of ScopeSim's defaults.yaml, empty if not installed."""
+    spec = importlib.util.find_spec("scopesim")
+    if spec is None or not spec.submodule_search_locations:
+        return []
+    path = Path(spec.submodule_search_locations[0], "defaults.yaml")
+    if not path.exists():
+        return []
+    with path.open(encoding="utf-8") as file:
+        return list(yaml.safe_load_all(file))
+
+
+def _merge(target: dict, source: dict) -> None:
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        elif isinstance(value, dict):
+            target[key] = {}
+            _merge(target[key], value)
+        else:
+            target[key] = value
+
+
+def _add_properties(namespace: dict, doc) -> None:
+    if isinstance(doc, dict) and "alias" in doc:
+        _merge(namespace.setdefault(doc["alias"], {}),
+               doc.get("properties") or {})
+
+
+def _add_bang_keys(namespace: dict, docs) -> None:
+    """Add keys set by effects, e.g. ``"!DET.mindit": 0.04`` in kwargs."""
+    stack = list(docs)
+    while stack:
+        entry = stack.pop()
+        if isinstance(entry, list):
+            stack.extend(entry)
+        elif isinstance(entry, dict):
+            for key, value in entry.items():
+                if isinstance(key, str) and key.startswith("!"):
+                    alias, *keys = key[1:].split(".")
+                    target = namespace.setdefault(alias, {})
+                    for subkey in keys[:-1]:
+                        target = target.setdefault(subkey, {})
+                    target.setdefault(keys[-1], value)
+                stack.append(value)
+
+
+def has_key(namespace: dict, bang_key: str) -> bool:
+    """True if ``!ALIAS.key[.subkey]`` exists in `namespace`."""
+    alias, *keys = bang_key[1:].split(".")
+    if alias not in namespace:
+        return False
+    value = namespace[alias]
+    for key in keys:
+        if not isinstance(value, dict) or key not in value:
+            return False
+        value = value[key]
+    return True
+
+
+def _modes(default_doc: dict) -> list[dict]:
+    modes = [mode for mode in default_doc.get("mode_yamls") or []
+             if isinstance(mode, dict) and "deprecate" not in mode]
+    if not modes:
+        return [{"name": "default"}]
+    return modes
+
+
+def mode_combinations(default_doc: dict) -> dict[str, list[dict]]:
+    """{mode_name: [modes used together]}, see module docstring."""
+    modes = _modes(default_doc)
+    default_names = (default_doc.get("properties") or {}).get("modes") or []
+    defaults = [mode for mode in modes if mode.get("name") in default_names]
+    return {mode["name"]: [other for other in defaults
+                           if other.get("object") != mode.get("object")]
+            + [mode] for mode in modes}
+
+
+class BangKeyChecker:
+    """Check the modes of packages, see module docstring.
+
+    Parameters
+    ----------
+    index : FileIndex, optional
+        Index of all packages, built from the shared catalog if not given.
+    """
+
+    def __init__(self, index: Optional[FileIndex] = None):
+        self.index = index or FileIndex()
+        self.defaults = scopesim_defaults()
+
+    def _load(self, yaml_name: str, search_path: list[str]):
+        """Return ("PKG/file.yaml", docs), docs is None if not found."""
+        location = self.index.locate(yaml_name, search_path)
+        if location is None:
+            return yaml_name, None
+        pkg_name, rel_path = location.split("/", 1)
+        return location, self.index.catalog[pkg_name].yaml_docs.get(rel_path)
+
+    def check_mode(self, pkg_name: str, mode_name: str,
+                   modes: list[dict]) -> list[BangKeyIssue]:
+        """Check one mode (with the modes it's combined with)."""
+        search_path = self.index.search_path(pkg_name)
+        default_docs = self.index.catalog[pkg_name].yaml_docs["default.yaml"]
+        yaml_names = list(default_docs[0].get("yamls") or [])
+        for mode in modes:
+            yaml_names.extend(mode.get("yamls") or [])
+
+        issues = []
+        # Only the active modes of default.yaml count
+        loaded = {f"{pkg_name}/default.yaml": [
+            {key: value for key, value in doc.items() if key != "mode_yamls"}
+            if isinstance(doc, dict) else doc for doc in default_docs]}
+        for yaml_name in dict.fromkeys(yaml_names):
+            location, docs = self._load(yaml_name, search_path)
+            if docs is None:
+                issues.append(BangKeyIssue(pkg_name, mode_name, location,
+                                           "yamls", yaml_name))
+            else:
+                loaded[location] = docs
+
+        namespace = {}
+        for doc in self.defaults:
+            _add_properties(namespace, doc)
+        for docs in loaded.values():
+            for doc in docs:
+                _add_properties(namespace, doc)
+        for mode in modes:
+            _add_properties(namespace, {"alias": "OBS", **mode})
+        for docs in loaded.values():
+            _add_bang_keys(namespace, docs)
+        _add_bang_keys(namespace, modes)
+
+        mode_docs = {f"{pkg_name}/default.yaml mode {mode['name']}": [mode]
+                     for mode in modes}
+        for location, docs in {**loaded, **mode_docs}.items():
+            for ref in iter_references(docs):
+                if ref.kind != "bang":
+                    continue
+                if not self.defaults and ref.value.startswith("!SIM."):
+                    continue
+                if not has_key(namespace, ref.value):
+                    issues.append(BangKeyIssue(pkg_name, mode_name, location,
+                                               ref.location, ref.value))
+        return issues
+
+    def check_package(self, pkg_name: str) -> list[BangKeyIssue]:
+        """Check all modes of an observation package.
+
+        Support packages (without ``default.yaml``) have no modes and are
+        only checked as part of the packages using them.
+        """
+        pkg_info = self.index.catalog[pkg_name]
+        docs = pkg_info.yaml_docs.get("default.yaml")
+        if not docs or not isinstance(docs[0], dict):
+            return []
+        issues = []
+        for mode_name, modes in mode_combinations(docs[0]).items():
+            issues.extend(self.check_mode(pkg_name, mode_name, modes))
+        return issues
+
+
+def check_packages(pkg_names: Optional[list[str]] = None,
+                   index: Optional[FileIndex] = None) -> list[BangKeyIssue]:
+    """Check all modes of `pkg_names`, defaults to all packages."""
+    checker = BangKeyChecker(index)
+    issues = []
+    for pkg_name in pkg_names or checker.index.catalog.names():
+        issues.extend(checker.check_package(pkg_name))
+    return issues
+
+
+def main():
+    """Execute bang-key check CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="bangkeys",
+        description=("List !ALIAS.key references that can't be resolved in "
+                     "the instrument modes."),
+    )
+    parser.add_argument(
+        "pkg_names",
+        nargs="*",
+        help="Packages to check. Default: all packages.",
+    )
+    args = parser.parse_args()
+    issues = check_packages(args.pkg_names)
+    for issue in issues:
+        print(f"{issue.package} [{issue.mode}] {issue.yaml_file} "
+              f"{issue.location}: {issue.value}")
+    print(f"{len(issues)} unresolved references.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Cached catalog of all IRDB packages, their files and YAML contents.
+
+The catalog holds, per package, the list of files with their sizes and
+sha256, the parsed documents of all YAML files, the filenames referenced in
+them and the ``packages:`` and ``yamls:`` lists declared in ``default.yaml``.
+
+It is stored in the user's cache folder (see `CACHE_DIR`) between runs. A
+package is brought up to date the first time it's accessed in a session:
+only files whose size or modification time changed are hashed (and parsed)
+again, so after the first run this costs little more than listing the files.
+
+>>> from irdb.catalog import get_catalog
+>>> catalog = get_catalog()
+>>> catalog["METIS"].packages
+['Armazones', 'ELT', 'METIS']
+>>> catalog["METIS"].glob("*.dat")[:1]
+[PosixPath('.../METIS/FPA_linearity_GeoSnap_high_capacity.dat')]
+"""
+
+import os
+import atexit
+import pickle
+import hashlib
+import logging
+import tempfile
+import multiprocessing
+from pathlib import Path
+from typing import Optional
+from dataclasses import dataclass, field
+
+import yaml
+
+from irdb.manifest import hash_file
+from irdb.utils import PKG_DIR, CACHE_DIR, iter_references
+
+# Bump when the cached classes change, older caches are then discarded
+CACHE_VERSION = 1
+
+_SPECIALS = {"irdb", "docs"}
+# Not part of the package, e.g. packages downloaded by example notebooks
+_EXCLUDED_DIRS = {"__pycache__", "inst_pkgs"}
+YAML_SUFFIXES = (".yaml", ".yml")
+
+
+@dataclass
+class FileInfo:
+    """Size, modification time (ns) and sha256 of a file."""
+
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+@dataclass
+class PackageInfo:
+    """Files and YAML contents of one package.
+
+    Paths (the keys of `files`, `yaml_docs` and `yaml_errors`) are POSIX
+    paths relative to the package folder.
+    """
+
+    name: str
+    path: Path
+    files: dict = field(default_factory=dict)
+    yaml_docs: dict = field(default_factory=dict)
+    yaml_errors: dict = field(default_factory=dict)
+
+    def glob(self, pattern: str) -> list[Path]:
+        """Return paths of files matching `pattern`, like ``Path.rglob``."""
+        return [self.path / rel_path for rel_path in self.files
+                if Path(rel_path).match(pattern)]
+
+    @property
+    def size(self) -> int:
+        """Total size of all files in bytes."""
+        return sum(info.size for info in self.files.values())
+
+    @property
+    def referenced_filenames(self) -> dict:
+        """{yaml_file: [filenames]}, see ``irdb.utils.iter_references``."""
+        return {rel_path: [ref.value for ref in iter_references(docs)
+                           if ref.kind == "file"]
+                for rel_path, docs in self.yaml_docs.items()}
+
+    def _default_yaml(self) -> dict:
+        docs = self.yaml_docs.get("default.yaml") or [{}]
+        return docs[0] if isinstance(docs[0], dict) else {}
+
+    @property
+    def packages(self) -> list:
+        """Packages declared under ``packages:`` in default.yaml."""
+        return self._default_yaml().get("packages") or []
+
+    @property
+    def yamls(self) -> list:
+        """YAML files declared under ``yamls:`` in default.yaml."""
+        return self._default_yaml().get("yamls") or []
+
+
+def _is_package_dir(path: Path) -> bool:
+    return (path.is_dir()
+            and not path.name.startswith((".", "_"))
+            and path.name not in _SPECIALS)
+
+
+def _iter_files(pkg_path: Path):
+    for dirpath, dirnames, filenames in os.walk(pkg_path):
+        dirnames[:] = sorted(name for name in dirnames
+                             if not name.startswith(".")
+                             and name not in _EXCLUDED_DIRS)
+        for filename in sorted(filenames):
+            if not filename.startswith("."):
+                yield Path(dirpath, filename)
+
+
+def _default_cache_path(pkg_dir: Path) -> Path:
+    key = hashlib.sha1(str(pkg_dir.resolve()).encode()).hexdigest()[:8]
+    return CACHE_DIR / f"catalog-{key}.pickle"
+
+
+class Catalog:
+    """Catalog of the packages in `pkg_dir`, see module docstring.
+
+    Parameters
+    ----------
+    pkg_dir : Path, optional
+        IRDB root folder. The default is this IRDB.
+    cache_path : Path, optional
+        Cache file, defaults to a file in `CACHE_DIR` specific to `pkg_dir`.
+        If False, nothing is cached on disk.
+    """
+
+    def __init__(self, pkg_dir: Path = PKG_DIR,
+                 cache_path: Optional[Path] = None):
+        self.pkg_dir = Path(pkg_dir)
+        self.cache_path = (_default_cache_path(self.pkg_dir)
+                           if cache_path is None else cache_path)
+        self._packages = self._load_cache()
+        self._fresh = set()
+        self._dirty = False
+
+    def _load_cache(self) -> dict:
+        if not self.cache_path or not self.cache_path.exists():
+            return {}
+        try:
+            with self.cache_path.open("rb") as file:
+                version, packages = pickle.load(file)
+        except Exception as err:
+            logging.warning("Ignoring unreadable catalog cache %s: %s",
+                            self.cache_path, err)
+            return {}
+        return packages if version == CACHE_VERSION else {}
+
+    def save(self) -> None:
+        """Write the catalog to its cache file, if anything changed."""
+        if not self.cache_path or not self._dirty:
+            return
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Unique name, several processes (e.g. pytest-xdist workers) may
+        # save at the same time, the last one wins.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_path.parent,
+                                        prefix=f".{self.cache_path.name}.",
+                                        suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump((CACHE_VERSION, self._packages), file,
+                            pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.cache_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        self._dirty = False
+
+    def names(self) -> list[str]:
+        """Sorted names of all packages."""
+        return sorted(path.name for path in self.pkg_dir.iterdir()
+                      if _is_package_dir(path))
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self) -> int:
+        return len(self.names())
+
+    def __contains__(self, pkg_name: str) -> bool:
+        return _is_package_dir(self.pkg_dir / pkg_name)
+
+    def __getitem__(self, pkg_name: str) -> PackageInfo:
+        if pkg_name not in self:
+            raise KeyError(pkg_name)
+        if pkg_name not in self._fresh:
+            self.refresh(pkg_name)
+        return self._packages[pkg_name]
+
+    def items(self):
+        """Yield (name, PackageInfo) for all packages."""
+        for pkg_name in self.names():
+            yield pkg_name, self[pkg_name]
+
+    def refresh(self, pkg_name: str) -> PackageInfo:
+        """Update a package, re-reading files with changed size or mtime."""
+        pkg_path = self.pkg_dir / pkg_name
+        old = self._packages.get(pkg_name) or PackageInfo(pkg_name, pkg_path)
+        new = PackageInfo(pkg_name, pkg_path)
+        for file in _iter_files(pkg_path):
+            rel_path = file.relative_to(pkg_path).as_posix()
+            stat = file.stat()
+            info = old.files.get(rel_path)
+            if (info is not None and info.size == stat.st_size
+                    and info.mtime_ns == stat.st_mtime_ns):
+                new.files[rel_path] = info
+                if rel_path in old.yaml_docs:
+                    new.yaml_docs[rel_path] = old.yaml_docs[rel_path]
+                if rel_path in old.yaml_errors:
+                    new.yaml_errors[rel_path] = old.yaml_errors[rel_path]
+                continue
+
+            new.files[rel_path] = FileInfo(stat.st_size, stat.st_mtime_ns,
+                                           hash_file(file))
+            if file.suffix.lower() in YAML_SUFFIXES:
+                try:
+                    with file.open(encoding="utf-8") as stream:
+                        new.yaml_docs[rel_path] = list(
+                            yaml.safe_load_all(stream))
+                except Exception as err:
+                    new.yaml_errors[rel_path] = f"{type(err).__name__}: {err}"
+
+        if new != old:
+            self._dirty = True
+        self._packages[pkg_name] = new
+        self._fresh.add(pkg_name)
+        return new
+
+
+_CATALOG = None
+_CATALOG_PID = None
+
+
+def _save_catalog() -> None:
+    # Worker processes (e.g. of irdb.publish.make_packages) leave that to
+    # the main process, also when they inherited the catalog by forking.
+    if (multiprocessing.parent_process() is not None
+            or os.getpid() != _CATALOG_PID):
+        return
+    _CATALOG.save()
+
+
+def get_catalog() -> Catalog:
+    """Return the catalog of this IRDB, shared within the session.
+
+    The catalog is saved to its cache file when the interpreter exits,
+    except in ``multiprocessing`` worker processes.
+    """
+    global _CATALOG, _CATALOG_PID
+    if _CATALOG is None:
+        _CATALOG = Catalog()
+        _CATALOG_PID = os.getpid()
+        atexit.register(_save_catalog)
+    return _CATALOG
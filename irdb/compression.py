@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Per-file compression policies for package archives, and a benchmark.
+
+A policy decides the compression method (and level) for each file that goes
+into a package archive, either by file name suffix or by a quick measurement
+of how well a sample of the file compresses. Policies can be picked by name
+from `POLICIES` or loaded from a yaml file like this:
+
+.. code-block:: yaml
+
+    default: deflate:6
+    suffixes:
+      .txt.gz: stored
+      .fits: lzma
+    probe: true
+
+Methods are given as ``"method[:level]"``, with method one of ``stored``,
+``deflate``, ``bzip2`` or ``lzma``.
+
+The benchmark can be run from the IRDB root directory like so::
+
+    python -m irdb.compression MICADO METIS VLT
+"""
+
+import zlib
+import argparse
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+from zipfile import ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA, ZipFile
+from tempfile import TemporaryDirectory
+from dataclasses import dataclass, field
+
+import yaml
+
+METHODS = {
+    "stored": ZIP_STORED,
+    "deflate": ZIP_DEFLATED,
+    "bzip2": ZIP_BZIP2,
+    "lzma": ZIP_LZMA,
+}
+
+# Files that are compressed already, nothing to gain by compressing again.
+COMPRESSED_SUFFIXES = (".gz", ".bz2", ".xz", ".zip", ".pdf", ".xlsx",
+                       ".png", ".jpg", ".jpeg", ".fz")
+
+
+def parse_method(spec: str) -> tuple[int, Optional[int]]:
+    """Parse ``"method[:level]"`` to (compress_type, compresslevel)."""
+    method, _, level = spec.partition(":")
+    try:
+        compress_type = METHODS[method.lower()]
+    except KeyError as err:
+        raise ValueError(
+            f"Unknown compression method '{method}', must be one of "
+            f"{list(METHODS)}.") from err
+    return compress_type, int(level) if level else None
+
+
+def _probe_ratio(file: Path, probe_size: int) -> float:
+    """Compressed/raw size ratio of a sample from start, middle and end."""
+    size = file.stat().st_size
+    if not size:
+        return 1.
+    chunk = max(probe_size // 3, 1)
+    sample = b""
+    with file.open("rb") as stream:
+        for offset in sorted({0, max(size // 2 - chunk // 2, 0),
+                              max(size - chunk, 0)}):
+            stream.seek(offset)
+            sample += stream.read(chunk)
+    return len(zlib.compress(sample, 1)) / len(sample)
+
+
+@dataclass(frozen=True)
+class CompressionPolicy:
+    """Decide the compression method per file.
+
+    Suffix rules take precedence (longest matching suffix wins), then the
+    compressibility probe (if enabled), then the default method.
+
+    Parameters
+    ----------
+    default : str
+        Method for files not matched otherwise. The default is "deflate",
+        which is what ``ZipFile`` uses without a policy.
+    suffixes : dict
+        {".suffix": "method[:level]"}, matched case-insensitively against the
+        end of the file name, so multi-part suffixes like ".txt.gz" work.
+    probe : bool
+        Whether to measure compressibility of files not matched by suffix.
+    probe_size : int
+        Total number of bytes sampled by the probe.
+    probe_ratio : float
+        Files with compressed/raw ratio of the sample above this get the
+        `incompressible` method.
+    incompressible : str
+        Method for files found incompressible by the probe.
+    """
+
+    default: str = "deflate"
+    suffixes: dict = field(default_factory=dict)
+    probe: bool = False
+    probe_size: int = 3 * 2**14
+    probe_ratio: float = 0.9
+    incompressible: str = "stored"
+
+    def choose(self, file: Path) -> tuple[int, Optional[int]]:
+        """Return (compress_type, compresslevel) for `file`."""
+        name = file.name.lower()
+        for suffix in sorted(self.suffixes, key=len, reverse=True):
+            if name.endswith(suffix.lower()):
+                return parse_method(self.suffixes[suffix])
+        if (self.probe
+                and _probe_ratio(file, self.probe_size) > self.probe_ratio):
+            return parse_method(self.incompressible)
+        return parse_method(self.default)
+
+    @classmethod
+    def from_yaml(cls, path: Path):
+        """Load policy from yaml file, keys as the class parameters."""
+        with Path(path).open(encoding="utf-8") as file:
+            return cls(**yaml.safe_load(file))
+
+
+_STORE_COMPRESSED = {suffix: "stored" for suffix in COMPRESSED_SUFFIXES}
+
+POLICIES = {
+    "default": CompressionPolicy(),
+    "fast": CompressionPolicy("deflate:1", _STORE_COMPRESSED),
+    "smart": CompressionPolicy("deflate:6", _STORE_COMPRESSED, probe=True),
+    "bzip2": CompressionPolicy("bzip2:9", _STORE_COMPRESSED),
+    "small": CompressionPolicy("lzma", _STORE_COMPRESSED),
+    "stored": CompressionPolicy("stored"),
+}
+
+
+def get_policy(name_or_path: str) -> CompressionPolicy:
+    """Return named policy from `POLICIES` or load it from a yaml file."""
+    if name_or_path in POLICIES:
+        return POLICIES[name_or_path]
+    if Path(name_or_path).is_file():
+        return CompressionPolicy.from_yaml(name_or_path)
+    raise ValueError(
+        f"'{name_or_path}' is neither a known compression policy "
+        f"({', '.join(POLICIES)}) nor a policy yaml file.")
+
+
+def benchmark(pkg_names: list[str],
+              policies: Optional[dict] = None) -> list[dict]:
+    """
+    Measure archive size, build time and extraction time per policy.
+
+    Archives are built in a temporary folder, `_ZIPPED_PACKAGES` and the
+    packages' version.yaml files are not touched.
+
+    Parameters
+    ----------
+    pkg_names : list of str
+        Names of the packages to build.
+    policies : dict, optional
+        {"name": CompressionPolicy}, defaults to `POLICIES`.
+
+    Returns
+    -------
+    results : list of dict
+        One row per package and policy, with keys "package", "policy",
+        "size" (bytes), "build" and "extract" (seconds).
+    """
+    # Imported here to avoid a circular import, publish uses this module.
+    from irdb.publish import zip_package_folder
+
+    policies = policies or POLICIES
+    results = []
+    with TemporaryDirectory() as tmpdir:
+        tmpdir = Path(tmpdir)
+        for pkg_name in pkg_names:
+            for name, policy in policies.items():
+                start = perf_counter()
+                zip_path = zip_package_folder(pkg_name, f"{pkg_name}.{name}",
+                                              policy=policy, zipped_dir=tmpdir)
+                build = perf_counter() - start
+
+                start = perf_counter()
+                with ZipFile(zip_path) as zip_file:
+                    zip_file.extractall(tmpdir / name)
+                extract = perf_counter() - start
+
+                results.append({"package": pkg_name, "policy": name,
+                                "size": zip_path.stat().st_size,
+                                "build": build, "extract": extract})
+    return results
+
+
+def _print_results(results: list[dict]) -> None:
+    print(f"{'package':<12} {'policy':<10} {'size [MB]':>10} "
+          f"{'build [s]':>10} {'extract [s]':>12}")
+    for row in results:
+        print(f"{row['package']:<12} {row['policy']:<10} "
+              f"{row['size'] / 2**20:>10.3f} {row['build']:>10.3f} "
+              f"{row['extract']:>12.3f}")
+
+
+def main():
+    """Execute compression benchmark CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="compression",
+        description=(
+            "Benchmark archive size, build time and extraction time of the "
+            "specified packages for each compression policy. This command "
+            "must be run from the IRDB root directory."
+        ),
+    )
+    parser.add_argument(
+        "pkg_names", nargs="+", help="Name(s) of the package(s)."
+    )
+    parser.add_argument(
+        "-p",
+        "--policies",
+        nargs="+",
+        default=list(POLICIES),
+        help="Policy names or yaml files to compare. Default: all named.",
+    )
+    args = parser.parse_args()
+    policies = {name: get_policy(name) for name in args.policies}
+    _print_results(benchmark(args.pkg_names, policies))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Find identical files across packages, and deduplicate them on disk.
+
+Many data files are copied between packages, e.g. ``TER_mirror_gold.dat``
+lives in METIS, HAWKI, JWST and MICADO. `find_duplicates` groups identical
+files by content (sha256) and reports the bytes wasted by the copies.
+
+For a local mirror with all packages extracted, `link_to_store` moves every
+file into a content-addressed blob store (``<store>/ab/cdef...``) and
+replaces it by a hard link to its blob, so identical files use the disk (and
+page cache) only once. Files in the mirror must then only ever be replaced
+(like ``irdb.delta.apply_delta`` does), never modified in place, because
+modifying one would change all its copies. The store must be on the same
+filesystem as the mirror.
+
+Run from the IRDB root directory to list the duplicates in all packages::
+
+    python -m irdb.dedup
+
+or to deduplicate a mirror of extracted packages::
+
+    python -m irdb.dedup path/to/inst_pkgs --link path/to/blob_store
+"""
+
+import os
+import logging
+import argparse
+from pathlib import Path
+from typing import Iterable
+from dataclasses import dataclass
+
+from irdb.manifest import hash_file
+from irdb.utils import get_packages
+
+
+@dataclass
+class DuplicateGroup:
+    """Identical files, see `find_duplicates`."""
+
+    sha256: str
+    size: int
+    files: list
+
+    @property
+    def wasted(self) -> int:
+        """Bytes used by all but one of the files."""
+        return self.size * (len(self.files) - 1)
+
+
+def _iter_files(paths: Iterable[Path]) -> Iterable[Path]:
+    for path in paths:
+        if path.is_file():
+            yield path
+            continue
+        for file in sorted(path.rglob("[!.]*")):
+            if file.is_file() and "__pycache__" not in file.parts:
+                yield file
+
+
+def find_duplicates(paths: Iterable[Path],
+                    min_size: int = 1) -> list[DuplicateGroup]:
+    """
+    Group identical files in `paths` (files or folders, searched recursively).
+
+    Only files of equal size can be identical, so files with a unique size
+    are never hashed.
+
+    Parameters
+    ----------
+    paths : Iterable of Path
+        Files and folders to search.
+    min_size : int, optional
+        Ignore files smaller than this (in bytes). The default is 1, i.e.
+        empty files are ignored.
+
+    Returns
+    -------
+    groups : list of DuplicateGroup
+        Groups of at least two identical files, the most wasteful first.
+    """
+    by_size = {}
+    for file in _iter_files(paths):
+        size = file.stat().st_size
+        if size >= min_size:
+            by_size.setdefault(size, []).append(file)
+
+    groups = {}
+    for size, files in by_size.items():
+        if len(files) < 2:
+            continue
+        for file in files:
+            sha256 = hash_file(file)
+            groups.setdefault(sha256, DuplicateGroup(sha256, size, []))
+            groups[sha256].files.append(file)
+
+    return sorted((group for group in groups.values()
+                   if len(group.files) > 1),
+                  key=lambda group: (-group.wasted, group.sha256))
+
+
+def blob_path(store: Path, sha256: str) -> Path:
+    """Path of the blob with content `sha256` in `store`."""
+    return store / sha256[:2] / sha256[2:]
+
+
+def link_to_store(paths: Iterable[Path], store: Path) -> int:
+    """
+    Replace all files in `paths` by hard links into the blob store.
+
+    Files that are already linked to their blob are skipped, so this can be
+    run again after new packages were extracted.
+
+    Parameters
+    ----------
+    paths : Iterable of Path
+        Files and folders (searched recursively) to deduplicate.
+    store : Path
+        Blob store folder, created if needed.
+
+    Returns
+    -------
+    saved : int
+        Bytes freed by replacing copies with links.
+    """
+    saved = 0
+    for file in _iter_files(paths):
+        blob = blob_path(store, hash_file(file))
+        if not blob.exists():
+            blob.parent.mkdir(parents=True, exist_ok=True)
+            os.link(file, blob)
+            continue
+        if os.path.samefile(file, blob):
+            continue
+        # Link next to the file first, so it is replaced atomically
+        tmp_path = file.with_name(f".{file.name}.link")
+        os.link(blob, tmp_path)
+        os.replace(tmp_path, file)
+        saved += blob.stat().st_size
+    logging.info("Linked files to blob store %s, saved %d bytes.",
+                 store, saved)
+    return saved
+
+
+def _print_report(groups: list[DuplicateGroup]) -> None:
+    for group in groups:
+        print(f"{len(group.files)} x {group.size / 2**10:.1f} kB, wasted "
+              f"{group.wasted / 2**10:.1f} kB, sha256 {group.sha256[:12]}")
+        for file in group.files:
+            print(f"    {file}")
+    total = sum(group.wasted for group in groups)
+    print(f"{len(groups)} duplicate groups, {total / 2**20:.2f} MB wasted.")
+
+
+def main():
+    """Execute deduplication CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="dedup",
+        description=(
+            "List groups of identical files and the bytes wasted by them. "
+            "Optionally replace them by hard links into a blob store."
+        ),
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        type=Path,
+        help=("Files or folders to search. Default: all IRDB packages, "
+              "except with --link."),
+    )
+    parser.add_argument(
+        "--min-size",
+        type=int,
+        default=1,
+        help="Ignore files smaller than this many bytes. Default: 1.",
+    )
+    parser.add_argument(
+        "--link",
+        type=Path,
+        default=None,
+        metavar="STORE",
+        help=(
+            "Replace all files by hard links into this blob store folder, "
+            "which must be on the same filesystem. Only for extracted "
+            "packages (e.g. a local mirror), not for the IRDB repository! "
+            "Requires explicit paths."
+        ),
+    )
+    args = parser.parse_args()
+    if args.link is not None and not args.paths:
+        # Never link the IRDB working tree, edits would change the blobs
+        parser.error("--link requires explicit paths.")
+    paths = args.paths or [path for _, path in sorted(get_packages())]
+    _print_report(find_duplicates(paths, args.min_size))
+    if args.link is not None:
+        saved = link_to_store(paths, args.link)
+        print(f"Saved {saved / 2**20:.2f} MB by linking to {args.link}.")
+
+
+if __name__ == "__main__":
+    main()
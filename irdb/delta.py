@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Delta packages between consecutive versions of a package.
+
+A delta archive contains only the files that were added or changed between
+a base and a target version of a package, plus a ``delta.yaml`` file with
+the list of deleted files and the sha256 of every file in both versions.
+Deltas are written to a ``deltas`` subfolder next to the compiled packages,
+e.g. ``_ZIPPED_PACKAGES/deltas/METIS.2024-01-01.dev_2024-02-01.dev.zip``.
+
+`apply_delta` turns a local extracted copy of the base version into the
+target version and verifies the result.
+"""
+
+import os
+import logging
+import hashlib
+from pathlib import Path
+from typing import Optional
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import yaml
+
+from irdb import manifest
+
+DELTA_DIR_NAME = "deltas"
+DELTA_YAML = "delta.yaml"
+
+
+def _file_hashes(zip_path: Path) -> dict:
+    """Return {path: sha256} for all files in a package archive.
+
+    Taken from the build manifest if there is one, otherwise the archive's
+    entries are hashed.
+    """
+    build_manifest = manifest.load_manifest(zip_path)
+    if build_manifest is not None:
+        return {path: entry["sha256"]
+                for path, entry in build_manifest["files"].items()}
+    with ZipFile(zip_path) as zip_file:
+        return {zinfo.filename: hashlib.sha256(
+                    zip_file.read(zinfo)).hexdigest()
+                for zinfo in zip_file.infolist() if not zinfo.is_dir()}
+
+
+def delta_name(base_zip: Path, target_zip: Path) -> str:
+    """Name of the delta archive from `base_zip` to `target_zip`."""
+    pkg_name, _, target_version = target_zip.stem.partition(".")
+    base_version = base_zip.stem.partition(".")[2]
+    return f"{pkg_name}.{base_version}_{target_version}.zip"
+
+
+def make_delta(base_zip: Path, target_zip: Path,
+               delta_dir: Optional[Path] = None) -> Path:
+    """
+    Create a delta archive from `base_zip` to `target_zip`.
+
+    Parameters
+    ----------
+    base_zip : Path
+        Compiled archive of the previous version.
+    target_zip : Path
+        Compiled archive of the new version.
+    delta_dir : Path, optional
+        Output folder, defaults to a "deltas" folder next to `target_zip`.
+
+    Returns
+    -------
+    delta_path : Path
+        Path of the delta archive.
+    """
+    base = _file_hashes(base_zip)
+    target = _file_hashes(target_zip)
+    changed = [path for path, sha256 in target.items()
+               if base.get(path) != sha256]
+    deleted = sorted(set(base) - set(target))
+
+    delta = {
+        "base": {"archive": base_zip.name,
+                 "sha256": manifest.hash_file(base_zip),
+                 "files": base},
+        "target": {"archive": target_zip.name,
+                   "sha256": manifest.hash_file(target_zip),
+                   "files": target},
+        "changed": changed,
+        "deleted": deleted,
+    }
+
+    delta_dir = delta_dir or target_zip.parent / DELTA_DIR_NAME
+    delta_dir.mkdir(exist_ok=True)
+    delta_path = delta_dir / delta_name(base_zip, target_zip)
+    with (ZipFile(target_zip) as src,
+          ZipFile(delta_path, "w", ZIP_DEFLATED) as dst):
+        dst.writestr(DELTA_YAML, yaml.safe_dump(delta, sort_keys=False))
+        for path in changed:
+            dst.writestr(src.getinfo(path), src.read(path))
+
+    logging.info("Delta %s: %d changed/added, %d deleted, %d bytes.",
+                 delta_path.name, len(changed), len(deleted),
+                 delta_path.stat().st_size)
+    return delta_path
+
+
+def _hash_local(path: Path) -> Optional[str]:
+    try:
+        return manifest.hash_file(path)
+    except FileNotFoundError:
+        return None
+
+
+def apply_delta(pkg_root: Path, delta_path: Path) -> dict:
+    """
+    Update an extracted package from the base to the target version.
+
+    Before anything is changed, all files touched by the delta are checked
+    against the base version (files already matching the target version are
+    accepted as well, so an interrupted update can simply be repeated).
+    Afterwards, every file of the target version is verified.
+
+    Parameters
+    ----------
+    pkg_root : Path
+        Folder containing the extracted package folder, i.e. the folder the
+        package archive was extracted into.
+    delta_path : Path
+        Path of the delta archive.
+
+    Raises
+    ------
+    ValueError
+        Raised if the local files don't match the base version before, or
+        the target version after applying the delta.
+
+    Returns
+    -------
+    delta : dict
+        Contents of the delta's yaml file.
+    """
+    with ZipFile(delta_path) as zip_file:
+        delta = yaml.safe_load(zip_file.read(DELTA_YAML))
+        base = delta["base"]["files"]
+        target = delta["target"]["files"]
+
+        mismatched = [
+            path for path in delta["changed"] + delta["deleted"]
+            if _hash_local(pkg_root / path) not in {base.get(path),
+                                                    target.get(path)}
+        ]
+        if mismatched:
+            raise ValueError(
+                f"Local package doesn't match {delta['base']['archive']}, "
+                f"can't apply delta. Mismatched files: {mismatched}")
+
+        for path in delta["deleted"]:
+            (pkg_root / path).unlink(missing_ok=True)
+        for path in delta["changed"]:
+            local_path = pkg_root / path
+            local_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = local_path.with_name(f".{local_path.name}.tmp")
+            tmp_path.write_bytes(zip_file.read(path))
+            os.replace(tmp_path, local_path)
+
+    mismatched = [path for path, sha256 in target.items()
+                  if _hash_local(pkg_root / path) != sha256]
+    if mismatched:
+        raise ValueError(
+            f"Package doesn't match {delta['target']['archive']} after "
+            f"applying delta. Mismatched files: {mismatched}")
+    return delta
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Dependency graph of the IRDB packages.
+
+Observation packages list the packages they need under ``packages:`` in
+their ``default.yaml``, e.g. MICADO needs Armazones, ELT, MORFEO and MICADO
+itself. `load_graph` collects these lists into a graph, `publish_waves`
+orders packages and their dependencies in waves, where each package only
+depends on packages in earlier waves, so all packages of a wave can be
+compiled and uploaded at the same time.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+from irdb.utils import get_packages
+
+
+def _packages_list(default_yaml: Path) -> list[str]:
+    with default_yaml.open(encoding="utf-8") as file:
+        for doc in yaml.safe_load_all(file):
+            if isinstance(doc, dict) and "packages" in doc:
+                return doc["packages"] or []
+    return []
+
+
+def load_graph(packages: Optional[dict] = None) -> dict[str, set[str]]:
+    """
+    Collect the dependencies of all packages.
+
+    Parameters
+    ----------
+    packages : dict, optional
+        {"package_name": path_to_package}, defaults to all IRDB packages.
+
+    Returns
+    -------
+    graph : dict
+        {"package_name": {"dependency", ...}}, for every package (packages
+        without ``default.yaml`` have no dependencies). Packages don't depend
+        on themselves.
+    """
+    packages = dict(get_packages()) if packages is None else packages
+    graph = {}
+    for pkg_name, pkg_path in packages.items():
+        default_yaml = Path(pkg_path) / "default.yaml"
+        deps = _packages_list(default_yaml) if default_yaml.exists() else []
+        graph[pkg_name] = set(deps) - {pkg_name}
+    return graph
+
+
+def with_dependencies(pkg_names: list[str],
+                      graph: dict[str, set[str]]) -> set[str]:
+    """
+    Return `pkg_names` and all their (indirect) dependencies.
+
+    Raises
+    ------
+    ValueError
+        Raised if a package or a dependency doesn't exist.
+    """
+    missing = {}
+    found = set()
+    todo = list(pkg_names)
+    while todo:
+        pkg_name = todo.pop()
+        if pkg_name in found:
+            continue
+        found.add(pkg_name)
+        for dep in graph.get(pkg_name, ()):
+            if dep not in graph:
+                missing.setdefault(dep, []).append(pkg_name)
+            todo.append(dep)
+    unknown = [pkg_name for pkg_name in pkg_names if pkg_name not in graph]
+    if unknown:
+        raise ValueError(f"Unknown package(s): {', '.join(unknown)}.")
+    if missing:
+        raise ValueError("Missing dependencies: " + "; ".join(
+            f"{dep} (needed by {', '.join(sorted(needed_by))})"
+            for dep, needed_by in sorted(missing.items())))
+    return found
+
+
+def _find_cycle(graph: dict[str, set[str]], pkg_names: set[str]) -> list:
+    """Return one dependency cycle among `pkg_names`, as a list of names."""
+    path = []
+    visiting = set()
+    done = set()
+
+    def visit(pkg_name):
+        path.append(pkg_name)
+        visiting.add(pkg_name)
+        for dep in sorted(graph[pkg_name] & pkg_names):
+            if dep in visiting:
+                return path[path.index(dep):] + [dep]
+            if dep not in done and (cycle := visit(dep)):
+                return cycle
+        visiting.discard(pkg_name)
+        done.add(pkg_name)
+        path.pop()
+        return None
+
+    for pkg_name in sorted(pkg_names):
+        if pkg_name not in done and (cycle := visit(pkg_name)):
+            return cycle
+    return []
+
+
+def publish_waves(pkg_names: list[str],
+                  graph: Optional[dict[str, set[str]]] = None,
+                  with_deps: bool = True) -> list[list[str]]:
+    """
+    Order packages in topological waves.
+
+    Every package only depends on packages in earlier waves. Packages within
+    a wave are sorted by name.
+
+    Parameters
+    ----------
+    pkg_names : list of str
+        Names of the packages.
+    graph : dict, optional
+        Dependency graph, defaults to `load_graph()`.
+    with_deps : bool, optional
+        Include all (indirect) dependencies of `pkg_names`. If False, only
+        `pkg_names` are ordered. The default is True.
+
+    Raises
+    ------
+    ValueError
+        Raised if a package or dependency is missing, or if the packages have
+        circular dependencies.
+
+    Returns
+    -------
+    waves : list of list of str
+    """
+    graph = load_graph() if graph is None else graph
+    if with_deps:
+        selected = with_dependencies(pkg_names, graph)
+    else:
+        selected = set(pkg_names)
+        unknown = selected - set(graph)
+        if unknown:
+            raise ValueError(
+                f"Unknown package(s): {', '.join(sorted(unknown))}.")
+
+    remaining = {pkg_name: graph[pkg_name] & selected
+                 for pkg_name in selected}
+    waves = []
+    while remaining:
+        wave = sorted(pkg_name for pkg_name, deps in remaining.items()
+                      if not deps)
+        if not wave:
+            cycle = _find_cycle(graph, set(remaining))
+            raise ValueError(
+                f"Circular package dependencies: {' -> '.join(cycle)}.")
+        waves.append(wave)
+        remaining = {pkg_name: deps.difference(wave)
+                     for pkg_name, deps in remaining.items()
+                     if pkg_name not in wave}
+    return waves
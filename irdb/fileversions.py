@@ -6,19 +6,36 @@ This is a temporary script file.
 """
 
 # import sys
-# import logging
 # from typing import TextIO
 # from io import StringIO
+import os
+import pickle
+import logging
+import argparse
+import tempfile
 import datetime as dt
 from pathlib import Path
-from dataclasses import dataclass
+from typing import Optional
+from collections import Counter
+from dataclasses import dataclass, fields, astuple
+from concurrent.futures import ProcessPoolExecutor
 
 import yaml
+from astropy.table import Table
+
+from irdb.catalog import get_catalog
+from irdb.manifest import hash_file
+from irdb.utils import PKG_DIR, CACHE_DIR
 
-# from astropy.table import Table
-from astropy.io import ascii as ioascii
 # import nbformat as nbf
 
+CHECKS_CACHE = CACHE_DIR / "datecheck.pickle"
+# Bump when DateCheck or check_file change, older caches are then discarded
+CHECKS_VERSION = 2
+
+# Use libyaml if available, much faster for the many small file headers
+FullLoader = getattr(yaml, "CFullLoader", yaml.FullLoader)
+
 
 @dataclass(order=True)
 class FileChange():
@@ -27,6 +44,67 @@ class FileChange():
     comment: str = ""
 
 
+@dataclass
+class DatHeader():
+    """Leading comment block and column names of a .dat file.
+
+    `comments` are the comment lines without the "#" and surrounding
+    whitespace, like in ``astropy.io.ascii``'s ``meta["comments"]``.
+    """
+
+    comments: list
+    colnames: list
+    n_rows: Optional[int] = None
+
+    @property
+    def meta(self) -> dict:
+        """The comments parsed as yaml."""
+        return yaml.load("\n".join(self.comments), Loader=FullLoader) or {}
+
+
+def read_header(file, count_rows: bool = False) -> DatHeader:
+    """
+    Read the comment header of a .dat file, without parsing the table.
+
+    The first line that is neither blank nor a comment holds the column
+    names. Comment lines after it are part of the header too (e.g. units
+    below the column names), like in ``astropy.io.ascii``. Reading stops
+    at the first data row, unless `count_rows` is True.
+
+    Parameters
+    ----------
+    file : Path
+        The .dat file.
+    count_rows : bool, optional
+        Also count the data rows (non-blank, non-comment lines after the
+        column names), which reads the whole file. The default is False.
+
+    Returns
+    -------
+    header : DatHeader
+    """
+    comments = []
+    colnames = []
+    n_rows = None
+    with open(file, encoding="utf-8", errors="replace") as stream:
+        for line in stream:
+            line = line.strip()
+            if line.startswith("#"):
+                comments.append(line[1:].strip())
+            elif line and colnames:
+                n_rows = 1  # first data row
+                break
+            elif line:
+                colnames = line.split()
+        if count_rows:
+            n_rows = (n_rows or 0) + sum(
+                1 for line in stream
+                if line.strip() and not line.lstrip().startswith("#"))
+        else:
+            n_rows = None
+    return DatHeader(comments, colnames, n_rows)
+
+
 @dataclass
 class IRDBFile():
     name: str
@@ -40,9 +118,9 @@ class IRDBFile():
 
     @classmethod
     def from_file(cls, file):
-        table = ioascii.read(file, format="basic", guess=False)
-        comments_str = "\n".join(table.meta["comments"])
-        meta = yaml.full_load(comments_str)
+        meta = read_header(file).meta
+        if not isinstance(meta, dict):
+            raise ValueError(f"Header of {file.name} is not a yaml mapping.")
         try:
             chgs = list(cls._parse_changes(meta["changes"]))
         except KeyError:
@@ -85,31 +163,208 @@ class IRDBFile():
                 msg = f"{date_modified=!s} earlier than {date_created=!s}"
                 raise ValueError(msg)
 
-if __name__ == "__main__":
-    files = list(IRDBFile.from_folder(Path("../")))
 
-    db = {"Data files": {}}
-    for f in files:
-        try:
-            f.validate_dates()
-            db["Data files"][f.name] = {"no_conflicts": True}
-        except ValueError as err:
-            msg = str(err).replace(" ", "_").replace("-", "--")
-            db["Data files"][f.name] = {msg: "error"}
+@dataclass
+class DateCheck():
+    """Result of validating the dates of one file, see `validate_files`.
+
+    `status` is "ok", "conflict" (`IRDBFile.validate_dates` failed),
+    "error" (the dates couldn't be compared) or "unreadable" (no valid
+    header).
+    """
+
+    file: str
+    status: str
+    reason: str = ""
+    date_created: Optional[dt.date] = None
+    date_modified: Optional[dt.date] = None
+    last_change: Optional[dt.date] = None
+
+
+def check_file(file: Path, name: Optional[str] = None) -> DateCheck:
+    """Validate the dates of one file, `name` defaults to the path."""
+    name = name or str(file)
+    try:
+        dat_file = IRDBFile.from_file(file)
+    except Exception as err:
+        return DateCheck(name, "unreadable", f"{type(err).__name__}: {err}")
+
+    check = DateCheck(name, "ok", "", dat_file.date_created,
+                      dat_file.date_modified)
+    try:
+        if dat_file.changes:
+            check.last_change = dat_file.last_change.date
+        dat_file.validate_dates()
+    except ValueError as err:
+        check.status, check.reason = "conflict", str(err)
+    except Exception as err:
+        check.status, check.reason = "error", f"{type(err).__name__}: {err}"
+    return check
+
 
-    # colnames = ["File", "Last modification"]
-    # data = [[f.name for f in files], [f.date_modified for f in files]]
-    # tbl = Table(names=colnames, data=data, copy=False)
+def _check_file(args) -> DateCheck:
+    return check_file(*args)
 
-    # nb = nbf.v4.new_notebook()
-    # text = """\
-    # # My first automatic Jupyter Notebook
-    # This is an auto-generated notebook."""
 
+def _load_checks(cache_path) -> dict:
+    if not cache_path or not cache_path.exists():
+        return {}
+    try:
+        with cache_path.open("rb") as file:
+            version, checks = pickle.load(file)
+    except Exception as err:
+        logging.warning("Ignoring unreadable cache %s: %s", cache_path, err)
+        return {}
+    return checks if version == CHECKS_VERSION else {}
 
-    # nb["cells"] = [nbf.v4.new_markdown_cell(text),
-    #                nbf.v4.new_markdown_cell(tbl.show_in_notebook().data)]
-    # fname = "test.ipynb"
 
-    # with open(fname, "w") as f:
-    #     nbf.write(nb, f)
+def _file_exists(name: str) -> bool:
+    """Whether the file of a cached check still exists.
+
+    Names are either paths, as given to `validate_files`, or
+    "PKG/path.dat" relative to the packages folder.
+    """
+    return Path(name).exists() or (PKG_DIR / name).exists()
+
+
+def _save_checks(cache_path, checks: dict) -> None:
+    """Save `checks`, without those of files that were deleted."""
+    checks = {key: check for key, check in checks.items()
+              if _file_exists(key[0])}
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique name, e.g. every pytest-xdist worker saves its results
+    fd, tmp_path = tempfile.mkstemp(dir=cache_path.parent,
+                                    prefix=f".{cache_path.name}.",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump((CHECKS_VERSION, checks), file,
+                        pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def _update_checks(cache_path, checks: dict) -> None:
+    """Add `checks` to the cache, replacing older results of their files.
+
+    The cache is read again first, to keep the results that other
+    processes saved in the meantime.
+    """
+    names = {name for name, _ in checks}
+    merged = {key: check for key, check in _load_checks(cache_path).items()
+              if key[0] not in names}
+    merged.update(checks)
+    _save_checks(cache_path, merged)
+
+
+def _dat_files() -> dict:
+    """{"PKG/path.dat": (path, sha256)} of all packages, from the catalog."""
+    catalog = get_catalog()
+    return {f"{pkg_name}/{rel_path}": (pkg_info.path / rel_path, info.sha256)
+            for pkg_name, pkg_info in catalog.items()
+            for rel_path, info in pkg_info.files.items()
+            if rel_path.endswith(".dat")}
+
+
+def validate_files(files: Optional[list[Path]] = None, jobs: int = 0,
+                   cache_path=CHECKS_CACHE) -> list[DateCheck]:
+    """
+    Validate the dates of many files, in parallel and cached.
+
+    Results are cached by file name and content hash, so repeated runs only
+    read the files that changed. Checking some `files` keeps the cached
+    results of all other files.
+
+    Parameters
+    ----------
+    files : list of Path, optional
+        Files to check. The default is all .dat files of all packages, whose
+        hashes are taken from the package catalog.
+    jobs : int, optional
+        Number of worker processes for the files not in the cache. The
+        default is 0, which uses one per CPU. 1 checks the files serially.
+    cache_path : Path, optional
+        Cache file, in the user's cache folder by default. If None, nothing
+        is cached.
+
+    Returns
+    -------
+    checks : list of DateCheck
+        Sorted by file name.
+    """
+    if files is None:
+        entries = _dat_files()
+    else:
+        entries = {str(file): (file, hash_file(file)) for file in files}
+
+    cached = _load_checks(cache_path)
+    checks = {}
+    todo = []
+    for name, (file, sha256) in entries.items():
+        if (name, sha256) in cached:
+            checks[name, sha256] = cached[name, sha256]
+        else:
+            todo.append((name, sha256, file))
+
+    args = [(file, name) for name, _, file in todo]
+    jobs = jobs or os.cpu_count() or 1
+    if jobs > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            results = list(pool.map(_check_file, args, chunksize=16))
+    else:
+        results = [_check_file(arg) for arg in args]
+    for (name, sha256, _), check in zip(todo, results):
+        checks[name, sha256] = check
+
+    if cache_path and todo:
+        _update_checks(cache_path, checks)
+    return sorted(checks.values(), key=lambda check: check.file)
+
+
+def results_table(checks: list[DateCheck]) -> Table:
+    """Return the checks as a table, with dates as ISO strings."""
+    names = [fld.name for fld in fields(DateCheck)]
+    rows = [["" if value is None else str(value)
+             for value in astuple(check)] for check in checks]
+    return Table(rows=rows or None, names=names, dtype=[str] * len(names))
+
+
+def main():
+    """Execute date validation CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="fileversions",
+        description=("Check the date_created, date_modified and changes "
+                     "headers of all .dat files."),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=0,
+        help=("Number of worker processes. The default is 0, one per CPU. "
+              "Use 1 to check the files serially."),
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=Path,
+        default=None,
+        help=("Write the results table to this file, in a format given by "
+              "its extension, e.g. .ecsv or .csv."),
+    )
+    args = parser.parse_args()
+    checks = validate_files(jobs=args.jobs)
+    for check in checks:
+        if check.status != "ok":
+            print(f"{check.file}: {check.status}: {check.reason}")
+    counts = Counter(check.status for check in checks)
+    print(", ".join(f"{count} {status}"
+                    for status, count in sorted(counts.items())))
+    if args.output is not None:
+        results_table(checks).write(args.output, overwrite=True)
+
+
+if __name__ == "__main__":
+    main()
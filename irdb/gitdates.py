@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Compare the ``date_modified`` headers with the git history.
+
+`IRDBFile.validate_dates` only checks that a file's header is consistent
+in itself, it can't tell if the file was changed without updating the
+header. Here, the date of the last commit of every file is collected in a
+single ``git log --name-only`` pass (newest first, so the first time a path
+shows up is its last commit) and compared with the ``date_modified`` in the
+header of every .dat and .yaml file of the packages.
+
+Commit dates are author dates, which survive rebases. In a shallow clone,
+all files older than the cut-off seem to be changed in the oldest commit,
+so a warning is logged.
+
+Run from the IRDB root directory to list the stale headers::
+
+    python -m irdb.gitdates [--tolerance DAYS]
+"""
+
+import logging
+import argparse
+import subprocess
+import datetime as dt
+from pathlib import Path
+from typing import Optional
+from dataclasses import dataclass
+
+from irdb.catalog import Catalog, get_catalog
+from irdb.fileversions import read_header
+from irdb.utils import PKG_DIR
+
+SUFFIXES = (".dat", ".yaml")
+# Commit lines in the git log output start with a NUL character
+_COMMIT_FORMAT = "%x00%aI"
+
+
+@dataclass
+class StaleHeader:
+    """A file committed after the date in its header."""
+
+    file: str
+    date_modified: dt.date
+    last_commit: dt.date
+
+    @property
+    def days(self) -> int:
+        """Days between the header date and the last commit."""
+        return (self.last_commit - self.date_modified).days
+
+
+def last_commit_dates(repo: Path = PKG_DIR,
+                      pathspecs: tuple = ()) -> dict[str, dt.date]:
+    """
+    Return {path: date of the last commit} from one ``git log`` pass.
+
+    Parameters
+    ----------
+    repo : Path, optional
+        The git repository, this IRDB by default.
+    pathspecs : tuple of str, optional
+        Limit the log to these git pathspecs, e.g. ``("*.dat",)``.
+
+    Returns
+    -------
+    dates : dict
+        Paths are relative to `repo`, in POSIX form.
+    """
+    if subprocess.run(["git", "rev-parse", "--is-shallow-repository"],
+                      cwd=repo, capture_output=True, text=True,
+                      check=True).stdout.strip() == "true":
+        logging.warning("Shallow clone, commit dates of old files are wrong.")
+
+    command = ["git", "-c", "core.quotepath=off", "log", "--name-only",
+               "--relative", f"--format={_COMMIT_FORMAT}", "--", *pathspecs]
+    dates = {}
+    date = None
+    with subprocess.Popen(command, cwd=repo, stdout=subprocess.PIPE,
+                          text=True, encoding="utf-8") as process:
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            if line.startswith("\x00"):
+                date = dt.date.fromisoformat(line[1:11])
+            elif line:
+                dates.setdefault(line, date)
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return dates
+
+
+def header_date(file: Path, yaml_docs: Optional[list] = None):
+    """Return ``date_modified`` from the header of a .dat or .yaml file."""
+    if yaml_docs is not None:
+        meta = yaml_docs[0] if yaml_docs else None
+    else:
+        meta = read_header(file).meta
+    if not isinstance(meta, dict):
+        return None
+    date = meta.get("date_modified")
+    return date if isinstance(date, dt.date) else None
+
+
+def find_stale_headers(tolerance: int = 0,
+                       catalog: Optional[Catalog] = None) -> list[StaleHeader]:
+    """
+    List files of all packages committed after their ``date_modified``.
+
+    Parameters
+    ----------
+    tolerance : int, optional
+        Days a commit may be later than the header date, e.g. for reviews.
+        The default is 0.
+    catalog : Catalog, optional
+        Catalog of the packages, its folder must be in a git repository.
+        Defaults to the catalog of this IRDB.
+
+    Returns
+    -------
+    stale : list of StaleHeader
+        Sorted by file name. Files without a ``date_modified`` header and
+        files not committed yet are ignored.
+    """
+    catalog = catalog or get_catalog()
+    commits = last_commit_dates(catalog.pkg_dir,
+                                tuple(f"*{sfx}" for sfx in SUFFIXES))
+    stale = []
+    for pkg_name, pkg_info in catalog.items():
+        for rel_path in pkg_info.files:
+            last_commit = commits.get(f"{pkg_name}/{rel_path}")
+            if not rel_path.endswith(SUFFIXES) or last_commit is None:
+                continue
+            file = pkg_info.path / rel_path
+            try:
+                date = header_date(file, pkg_info.yaml_docs.get(rel_path)
+                                   if rel_path.endswith(".yaml") else None)
+            except Exception as err:
+                logging.debug("Can't read header of %s: %s", file, err)
+                continue
+            if date is not None and (last_commit - date).days > tolerance:
+                stale.append(StaleHeader(f"{pkg_name}/{rel_path}", date,
+                                         last_commit))
+    return sorted(stale, key=lambda header: header.file)
+
+
+def main():
+    """Execute stale header CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="gitdates",
+        description=("List .dat and .yaml files committed after the "
+                     "date_modified in their header."),
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=int,
+        default=0,
+        metavar="DAYS",
+        help="Ignore commits at most this many days late. Default: 0.",
+    )
+    args = parser.parse_args()
+    stale = find_stale_headers(args.tolerance)
+    for header in stale:
+        print(f"{header.file}: date_modified {header.date_modified}, last "
+              f"commit {header.last_commit} ({header.days} days later)")
+    print(f"{len(stale)} stale headers.")
+
+
+if __name__ == "__main__":
+    main()
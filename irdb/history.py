@@ -0,0 +1,410 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Keep the badges of every badge report run in an append-only database.
+
+`BadgeReport` overwrites ``_REPORTS/badges.yaml`` with every run. Here, every
+run is appended to an SQLite database (``_REPORTS/history.sqlite`` by
+default), keyed by the report (e.g. "badges" or "performance", see
+conftest.py), commit and time of the run. Each badge is stored as one row
+with its package, metric and value, e.g.
+
+======= ========================================== =======
+package metric                                     value
+======= ========================================== =======
+METIS   performance/modes/lss_n/optical_train_s    12.3
+METIS   structure/self_named_yaml                  found
+======= ========================================== =======
+
+The metric is the path of the badge below the package, joined with "/"
+(file and mode names can contain dots). Numbers and strings are stored in
+separate columns. Triggers reject any update or deletion of stored runs.
+
+Every (package, metric) pair is stored once in the ``metrics`` table, the
+values are keyed by (metric id, run id). Trend queries select the metrics by
+package and name (indexed) and then read the values in time order straight
+from the primary key, so they stay fast (and the file small) with thousands
+of runs. Queries only compare runs of the same report, as every test session
+records one run per report.
+
+The history is recorded after every badge test session (see conftest.py).
+Run from the IRDB root directory to query it::
+
+    python -m irdb.history regressions [--window 10] [--tolerance 0.1]
+    python -m irdb.history trend METIS "performance/modes/lss_n/*"
+    python -m irdb.history jumps METIS "*/lss_n/optical_train_s"
+    python -m irdb.history record [_REPORTS/badges.yaml] [--report badges]
+"""
+
+import sqlite3
+import argparse
+import subprocess
+import statistics
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Optional
+from datetime import datetime as dt, timezone
+from dataclasses import dataclass
+from collections.abc import Mapping
+
+import yaml
+
+from irdb.utils import PKG_DIR
+
+# After 3.11, can just import UTC directly from datetime
+UTC = timezone.utc
+
+HISTORY_DB = PKG_DIR / "_REPORTS" / "history.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    commit_hash TEXT,
+    created TEXT NOT NULL,
+    report TEXT NOT NULL DEFAULT 'badges'
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY,
+    package TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    UNIQUE (package, metric)
+);
+CREATE TABLE IF NOT EXISTS badges (
+    metric_id INTEGER NOT NULL REFERENCES metrics(id),
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    number REAL,
+    text TEXT,
+    PRIMARY KEY (metric_id, run_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS runs_created ON runs(created);
+CREATE INDEX IF NOT EXISTS metrics_metric ON metrics(metric);
+CREATE INDEX IF NOT EXISTS badges_run ON badges(run_id);
+"""
+# After adding the report column to databases created without it
+INDEXES = """
+CREATE INDEX IF NOT EXISTS runs_report ON runs(report, id);
+"""
+_READ_ONLY_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {table}_no_{action} BEFORE {action} ON {table}
+BEGIN SELECT RAISE(ABORT, 'The badge history is append-only.'); END;
+"""
+
+
+@dataclass
+class Regression:
+    """The last value of a metric compared to the median before it."""
+
+    package: str
+    metric: str
+    value: float
+    median: float
+
+    @property
+    def ratio(self) -> float:
+        """Last value divided by the median."""
+        return self.value / self.median if self.median else float("inf")
+
+
+def connect(db_path: Path = HISTORY_DB) -> sqlite3.Connection:
+    """Open (and create if needed) the history database."""
+    connection = sqlite3.connect(db_path)
+    connection.executescript(SCHEMA + "".join(
+        _READ_ONLY_TRIGGER.format(table=table, action=action)
+        for table in ("runs", "metrics", "badges")
+        for action in ("UPDATE", "DELETE")))
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(runs)")]
+    if "report" not in columns:
+        # Runs recorded before there were several reports
+        connection.execute("ALTER TABLE runs ADD COLUMN "
+                           "report TEXT NOT NULL DEFAULT 'badges'")
+    connection.executescript(INDEXES)
+    return connection
+
+
+@contextmanager
+def _transaction(db_path: Path):
+    connection = connect(db_path)
+    try:
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def current_commit(repo: Path = PKG_DIR) -> Optional[str]:
+    """Hash of the checked out commit, None if not in a git repository."""
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo,
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def flatten_badges(badges: Mapping):
+    """Yield (package, metric, value) for every badge in a report dict."""
+    for package, entry in badges.items():
+        stack = [((), entry)]
+        while stack:
+            path, entry = stack.pop()
+            if isinstance(entry, Mapping):
+                stack.extend((path + (str(key),), value)
+                             for key, value in reversed(entry.items()))
+            else:
+                yield str(package), "/".join(path), entry
+
+
+def record_run(badges: Mapping, commit: Optional[str] = None,
+               created: Optional[dt] = None,
+               db_path: Path = HISTORY_DB, report: str = "badges") -> int:
+    """
+    Append the badges of one run to the history.
+
+    Parameters
+    ----------
+    badges : Mapping
+        Nested badges, e.g. ``BadgeReport.dic``.
+    commit : str, optional
+        Commit hash of the run, defaults to `current_commit`.
+    created : datetime, optional
+        Time of the run, defaults to now.
+    db_path : Path, optional
+        Defaults to `HISTORY_DB`.
+    report : str, optional
+        Name of the report, e.g. "performance". The default is "badges".
+
+    Returns
+    -------
+    run_id : int
+    """
+    commit = commit or current_commit()
+    created = (created or dt.now(UTC)).isoformat(timespec="seconds")
+    rows = []
+    for package, metric, value in flatten_badges(badges):
+        # bool is a Number too, but shouldn't be averaged
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            rows.append((package, metric, value, None))
+        else:
+            rows.append((package, metric, None, str(value)))
+    with _transaction(db_path) as connection:
+        run_id = connection.execute(
+            "INSERT INTO runs (commit_hash, created, report) "
+            "VALUES (?, ?, ?)", (commit, created, report)).lastrowid
+        connection.executemany(
+            "INSERT OR IGNORE INTO metrics (package, metric) VALUES (?, ?)",
+            [row[:2] for row in rows])
+        connection.executemany(
+            "INSERT INTO badges (metric_id, run_id, number, text) "
+            "SELECT id, ?, ?, ? FROM metrics WHERE package = ? AND metric = ?",
+            [(run_id, number, text, package, metric)
+             for package, metric, number, text in rows])
+    return run_id
+
+
+def trend(package: str, metric: str = "*",
+          db_path: Path = HISTORY_DB,
+          report: Optional[str] = None) -> list[tuple]:
+    """
+    Return all values of matching metrics of `package`, oldest first.
+
+    Parameters
+    ----------
+    package : str
+        Name of the package.
+    metric : str, optional
+        Metric name or glob pattern (``*``, ``?``), by default all metrics.
+    db_path : Path, optional
+        Defaults to `HISTORY_DB`.
+    report : str, optional
+        Only runs of this report, by default runs of all reports.
+
+    Returns
+    -------
+    rows : list of tuple
+        (created, commit, metric, value) for every stored badge.
+    """
+    with _transaction(db_path) as connection:
+        rows = connection.execute(
+            "SELECT created, commit_hash, metric, coalesce(number, text) "
+            "FROM metrics JOIN badges ON metric_id = metrics.id "
+            "JOIN runs ON runs.id = run_id "
+            "WHERE package = ? AND metric GLOB ? "
+            "AND coalesce(? = report, 1) ORDER BY run_id, metric",
+            (package, metric, report)).fetchall()
+    return rows
+
+
+def jumps(package: str, metric: str, factor: float = 1.5,
+          db_path: Path = HISTORY_DB,
+          report: Optional[str] = None) -> list[tuple]:
+    """
+    Find the runs where a numerical metric changed by more than `factor`.
+
+    Only runs of `report` are compared, if given. Otherwise, all runs.
+
+    Returns
+    -------
+    rows : list of tuple
+        (created, commit, metric, previous value, value), oldest first.
+    """
+    with _transaction(db_path) as connection:
+        rows = connection.execute(
+            "SELECT created, commit_hash, metric, previous, number FROM ("
+            "  SELECT run_id, metric, number, lag(number) OVER ("
+            "    PARTITION BY metric_id ORDER BY run_id) AS previous"
+            "  FROM metrics JOIN badges ON metric_id = metrics.id"
+            "  JOIN runs ON runs.id = run_id"
+            "  WHERE package = ? AND metric GLOB ? AND number IS NOT NULL"
+            "  AND coalesce(? = report, 1)"
+            ") JOIN runs ON runs.id = run_id "
+            "WHERE previous > 0 AND (number > previous * ? "
+            "OR number * ? < previous) ORDER BY run_id, metric",
+            (package, metric, report, factor, factor)).fetchall()
+    return rows
+
+
+def regressions(window: int = 10, tolerance: float = 0.1,
+                metric: str = "performance/*",
+                db_path: Path = HISTORY_DB,
+                report: str = "performance") -> list[Regression]:
+    """
+    Compare the numbers of the last run with the median of earlier runs.
+
+    Only runs of the same `report` are compared.
+
+    Parameters
+    ----------
+    window : int, optional
+        Number of runs before the last one for the median. The default is 10.
+    tolerance : float, optional
+        Report values larger than ``median * (1 + tolerance)``. The default
+        is 0.1.
+    metric : str, optional
+        Glob pattern of the metrics to compare, by default all performance
+        badges (for which larger is worse).
+    db_path : Path, optional
+        Defaults to `HISTORY_DB`.
+    report : str, optional
+        Name of the report. The default is "performance".
+
+    Returns
+    -------
+    regressions : list of Regression
+        Sorted by package and metric.
+    """
+    with _transaction(db_path) as connection:
+        run_ids = [run_id for run_id, in connection.execute(
+            "SELECT id FROM runs WHERE report = ? ORDER BY id DESC LIMIT ?",
+            (report, window + 1))]
+        if len(run_ids) < 2:
+            return []
+        rows = connection.execute(
+            "SELECT run_id, package, metric, number "
+            "FROM badges JOIN metrics ON metrics.id = metric_id "
+            "JOIN runs ON runs.id = run_id "
+            "WHERE run_id >= ? AND report = ? AND metric GLOB ? "
+            "AND number IS NOT NULL",
+            (run_ids[-1], report, metric)).fetchall()
+
+    last, earlier = {}, {}
+    for run_id, package, metric_name, number in rows:
+        if run_id == run_ids[0]:
+            last[package, metric_name] = number
+        else:
+            earlier.setdefault((package, metric_name), []).append(number)
+    found = []
+    for key, value in sorted(last.items()):
+        if key not in earlier:
+            continue
+        median = statistics.median(earlier[key])
+        if value > median * (1 + tolerance):
+            found.append(Regression(*key, value, median))
+    return found
+
+
+def _load_badges(path: Path) -> dict:
+    with path.open(encoding="utf-8") as file:
+        return yaml.safe_load(file) or {}
+
+
+def main():
+    """Execute badge history CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="history",
+        description="Record and query the history of the badge reports.",
+    )
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=HISTORY_DB,
+        help="History database. Default: _REPORTS/history.sqlite.",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record = commands.add_parser(
+        "record", help="Append a badges.yaml file to the history.")
+    record.add_argument(
+        "yaml_file",
+        nargs="?",
+        type=Path,
+        default=PKG_DIR / "_REPORTS" / "badges.yaml",
+        help="Default: _REPORTS/badges.yaml.",
+    )
+    record.add_argument(
+        "--report",
+        help="Name of the report. Default: name of the yaml file.",
+    )
+
+    regress = commands.add_parser(
+        "regressions", help="List metrics above the median of earlier runs.")
+    regress.add_argument("--window", type=int, default=10,
+                         help="Number of earlier runs. Default: 10.")
+    regress.add_argument("--tolerance", type=float, default=0.1,
+                         help="Allowed relative increase. Default: 0.1.")
+    regress.add_argument("--metric", default="performance/*",
+                         help="Glob pattern. Default: performance/*.")
+    regress.add_argument("--report", default="performance",
+                         help="Name of the report. Default: performance.")
+
+    trend_cmd = commands.add_parser(
+        "trend", help="List all values of the metrics of a package.")
+    trend_cmd.add_argument("package")
+    trend_cmd.add_argument("metric", nargs="?", default="*",
+                           help="Glob pattern. Default: all metrics.")
+    trend_cmd.add_argument("--report",
+                           help="Name of the report. Default: all reports.")
+
+    jumps_cmd = commands.add_parser(
+        "jumps", help="List runs where a metric changed suddenly.")
+    jumps_cmd.add_argument("package")
+    jumps_cmd.add_argument("metric", help="Glob pattern.")
+    jumps_cmd.add_argument("--factor", type=float, default=1.5,
+                           help="Minimum change factor. Default: 1.5.")
+    jumps_cmd.add_argument("--report",
+                           help="Name of the report. Default: all reports.")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        run_id = record_run(_load_badges(args.yaml_file), db_path=args.db,
+                            report=args.report or args.yaml_file.stem)
+        print(f"Recorded run {run_id}.")
+    elif args.command == "regressions":
+        found = regressions(args.window, args.tolerance, args.metric,
+                            args.db, args.report)
+        for reg in found:
+            print(f"{reg.package} {reg.metric}: {reg.value:g} "
+                  f"(median {reg.median:g}, x{reg.ratio:.2f})")
+        print(f"{len(found)} regressions.")
+    elif args.command == "trend":
+        for created, commit, metric, value in trend(
+                args.package, args.metric, args.db, args.report):
+            print(f"{created} {(commit or '')[:10]:10} {metric}: {value}")
+    else:
+        for created, commit, metric, previous, value in jumps(
+                args.package, args.metric, args.factor, args.db,
+                args.report):
+            print(f"{created} {(commit or '')[:10]:10} {metric}: "
+                  f"{previous:g} -> {value:g}")
+
+
+if __name__ == "__main__":
+    main()
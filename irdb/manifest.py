@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Build manifests for compiled packages.
+
+A manifest is stored next to each compiled zip file in `_ZIPPED_PACKAGES`,
+e.g. ``METIS.2024-01-01.dev.manifest.yaml`` for ``METIS.2024-01-01.dev.zip``.
+It lists relative path, size, mtime and sha256 of every file in the archive,
+plus size and sha256 of the archive itself.
+"""
+
+import hashlib
+import logging
+from pathlib import Path
+from typing import Optional
+from collections.abc import Iterable
+
+import yaml
+
+CHUNK_SIZE = 2**20
+
+
+def hash_file(path: Path) -> str:
+    """Return the hex sha256 digest of a file, read in chunks."""
+    sha = hashlib.sha256()
+    with path.open("rb") as file:
+        while chunk := file.read(CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def manifest_path(zip_path: Path) -> Path:
+    """Return the path of the manifest belonging to `zip_path`."""
+    return zip_path.with_suffix(".manifest.yaml")
+
+
+def scan_files(src_path: Path, files: Iterable[Path],
+               previous: Optional[dict] = None) -> dict:
+    """
+    Collect size, mtime and sha256 for all (non-directory) `files`.
+
+    Parameters
+    ----------
+    src_path : Path
+        Package folder, keys are relative to its parent (as in the archive).
+    files : Iterable[Path]
+        Files to include, directories are skipped.
+    previous : dict, optional
+        Files section of a previous manifest. Hashes of files with unchanged
+        size and mtime are reused from here instead of being recomputed.
+
+    Returns
+    -------
+    entries : dict
+        {"relative/path": {"size": int, "mtime": int, "sha256": str}}
+    """
+    previous = previous or {}
+    entries = {}
+    n_hashed = 0
+    for file in files:
+        if not file.is_file():
+            continue
+        key = file.relative_to(src_path.parent).as_posix()
+        stat = file.stat()
+        old = previous.get(key, {})
+        if (old.get("size") == stat.st_size
+                and old.get("mtime") == stat.st_mtime_ns):
+            sha256 = old["sha256"]
+        else:
+            sha256 = hash_file(file)
+            n_hashed += 1
+        entries[key] = {"size": stat.st_size,
+                        "mtime": stat.st_mtime_ns,
+                        "sha256": sha256}
+    logging.debug("Hashed %d of %d files in %s.", n_hashed, len(entries),
+                  src_path.name)
+    return entries
+
+
+def write_manifest(zip_path: Path, entries: dict) -> Path:
+    """Write the manifest for `zip_path` (which must exist already)."""
+    manifest = {
+        "archive": zip_path.name,
+        "size": zip_path.stat().st_size,
+        "sha256": hash_file(zip_path),
+        "files": entries,
+    }
+    path = manifest_path(zip_path)
+    path.write_text(yaml.safe_dump(manifest, sort_keys=False),
+                    encoding="utf-8")
+    return path
+
+
+def load_manifest(zip_path: Path) -> Optional[dict]:
+    """Load the manifest for `zip_path`, return None if there is none."""
+    try:
+        with manifest_path(zip_path).open(encoding="utf-8") as file:
+            return yaml.safe_load(file)
+    except FileNotFoundError:
+        return None
+
+
+def same_content(entries: dict, other: dict,
+                 ignore: Iterable[str] = ()) -> bool:
+    """Compare two files sections by path and sha256 (not by mtime)."""
+    ignore = set(ignore)
+
+    def _hashes(dic):
+        return {key: value["sha256"] for key, value in dic.items()
+                if key not in ignore}
+
+    return _hashes(entries) == _hashes(other)
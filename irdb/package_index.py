@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Machine-readable index of all packages on the server.
+
+The index is a yaml file (``index.yaml``) in the server's package root,
+maintained by ``irdb.publish`` with every upload:
+
+.. code-block:: yaml
+
+    packages:
+      METIS:
+        2024-02-01.dev:
+          file: instruments/METIS.2024-02-01.dev.zip
+          size: 24312018
+          sha256: 3f2a...
+          release: dev
+          timestamp: '2024-02-01 10:12:45'
+          dependencies: [Armazones, ELT]
+
+Dependencies are taken from the ``packages:`` list in the package's
+``default.yaml``, as included in the uploaded archive.
+
+If the server has no index yet, the first upload creates it from the
+archives already on the server (see `seed_index`). Their checksums,
+timestamps and dependencies are unknown (None) until they are uploaded
+again.
+
+Concurrent publishers don't lose each other's entries: the index is read
+again right before it is replaced, and the update is redone if another
+upload changed it in the meantime. After the rename, the index is read once
+more and the update redone if another upload replaced it with one lacking
+the new entry. SFTP has no locks, so an entry can still be lost if another
+publisher replaces the index after that last check, with an index read
+before the entry was added.
+
+Version lookups (`get_all_package_versions`) fetch the index once over HTTP
+and keep a local copy, which is revalidated with the ETag and Last-Modified
+headers of the previous response, so an unchanged index costs one small
+request. If the index can't be fetched, the cached copy is used. Packages
+not in the index are looked up in the server listings instead (see
+`get_package_versions`).
+"""
+
+import os
+import uuid
+import tempfile
+import logging
+import hashlib
+import threading
+from pathlib import Path
+from typing import Optional
+from datetime import datetime as dt, timezone
+from zipfile import ZipFile
+
+import yaml
+import httpx
+
+from scopesim.server import database as db
+from scopesim.server.download_utils import create_client
+
+from irdb import manifest
+from irdb.utils import CACHE_DIR
+
+INDEX_NAME = "index.yaml"
+# How often the index is updated again, if other uploads keep changing it
+INDEX_RETRIES = 5
+# Raised when reading a malformed index
+INDEX_ERRORS = (yaml.YAMLError, KeyError, TypeError, AttributeError)
+# Uploads running in several threads must not update the index concurrently
+_INDEX_LOCK = threading.Lock()
+
+
+def _read_yaml_member(zip_file: ZipFile, name: str) -> list:
+    try:
+        return list(yaml.safe_load_all(zip_file.read(name)))
+    except KeyError:
+        return []
+
+
+def index_entry(pkg_name: str, zip_file, sha256: str, size: int) -> dict:
+    """
+    Collect the index information of one package archive.
+
+    Parameters
+    ----------
+    pkg_name : str
+        Name of the package.
+    zip_file : Path or file-like object
+        The package archive.
+    sha256 : str
+        Checksum of the archive.
+    size : int
+        Size of the archive in bytes.
+
+    Returns
+    -------
+    entry : dict
+        Index entry without the "file" key.
+    """
+    with ZipFile(zip_file) as archive:
+        version = next(iter(_read_yaml_member(
+            archive, f"{pkg_name}/version.yaml")), None) or {}
+        packages = next((doc["packages"] for doc in _read_yaml_member(
+            archive, f"{pkg_name}/default.yaml")
+            if isinstance(doc, dict) and "packages" in doc), None) or []
+
+    timestamp = version.get(
+        "timestamp", dt.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"))
+    return {
+        "size": size,
+        "sha256": sha256,
+        "release": version.get("release"),
+        "timestamp": str(timestamp),
+        "dependencies": [pkg for pkg in packages if pkg != pkg_name],
+    }
+
+
+def add_to_index(index: dict, server_path: str, entry: dict) -> dict:
+    """Add or replace the entry for the archive at `server_path`."""
+    pkg_name, version = db._parse_package_version(Path(server_path).name)
+    if entry["release"] is None:
+        entry["release"] = "stable" if db._is_stable(version) else "dev"
+    versions = index.setdefault("packages", {}).setdefault(pkg_name, {})
+    versions[version] = {"file": server_path, **entry}
+    index["packages"][pkg_name] = dict(sorted(versions.items()))
+    index["packages"] = dict(sorted(index["packages"].items()))
+    return index
+
+
+def seed_index(session) -> dict:
+    """
+    Build an index of the archives already on the server from its listing.
+
+    Parameters
+    ----------
+    session : irdb.transport.Session
+        Session on the package server.
+
+    Returns
+    -------
+    index : dict
+        Only file, size and release of the archives are known, the other
+        fields are None.
+    """
+    index = {}
+    for folder in session.listdir("."):
+        try:
+            names = session.listdir(folder)
+        except OSError:
+            continue  # not a folder, e.g. the index itself
+        for name in names:
+            if not name.endswith(".zip"):
+                continue
+            server_path = f"{folder}/{name}"
+            add_to_index(index, server_path, {
+                "size": session.stat(server_path).st_size,
+                "sha256": None,
+                "release": None,
+                "timestamp": None,
+                "dependencies": None,
+            })
+    logging.info("Created package index from %d archives on the server.",
+                 sum(len(versions) for versions
+                     in index.get("packages", {}).values()))
+    return index
+
+
+def _read_index(session) -> Optional[bytes]:
+    try:
+        with session.open(INDEX_NAME, "rb") as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+
+def update_index(session, server_path: str,
+                 local_path: Optional[Path] = None) -> dict:
+    """
+    Add an uploaded archive to the index on the server.
+
+    The new index is written next to the current one and then renamed,
+    readers never see a partially written index. If there is no index yet,
+    it is created from the server listing first, see `seed_index`.
+
+    Parameters
+    ----------
+    session : irdb.transport.Session
+        Session on the package server.
+    server_path : str
+        Path of the uploaded archive, relative to the server's package root.
+    local_path : Path, optional
+        Local copy of the archive. If None, the uploaded archive is read back
+        from the server.
+
+    Raises
+    ------
+    RuntimeError
+        Raised if other uploads changed the index during every one of
+        `INDEX_RETRIES` attempts.
+
+    Returns
+    -------
+    index : dict
+        The updated index.
+    """
+    pkg_name = db._get_package_name(Path(server_path).name)
+    if local_path is not None:
+        build_manifest = manifest.load_manifest(local_path)
+        size = local_path.stat().st_size
+        if build_manifest is not None and build_manifest["size"] == size:
+            sha256 = build_manifest["sha256"]
+        else:
+            sha256 = manifest.hash_file(local_path)
+        entry = index_entry(pkg_name, local_path, sha256, size)
+    else:
+        with session.open(server_path, "rb") as file:
+            sha = hashlib.sha256()
+            while chunk := file.read(manifest.CHUNK_SIZE):
+                sha.update(chunk)
+            size = file.tell()
+            entry = index_entry(pkg_name, file, sha.hexdigest(), size)
+
+    # Unique, so concurrent publishers don't write to the same file
+    part_path = f"{INDEX_NAME}.{uuid.uuid4().hex[:12]}.part"
+    with _INDEX_LOCK:
+        for _ in range(INDEX_RETRIES):
+            current = _read_index(session)
+            index = (seed_index(session) if current is None
+                     else yaml.safe_load(current) or {})
+            add_to_index(index, server_path, dict(entry))
+            with session.open(part_path, "wb") as file:
+                file.write(yaml.safe_dump(index, sort_keys=False).encode())
+            if _read_index(session) == current:
+                session.rename(part_path, INDEX_NAME)
+                # Another upload may have replaced it right before the rename
+                if _has_entry(_read_index(session), server_path, entry):
+                    return index
+            logging.info("%s was changed by another upload, updating it "
+                         "again.", INDEX_NAME)
+        try:
+            session.remove(part_path)
+        except FileNotFoundError:
+            pass  # renamed in the last attempt
+    raise RuntimeError(f"{INDEX_NAME} changed during every update of "
+                       f"{server_path}, giving up.")
+
+
+def _has_entry(text: Optional[bytes], server_path: str, entry: dict) -> bool:
+    pkg_name, version = db._parse_package_version(Path(server_path).name)
+    try:
+        stored = yaml.safe_load(text)["packages"][pkg_name][version]
+    except (TypeError, KeyError, yaml.YAMLError):
+        return False
+    return (stored.get("file") == server_path
+            and stored.get("sha256") == entry["sha256"])
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    # Unique name, concurrent lookups may write at the same time
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.",
+                                    suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def clear_cache(cache_dir: Path = CACHE_DIR) -> None:
+    """Remove the local copy of the index, e.g. if it can't be read."""
+    (cache_dir / INDEX_NAME).unlink(missing_ok=True)
+    (cache_dir / f"{INDEX_NAME}.meta").unlink(missing_ok=True)
+
+
+def load_index(base_url: Optional[str] = None,
+               cache_dir: Path = CACHE_DIR) -> dict:
+    """
+    Return the server's package index, using a revalidated local copy.
+
+    Parameters
+    ----------
+    base_url : str, optional
+        Package server URL, defaults to the one configured in ScopeSim.
+    cache_dir : Path, optional
+        Folder for the local copy of the index.
+
+    Raises
+    ------
+    FileNotFoundError
+        Raised if the server has no index and there's no local copy.
+
+    Returns
+    -------
+    index : dict
+    """
+    base_url = base_url or db.get_base_url()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache_path = cache_dir / INDEX_NAME
+    meta_path = cache_dir / f"{INDEX_NAME}.meta"
+    meta = {}
+    if cache_path.exists() and meta_path.exists():
+        meta = yaml.safe_load(meta_path.read_text(encoding="utf-8")) or {}
+    if meta.get("url") != base_url:
+        meta = {}
+
+    headers = {}
+    if "etag" in meta:
+        headers["If-None-Match"] = meta["etag"]
+    if "last_modified" in meta:
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    try:
+        with create_client(base_url) as client:
+            response = client.get(INDEX_NAME, headers=headers)
+        if response.status_code == 404:
+            raise FileNotFoundError(f"No package index at {base_url}.")
+        if response.status_code != 304:
+            response.raise_for_status()
+            _write_atomic(cache_path, response.text)
+            meta = {"url": base_url}
+            if "etag" in response.headers:
+                meta["etag"] = response.headers["etag"]
+            if "last-modified" in response.headers:
+                meta["last_modified"] = response.headers["last-modified"]
+            _write_atomic(meta_path, yaml.safe_dump(meta))
+    except httpx.HTTPError as err:
+        if not meta:
+            raise
+        logging.warning("Couldn't revalidate package index (%s), using "
+                        "local copy.", err)
+
+    with cache_path.open(encoding="utf-8") as file:
+        return yaml.safe_load(file) or {}
+
+
+def get_all_package_versions(
+    base_url: Optional[str] = None,
+    cache_dir: Path = CACHE_DIR,
+) -> dict[str, list[str]]:
+    """Return {package: [versions]} like the ScopeSim function of that name.
+
+    Uses the package index (see `load_index`) and falls back to crawling the
+    server listings if there is no index on the server yet.
+    """
+    try:
+        index = load_index(base_url, cache_dir)
+    except FileNotFoundError:
+        logging.info("No package index found, crawling server instead.")
+        return db.get_all_package_versions()
+    return {pkg_name: list(versions)
+            for pkg_name, versions in index.get("packages", {}).items()}
+
+
+def get_package_versions(
+    pkg_name: str,
+    base_url: Optional[str] = None,
+    cache_dir: Path = CACHE_DIR,
+) -> list[str]:
+    """Return all versions of `pkg_name`, empty if not on the server.
+
+    Like `get_all_package_versions`, but packages missing from the index
+    (e.g. uploaded by an older version of ``irdb.publish``) are looked up
+    by crawling the server listings.
+    """
+    versions = get_all_package_versions(base_url, cache_dir)
+    if pkg_name not in versions:
+        logging.info("%s not in package index, crawling server instead.",
+                     pkg_name)
+        versions = db.get_all_package_versions()
+    return versions.get(pkg_name, [])
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Measure how expensive the packages are to load and to ship.
+
+Per package, the total size of the files referenced in its YAML files (see
+``irdb.references``) and the size of the compiled zip file are recorded. For
+every mode of an observation package (see ``irdb.bangkeys.mode_combinations``)
+``UserCommands`` and ``OpticalTrain`` are built with ScopeSim, recording
+
+- the time to build ``UserCommands`` and ``OpticalTrain``,
+- the peak memory allocated while doing so (from ``tracemalloc``),
+- the number of effects in the optical train.
+
+Both builds run while ``tracemalloc`` is tracing, so the times include its
+overhead. They are meant to be compared between runs, not as absolute
+numbers. A mode that fails to build is recorded with its error, and flagged
+as `download_error` if it failed because data couldn't be downloaded (see
+`DOWNLOAD_ERRORS`).
+
+`add_badges` writes the results into a `BadgeReport` as ``NumBadge``, which
+turn orange or red when a value exceeds its budget (see
+``NumBadge.get_budget``). ``pytest -m performance`` does so for all packages
+and writes the report to ``_REPORTS/performance.md``.
+
+Run from the IRDB root directory to print the numbers::
+
+    python -m irdb.performance [PKG ...]
+"""
+
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from time import perf_counter
+from pathlib import Path
+from typing import Optional
+from dataclasses import dataclass, field
+
+import httpx
+
+from irdb.bangkeys import mode_combinations
+from irdb.catalog import Catalog, get_catalog
+from irdb.publish import zip_package_folder
+from irdb.references import FileIndex, ReferenceGraph, resolve_references
+from irdb.trains import local_packages
+
+MiB = 2**20
+# Errors of modes that need to download data, which doesn't work offline
+DOWNLOAD_ERRORS = (httpx.HTTPError, ConnectionError, TimeoutError)
+
+
+@dataclass
+class ModeMetrics:
+    """Costs of building one mode, None if the build failed before."""
+
+    mode: str
+    user_commands_time: Optional[float] = None
+    optical_train_time: Optional[float] = None
+    memory_peak: Optional[int] = None
+    n_effects: Optional[int] = None
+    error: Optional[str] = None
+    download_error: bool = False
+
+
+@dataclass
+class PackageMetrics:
+    """Costs of one package, `modes` is empty for support packages."""
+
+    package: str
+    referenced_bytes: int
+    zip_size: int
+    modes: list[ModeMetrics] = field(default_factory=list)
+
+
+def measure_mode(pkg_name: str, mode_name: str,
+                 set_modes: Optional[list[str]], pkg_dir: Path) -> ModeMetrics:
+    """
+    Build ``UserCommands`` and ``OpticalTrain`` of one mode with ScopeSim.
+
+    Parameters
+    ----------
+    pkg_name : str
+        Name of the observation package.
+    mode_name : str
+        Name of the mode in the results.
+    set_modes : list of str or None
+        Modes passed to ``UserCommands``, None for the default modes.
+    pkg_dir : Path
+        Folder containing the packages, used as ScopeSim's
+        ``local_packages_path`` during the build.
+
+    Returns
+    -------
+    metrics : ModeMetrics
+    """
+    metrics = ModeMetrics(mode_name)
+    # ScopeSim doesn't accept set_modes=None
+    kwargs = {"set_modes": set_modes} if set_modes else {}
+    with local_packages(pkg_dir) as scopesim:
+        tracemalloc.start()
+        try:
+            start = perf_counter()
+            cmds = scopesim.UserCommands(use_instrument=pkg_name, **kwargs)
+            metrics.user_commands_time = perf_counter() - start
+            start = perf_counter()
+            opt = scopesim.OpticalTrain(cmds)
+            metrics.optical_train_time = perf_counter() - start
+            metrics.n_effects = len(opt.effects)
+        except Exception as err:
+            logging.error("%s [%s] can't be built: %s", pkg_name,
+                          metrics.mode, err)
+            metrics.error = f"{err.__class__.__name__}: {err}"
+            metrics.download_error = isinstance(err, DOWNLOAD_ERRORS)
+        finally:
+            metrics.memory_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    return metrics
+
+
+def referenced_bytes(pkg_name: str, graph: ReferenceGraph,
+                     catalog: Catalog) -> int:
+    """Total size of the files referenced by `pkg_name`, each counted once."""
+    locations = {ref.location for ref in graph.references
+                 if ref.package == pkg_name and not ref.missing}
+    total = 0
+    for location in locations:
+        location_pkg, rel_path = location.split("/", 1)
+        total += catalog[location_pkg].files[rel_path].size
+    return total
+
+
+def zip_size(pkg_name: str, pkg_dir: Optional[Path] = None) -> int:
+    """Size of the (reproducible) zip file of `pkg_name`, in bytes."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        return zip_package_folder(pkg_name, pkg_name, reproducible=True,
+                                  zipped_dir=Path(tmp_dir),
+                                  pkgs_dir=pkg_dir).stat().st_size
+
+
+def measure_package(pkg_name: str, graph: Optional[ReferenceGraph] = None,
+                    catalog: Optional[Catalog] = None,
+                    build: bool = True) -> PackageMetrics:
+    """
+    Measure all costs of one package, see module docstring.
+
+    Parameters
+    ----------
+    pkg_name : str
+        Name of the package.
+    graph : ReferenceGraph, optional
+        References of (at least) `pkg_name`, resolved if not given.
+    catalog : Catalog, optional
+        Defaults to the catalog of this IRDB.
+    build : bool, optional
+        If False, don't build the modes with ScopeSim. The default is True.
+
+    Returns
+    -------
+    metrics : PackageMetrics
+    """
+    catalog = catalog or get_catalog()
+    if graph is None:
+        graph = resolve_references([pkg_name], FileIndex(catalog))
+    metrics = PackageMetrics(pkg_name,
+                             referenced_bytes(pkg_name, graph, catalog),
+                             zip_size(pkg_name, catalog.pkg_dir))
+    docs = catalog[pkg_name].yaml_docs.get("default.yaml")
+    if not build or not docs or not isinstance(docs[0], dict):
+        return metrics
+    has_modes = bool(docs[0].get("mode_yamls"))
+    for mode_name, modes in mode_combinations(docs[0]).items():
+        set_modes = [mode["name"] for mode in modes] if has_modes else None
+        metrics.modes.append(measure_mode(pkg_name, mode_name, set_modes,
+                                          catalog.pkg_dir))
+    return metrics
+
+
+def _round(value, ndigits=2):
+    return None if value is None else round(value, ndigits)
+
+
+def add_badges(report, metrics: PackageMetrics) -> None:
+    """Write `metrics` to ``report[package]["performance"]``."""
+    perf = report.setdefault(metrics.package, {}).setdefault(
+        "performance", {})
+    perf["referenced_MiB"] = round(metrics.referenced_bytes / MiB, 2)
+    perf["zip_MiB"] = round(metrics.zip_size / MiB, 2)
+    for mode in metrics.modes:
+        badges = {
+            "user_commands_s": _round(mode.user_commands_time),
+            "optical_train_s": _round(mode.optical_train_time),
+            "memory_peak_MiB": _round(mode.memory_peak / MiB),
+            "effects": mode.n_effects,
+        }
+        badges = {key: value for key, value in badges.items()
+                  if value is not None}
+        if mode.error is not None:
+            badges["build"] = "error"
+        # Mode names can contain dots, so no bang-strings
+        perf.setdefault("modes", {})[mode.mode] = badges
+
+
+def main():
+    """Execute performance CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="performance",
+        description="Measure load time, memory and size of packages.",
+    )
+    parser.add_argument(
+        "pkg_names",
+        nargs="*",
+        help="Packages to measure. Default: all packages.",
+    )
+    parser.add_argument(
+        "--no-build",
+        action="store_true",
+        help="Only measure sizes, don't build the modes with ScopeSim.",
+    )
+    args = parser.parse_args()
+    catalog = get_catalog()
+    pkg_names = args.pkg_names or catalog.names()
+    graph = resolve_references(pkg_names, FileIndex(catalog))
+    for pkg_name in pkg_names:
+        metrics = measure_package(pkg_name, graph, catalog,
+                                  build=not args.no_build)
+        print(f"{pkg_name}: {metrics.referenced_bytes / MiB:.2f} MiB "
+              f"referenced, {metrics.zip_size / MiB:.2f} MiB zipped")
+        for mode in metrics.modes:
+            if mode.error is not None:
+                print(f"  [{mode.mode}] error: {mode.error}")
+                continue
+            print(f"  [{mode.mode}] UserCommands "
+                  f"{mode.user_commands_time:.2f} s, OpticalTrain "
+                  f"{mode.optical_train_time:.2f} s, peak "
+                  f"{mode.memory_peak / MiB:.1f} MiB, "
+                  f"{mode.n_effects} effects")
+
+
+if __name__ == "__main__":
+    main()
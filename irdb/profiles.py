@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Build profiles, selecting which files of a package go into its archive.
+
+* ``full``: all files (except ``__pycache__`` and hidden files).
+* ``runtime``: only what a simulation needs, i.e. the package's YAML files
+  (including ``version.yaml``) and the files referenced from them. Docs,
+  code, tests, manuals and legacy data files are left out.
+
+A file counts as referenced if any string in any of the package's YAML
+documents names it, by path relative to the package folder or by file name.
+This includes the ``filename`` keys found by
+``irdb.utils.recursive_filename_search``, but also properties like
+``trace_file``, which effects reference indirectly (``!OBS.trace_file``).
+Format strings like ``"filters/TC_filter_{}.dat"`` match all files fitting
+the pattern, and strings naming a subfolder keep its whole content.
+
+References are followed further through small ASCII tables, e.g. mirror
+lists with a ``filename`` column. The YAML files of packages depending on
+the package (see ``irdb.dependencies``) are searched as well, because e.g.
+METIS uses mirror curves from the ELT package.
+
+Savings per profile can be listed from the IRDB root directory like so::
+
+    python -m irdb.profiles METIS MICADO ELT
+"""
+
+import re
+import argparse
+import posixpath
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterator
+
+import yaml
+
+from irdb.dependencies import load_graph
+
+PROFILES = ("full", "runtime")
+YAML_SUFFIXES = (".yaml", ".yml")
+TABLE_SUFFIXES = (".dat", ".tbl")
+# Larger tables are data, not lists of other files
+MAX_TABLE_SIZE = 2**20
+
+_FORMAT_FIELD = re.compile(r"\{[^{}]*\}")
+
+
+def _strings(entry) -> Iterator[str]:
+    """Yield all strings (keys and values) in a nested yaml structure."""
+    if isinstance(entry, str):
+        yield entry
+    elif isinstance(entry, dict):
+        for key, value in entry.items():
+            yield from _strings(key)
+            yield from _strings(value)
+    elif isinstance(entry, list):
+        for item in entry:
+            yield from _strings(item)
+
+
+def _yaml_strings(yaml_files: list[Path]) -> set[str]:
+    strings = set()
+    for yaml_file in yaml_files:
+        with yaml_file.open(encoding="utf-8") as file:
+            for doc in yaml.safe_load_all(file):
+                strings.update(string.strip() for string in _strings(doc)
+                               if "\n" not in string)
+    return strings
+
+
+def _table_strings(table_file: Path) -> set[str]:
+    if table_file.stat().st_size > MAX_TABLE_SIZE:
+        return set()
+    with table_file.open(encoding="utf-8", errors="replace") as file:
+        return {token for line in file if not line.startswith("#")
+                for token in line.split()}
+
+
+def dependent_yamls(src_path: Path) -> list[Path]:
+    """YAML files of the packages next to `src_path` depending on it."""
+    graph = load_graph({path.name: path for path in src_path.parent.iterdir()
+                        if path.is_dir()})
+    return [yaml_file for pkg_name, deps in sorted(graph.items())
+            if src_path.name in deps
+            for yaml_file in sorted((src_path.parent / pkg_name).rglob("*"))
+            if yaml_file.suffix.lower() in YAML_SUFFIXES]
+
+
+def referenced_files(src_path: Path, files: list[Path],
+                     extra_yamls: tuple = ()) -> set[Path]:
+    """
+    Return the YAML files in `files` and all files referenced from them.
+
+    Parameters
+    ----------
+    src_path : Path
+        Package folder.
+    files : list of Path
+        Files (and folders) of the package.
+    extra_yamls : list of Path, optional
+        Further YAML files (of other packages) to look for references in.
+
+    Returns
+    -------
+    keep : set of Path
+        Subset of `files`, folders are not included.
+    """
+    by_path = {file.relative_to(src_path).as_posix(): file
+               for file in files if file.is_file()}
+    by_name = {}
+    by_folder = {}
+    for rel_path, file in by_path.items():
+        by_name.setdefault(file.name, []).append(file)
+        for folder in Path(rel_path).parents[:-1]:
+            by_folder.setdefault(folder.as_posix(), []).append(file)
+
+    def matches(string):
+        path = posixpath.normpath(string.removeprefix("./"))
+        if _FORMAT_FIELD.search(path) or any(char in path for char in "*?"):
+            pattern = _FORMAT_FIELD.sub("*", path)
+            return {file for rel_path, file in by_path.items()
+                    if fnmatchcase(rel_path, pattern)
+                    or fnmatchcase(file.name, pattern)}
+        found = set(by_name.get(posixpath.basename(path), ()))
+        if path in by_path:
+            found.add(by_path[path])
+        # A referenced folder is kept as a whole
+        found.update(by_folder.get(path, ()))
+        return found
+
+    yaml_files = [file for file in by_path.values()
+                  if file.suffix.lower() in YAML_SUFFIXES]
+    keep = set(yaml_files)
+    strings = _yaml_strings(yaml_files + list(extra_yamls))
+    todo = set()
+    while strings:
+        for string in strings:
+            if string and not string.startswith("!"):
+                todo.update(matches(string) - keep)
+        keep.update(todo)
+        strings = set()
+        for file in todo:
+            if file.suffix.lower() in TABLE_SUFFIXES:
+                strings.update(_table_strings(file))
+        todo = set()
+    return keep
+
+
+def select_files(src_path: Path, files: list[Path],
+                 profile: str = "full") -> list[Path]:
+    """
+    Return the part of `files` belonging to `profile`, in the same order.
+
+    Folders are kept if they contain any selected file.
+    """
+    if profile == "full":
+        return files
+    if profile != "runtime":
+        raise ValueError(f"Unknown build profile '{profile}', must be one "
+                         f"of {PROFILES}.")
+    keep = referenced_files(src_path, files, dependent_yamls(src_path))
+    folders = {parent for file in keep for parent in file.parents}
+    return [file for file in files if file in keep or file in folders]
+
+
+def profile_sizes(src_path: Path, files: list[Path]) -> dict:
+    """Return {profile: (number_of_files, bytes)} for all `PROFILES`."""
+    sizes = {}
+    for profile in PROFILES:
+        selected = [file for file in select_files(src_path, files, profile)
+                    if file.is_file()]
+        sizes[profile] = (len(selected),
+                          sum(file.stat().st_size for file in selected))
+    return sizes
+
+
+def format_savings(pkg_name: str, sizes: dict, profile: str) -> str:
+    """One line summary of the bytes `profile` saves compared to full."""
+    full_bytes = sizes["full"][1]
+    saved = full_bytes - sizes[profile][1]
+    percent = 100 * saved / full_bytes if full_bytes else 0.
+    return (f"{pkg_name}: {profile} profile keeps {sizes[profile][0]} of "
+            f"{sizes['full'][0]} files, saves {saved / 2**20:.2f} MB "
+            f"({percent:.0f} %) of {full_bytes / 2**20:.2f} MB")
+
+
+def main():
+    """Execute profile savings CLI script."""
+    # Imported here to avoid a circular import, publish uses this module.
+    from irdb.publish import PKGS_DIR, _collect_package_files
+
+    parser = argparse.ArgumentParser(
+        prog="profiles",
+        description=(
+            "List the number of files and bytes kept by each build profile "
+            "for the specified packages. This command must be run from the "
+            "IRDB root directory."
+        ),
+    )
+    parser.add_argument(
+        "pkg_names", nargs="+", help="Name(s) of the package(s)."
+    )
+    args = parser.parse_args()
+    for pkg_name in args.pkg_names:
+        src_path = (PKGS_DIR / pkg_name).resolve(strict=True)
+        sizes = profile_sizes(src_path, _collect_package_files(src_path))
+        for profile in PROFILES[1:]:
+            print(format_savings(pkg_name, sizes, profile))
+
+
+if __name__ == "__main__":
+    main()
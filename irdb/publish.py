@@ -2,20 +2,40 @@
 # -*- coding: utf-8 -*-
 """Publish and upload irdb packages."""
 
+import io
+import os
+import bz2
+import zlib
+import queue
+import hashlib
 import argparse
 import logging
 import getpass
-from typing import Optional
+import zipfile
+import tempfile
+import threading
+from itertools import chain
+from time import perf_counter, sleep
+from contextlib import ExitStack, nullcontext
+from typing import Optional, BinaryIO, Callable
 from warnings import warn
 from pathlib import Path
 from datetime import datetime as dt, timezone
-from zipfile import ZIP_DEFLATED, ZipFile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from zipfile import ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA, ZIP64_LIMIT, \
+    ZipFile, ZipInfo
 
 import yaml
 import paramiko
 
 from scopesim.server import database as db
 
+from irdb import manifest, package_index, dependencies, delta as deltas
+from irdb.compression import CompressionPolicy, get_policy
+from irdb.profiles import PROFILES, select_files, profile_sizes, \
+    format_savings
+from irdb.transport import Backend, Session, SFTPBackend, LocalBackend
+
 # After 3.11, can just import UTC directly from datetime
 UTC = timezone.utc
 
@@ -25,6 +45,24 @@ ZIPPED_DIR = PKGS_DIR / "_ZIPPED_PACKAGES"
 
 PATH_FOLDERS_YAML = PATH_HERE / "server_folders.yaml"
 
+# Uploads are retried this many times, waiting UPLOAD_BACKOFF seconds before
+# the first retry, doubling the wait time for every further retry.
+UPLOAD_RETRIES = 5
+UPLOAD_BACKOFF = 2.
+UPLOAD_CHUNK_SIZE = 2**18
+
+# Packages larger than this (in bytes) are split into per-file compression
+# tasks when building in parallel, currently MICADO, MOSAIC and METIS.
+LARGE_PACKAGE_SIZE = 8 * 2**20
+# General purpose flag bit 1 of LZMA members: the data ends with an
+# end-of-stream marker. Only named in zipfile from Python 3.11 on.
+LZMA_EOS_FLAG = 0x02
+
+# Fixed settings for reproducible archives, see zip_package_folder().
+# The timestamp is used if SOURCE_DATE_EPOCH is not set in the environment.
+REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+REPRODUCIBLE_COMPRESSLEVEL = 6
+
 
 class Password:
     """Used for secure pwd promt."""
@@ -72,7 +110,10 @@ def publish(pkg_names=None, compilezip=False, upload=True,
 
 
 def make_package(pkg_name: str, stable: bool = False,
-                 keep_version: bool = False) -> str:
+                 keep_version: bool = False,
+                 reproducible: bool = False,
+                 policy: Optional[CompressionPolicy] = None,
+                 delta: bool = False, profile: str = "full") -> str:
     """
     Make a package (todo: update this description!).
 
@@ -94,6 +135,19 @@ def make_package(pkg_name: str, stable: bool = False,
     keep_version : bool, optional
         Keep the current version number the same. If False, the version number
         will be update to the current date. The default is False.
+    reproducible : bool, optional
+        Create a byte-reproducible archive, see `zip_package_folder`. The
+        default is False.
+    policy : CompressionPolicy, optional
+        Per-file compression policy, see `zip_package_folder`. The default is
+        None.
+    delta : bool, optional
+        Also create a delta archive against the previous compiled version of
+        the same release type, see ``irdb.delta``. The default is False.
+    profile : str, optional
+        Build profile, see ``irdb.profiles``. Archives of other profiles than
+        "full" are written to a subfolder of `ZIPPED_DIR` named after the
+        profile. The default is "full".
 
     Returns
     -------
@@ -101,6 +155,41 @@ def make_package(pkg_name: str, stable: bool = False,
         Name of the package's compiled zip file.
 
     """
+    zipped_dir = _profile_dir(profile)
+    base_path = _get_latest_archive(pkg_name, stable, zipped_dir)
+    previous = manifest.load_manifest(base_path) if base_path else None
+    zip_name = _set_version(pkg_name, stable, keep_version)
+    zip_pkg_path = zip_package_folder(pkg_name, zip_name, reproducible,
+                                      policy, zipped_dir, profile)
+    _write_build_manifest(pkg_name, zip_pkg_path, previous, profile)
+    if delta:
+        _make_delta(base_path, zip_pkg_path)
+    _report_profile(pkg_name, profile)
+    _log_compiled(zip_name)
+    return zip_name
+
+
+def _profile_dir(profile: str) -> Path:
+    """Output folder for archives of build `profile`."""
+    if profile == "full":
+        return ZIPPED_DIR
+    zipped_dir = ZIPPED_DIR / profile
+    zipped_dir.mkdir(parents=True, exist_ok=True)
+    return zipped_dir
+
+
+def _report_profile(pkg_name: str, profile: str) -> None:
+    if profile == "full":
+        return
+    src_path = (PKGS_DIR / pkg_name).expanduser().resolve(strict=True)
+    print(format_savings(pkg_name,
+                         profile_sizes(src_path,
+                                       _collect_package_files(src_path)),
+                         profile))
+
+
+def _set_version(pkg_name: str, stable: bool, keep_version: bool) -> str:
+    """Update (or read) the package's version.yaml, return the zip name."""
     suffix = "dev" if not stable else None
     pkg_version_path = PKGS_DIR / pkg_name / "version.yaml"
     if not keep_version:
@@ -124,45 +213,384 @@ def make_package(pkg_name: str, stable: bool = False,
             version_dict = yaml.safe_load(file)
         time = dt.fromisoformat(version_dict["timestamp"])
 
-    # Make the zip file
-    zip_name = db._unparse_package_version(pkg_name, time.date(), suffix)
-    zip_package_folder(pkg_name, zip_name)
+    return db._unparse_package_version(pkg_name, time.date(), suffix)
+
+
+def _get_latest_archive(pkg_name: str, stable: bool,
+                        zipped_dir: Optional[Path] = None) -> Optional[Path]:
+    """Return the path of the latest compiled version, if any."""
+    try:
+        return _get_local_path(pkg_name, stable, zipped_dir)
+    except ValueError:
+        return None
+
+
+def _load_latest_manifest(pkg_name: str, stable: bool) -> Optional[dict]:
+    """Return the manifest of the latest compiled version, if any."""
+    if (base_path := _get_latest_archive(pkg_name, stable)) is None:
+        return None
+    return manifest.load_manifest(base_path)
+
+
+def _make_delta(base_path: Optional[Path],
+                zip_pkg_path: Path) -> Optional[Path]:
+    if base_path is None:
+        logging.info("No previous version of %s, no delta created.",
+                     zip_pkg_path.name)
+        return None
+    if base_path.name == zip_pkg_path.name:
+        logging.warning("Previous version of %s was overwritten by this "
+                        "build, no delta created.", zip_pkg_path.name)
+        return None
+    return deltas.make_delta(base_path, zip_pkg_path)
+
+
+def _scan_package(pkg_name: str, previous: Optional[dict],
+                  profile: str = "full") -> dict:
+    src_path = (PKGS_DIR / pkg_name).expanduser().resolve(strict=True)
+    return manifest.scan_files(src_path,
+                               _collect_package_files(src_path,
+                                                      profile=profile),
+                               previous["files"] if previous else None)
+
+
+def _write_build_manifest(pkg_name: str, zip_pkg_path: Path,
+                          previous: Optional[dict],
+                          profile: str = "full") -> Path:
+    return manifest.write_manifest(zip_pkg_path,
+                                   _scan_package(pkg_name, previous, profile))
+
+
+def _is_unchanged(pkg_name: str, previous: Optional[dict],
+                  profile: str = "full") -> bool:
+    """Check if package content is identical to the `previous` manifest.
+
+    The package's version.yaml is ignored, because it changes with every
+    build anyway.
+    """
+    if previous is None:
+        return False
+    return manifest.same_content(_scan_package(pkg_name, previous, profile),
+                                 previous["files"],
+                                 ignore={f"{pkg_name}/version.yaml"})
+
+
+def _log_compiled(zip_name: str) -> None:
     logging.info(
         "[%s]: Compiled package: %s",
         dt.now().strftime("%Y-%m-%d %H:%M:%S"),
         zip_name.strip(".zip"),
     )
 
-    return zip_name
 
+def make_packages(pkg_names: list[str], stable: bool = False,
+                  keep_version: bool = False, jobs: int = 1,
+                  incremental: bool = False,
+                  reproducible: bool = False,
+                  policy: Optional[CompressionPolicy] = None,
+                  delta: bool = False, profile: str = "full") -> dict:
+    """
+    Make several packages, optionally in parallel on a process pool.
+
+    With ``jobs > 1``, small packages are each zipped by a single worker,
+    while packages larger than `LARGE_PACKAGE_SIZE` are split into per-file
+    compression tasks, which are then assembled into the archive at the end.
+    The resulting archives are identical to those made by `make_package`.
+    A per-package timing summary is printed at the end of the run.
+
+    Parameters
+    ----------
+    pkg_names : list of str
+        Names of the packages.
+    stable : bool, optional
+        Create stable releases, see `make_package`. The default is False.
+    keep_version : bool, optional
+        Keep the current version numbers, see `make_package`. The default is
+        False.
+    jobs : int, optional
+        Number of worker processes. The default is 1 (serial build).
+    incremental : bool, optional
+        Skip packages whose content (by sha256, ignoring version.yaml) is
+        identical to their latest compiled archive of the same release type,
+        according to the build manifest stored next to that archive. Neither
+        the archive nor the version is updated for those packages. The default
+        is False.
+    reproducible : bool, optional
+        Create byte-reproducible archives, see `zip_package_folder`. The
+        default is False.
+    policy : CompressionPolicy, optional
+        Per-file compression policy, see `zip_package_folder`. The default is
+        None.
+    delta : bool, optional
+        Also create delta archives, see `make_package`. The default is False.
+    profile : str, optional
+        Build profile, see `make_package`. The default is "full".
+
+    Returns
+    -------
+    zip_names : dict
+        {"package_name": "compiled_zip_name"}
 
-def zip_package_folder(pkg_name: str, zip_name: str) -> Path:
+    """
+    zip_names = {}
+    timings = {}
+    base_paths = {}
+    previous = {}
+    zipped_dir = _profile_dir(profile)
+    for pkg_name in pkg_names:
+        base_paths[pkg_name] = _get_latest_archive(pkg_name, stable,
+                                                   zipped_dir)
+        previous[pkg_name] = (manifest.load_manifest(base_paths[pkg_name])
+                              if base_paths[pkg_name] else None)
+
+    if incremental:
+        for pkg_name in list(pkg_names):
+            if _is_unchanged(pkg_name, previous[pkg_name], profile):
+                zip_names[pkg_name] = previous[pkg_name]["archive"]
+                print(f"Unchanged, skipped: {zip_names[pkg_name]}")
+        pkg_names = [pkg_name for pkg_name in pkg_names
+                     if pkg_name not in zip_names]
+
+    if jobs <= 1:
+        for pkg_name in pkg_names:
+            start = perf_counter()
+            zip_names[pkg_name] = make_package(pkg_name, stable, keep_version,
+                                               reproducible=reproducible,
+                                               policy=policy, delta=delta,
+                                               profile=profile)
+            timings[pkg_name] = perf_counter() - start
+        _print_timings(timings)
+        return zip_names
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        tasks = {}
+        for pkg_name in pkg_names:
+            # version.yaml must be written before any worker reads the files
+            zip_names[pkg_name] = _set_version(pkg_name, stable, keep_version)
+            start = perf_counter()
+            src_path = (PKGS_DIR / pkg_name).expanduser().resolve(strict=True)
+            files = _collect_package_files(src_path, reproducible, profile)
+            if sum(file.stat().st_size for file in files) > LARGE_PACKAGE_SIZE:
+                # Directories are written by the main process, no need to
+                # send them to a worker.
+                entries = [
+                    (file, pool.submit(_compress_file, file,
+                                       _arcname(file, src_path),
+                                       reproducible=reproducible,
+                                       policy=policy)
+                     if file.is_file() else None)
+                    for file in files
+                ]
+                tasks[pkg_name] = (start, src_path, entries)
+            else:
+                future = pool.submit(zip_package_folder, pkg_name,
+                                     zip_names[pkg_name], reproducible,
+                                     policy, zipped_dir, profile)
+                tasks[pkg_name] = (start, None, future)
+
+        for pkg_name, (start, src_path, task) in tasks.items():
+            if src_path is None:
+                zip_pkg_path = task.result()
+            else:
+                zip_pkg_path = _assemble_zip(zip_names[pkg_name], src_path,
+                                             task, reproducible, policy,
+                                             zipped_dir)
+            _write_build_manifest(pkg_name, zip_pkg_path, previous[pkg_name],
+                                  profile)
+            if delta:
+                _make_delta(base_paths[pkg_name], zip_pkg_path)
+            _report_profile(pkg_name, profile)
+            timings[pkg_name] = perf_counter() - start
+            _log_compiled(zip_names[pkg_name])
+
+    _print_timings(timings)
+    return zip_names
+
+
+def _assemble_zip(zip_name: str, src_path: Path, entries: list,
+                  reproducible: bool = False,
+                  policy: Optional[CompressionPolicy] = None,
+                  zipped_dir: Optional[Path] = None) -> Path:
+    """Write per-file compression results into the final archive, in order."""
+    zip_pkg_path = ((zipped_dir or ZIPPED_DIR) / zip_name).with_suffix(".zip")
+    with ZipFile(zip_pkg_path, "w", ZIP_DEFLATED) as zip_file:
+        for file, future in entries:
+            if future is None:
+                _write_file(zip_file, file, _arcname(file, src_path),
+                            reproducible, policy)
+            else:
+                _write_compressed(zip_file, *future.result())
+    return zip_pkg_path
+
+
+def _print_timings(timings: dict) -> None:
+    if not timings:
+        return
+    width = max(len(pkg_name) for pkg_name in timings)
+    print("Build times:")
+    for pkg_name, seconds in timings.items():
+        print(f"  {pkg_name:<{width}}  {seconds:8.2f} s")
+
+
+def zip_package_folder(pkg_name: str, zip_name: str,
+                       reproducible: bool = False,
+                       policy: Optional[CompressionPolicy] = None,
+                       zipped_dir: Optional[Path] = None,
+                       profile: str = "full",
+                       pkgs_dir: Optional[Path] = None) -> Path:
     """
     Create a zip file of packages in `pkg_names`.
 
     Directories `__pycache__` and hidden files (starting with `.`) are
-    ignored.
+    ignored. With other build profiles than "full" (see ``irdb.profiles``),
+    only the files selected by the profile are included.
+
+    If `reproducible` is True, the same package tree always results in a
+    byte-identical archive: entries are sorted by name, timestamps are set to
+    ``SOURCE_DATE_EPOCH`` (if set, otherwise `REPRODUCIBLE_DATE_TIME`),
+    permissions are normalized to 0644 (files) and 0755 (directories) and a
+    fixed compression level is used.
+
+    A `policy` (see ``irdb.compression``) chooses the compression method and
+    level per file, e.g. to store already compressed files as they are. By
+    default, all files are deflated with the default level.
+
+    The archive is written to `zipped_dir`, which defaults to `ZIPPED_DIR`.
+    The package folder is looked up in `pkgs_dir`, which defaults to
+    `PKGS_DIR`.
     """
-    src_path = (PKGS_DIR / pkg_name).expanduser().resolve(strict=True)
-    # exclude any path containing any of the following anywhere
-    excludes = {"__pycache__"}
+    src_path = ((pkgs_dir or PKGS_DIR) / pkg_name).expanduser().resolve(
+        strict=True)
     # ensure we don't end up with e.g. "foo.zip.zip":
-    zip_pkg_path = (ZIPPED_DIR / zip_name).with_suffix(".zip")
+    zip_pkg_path = ((zipped_dir or ZIPPED_DIR) / zip_name).with_suffix(".zip")
 
     with ZipFile(zip_pkg_path, "w", ZIP_DEFLATED) as zip_file:
-        files = (path for path in src_path.rglob("[!.]*")
-                 if not any(excl in str(path) for excl in excludes))
-        for file in files:
-            zip_file.write(file, file.relative_to(src_path.parent))
+        for file in _collect_package_files(src_path, reproducible, profile):
+            _write_file(zip_file, file, _arcname(file, src_path),
+                        reproducible, policy)
     return zip_pkg_path
 
 
-def _get_local_path(pkg_name: str, stable: bool) -> Path:
+def _collect_package_files(src_path: Path, sort: bool = False,
+                           profile: str = "full") -> list[Path]:
+    # exclude any path containing any of the following anywhere
+    excludes = {"__pycache__"}
+    files = [path for path in src_path.rglob("[!.]*")
+             if not any(excl in str(path) for excl in excludes)]
+    if sort:
+        # Sort by archive name, independent of OS and filesystem order.
+        files.sort(key=lambda path: path.relative_to(src_path).as_posix())
+    return select_files(src_path, files, profile)
+
+
+def _arcname(file: Path, src_path: Path) -> str:
+    return str(file.relative_to(src_path.parent))
+
+
+def _write_file(zip_file: ZipFile, file: Path, arcname: str,
+                reproducible: bool = False,
+                policy: Optional[CompressionPolicy] = None) -> None:
+    if reproducible or policy is not None:
+        _write_compressed(zip_file, *_compress_file(file, arcname,
+                                                    reproducible, policy))
+    else:
+        zip_file.write(file, arcname)
+
+
+def _reproducible_date_time() -> tuple:
+    try:
+        epoch = int(os.environ["SOURCE_DATE_EPOCH"])
+    except KeyError:
+        return REPRODUCIBLE_DATE_TIME
+    # zip can't store anything before 1980
+    return max(dt.fromtimestamp(epoch, UTC).timetuple()[:6],
+               REPRODUCIBLE_DATE_TIME)
+
+
+def _compress_file(file: Path, arcname: str,
+                   reproducible: bool = False,
+                   policy: Optional[CompressionPolicy] = None) -> tuple:
+    """Compress a single file, to be written with `_write_compressed`."""
+    zinfo = ZipInfo.from_file(file, arcname)
+    if reproducible:
+        zinfo.date_time = _reproducible_date_time()
+        zinfo.create_system = 3  # Unix, regardless of the build platform
+        zinfo.external_attr = (0o40755 if zinfo.is_dir() else 0o100644) << 16
+
+    if zinfo.is_dir():
+        zinfo.external_attr |= 0x10  # MS-DOS directory flag
+        zinfo.file_size = 0
+        zinfo.compress_size = 0
+        zinfo.CRC = 0
+        return zinfo, b""
+
+    if policy is not None:
+        compress_type, compresslevel = policy.choose(file)
+    else:
+        compress_type, compresslevel = ZIP_DEFLATED, None
+    if (reproducible and compress_type == ZIP_DEFLATED
+            and compresslevel is None):
+        compresslevel = REPRODUCIBLE_COMPRESSLEVEL
+
+    zinfo.compress_type = compress_type
+    raw = file.read_bytes()
+    compressor = _get_compressor(compress_type, compresslevel)
+    data = compressor.compress(raw) + compressor.flush() if compressor else raw
+    zinfo.file_size = len(raw)
+    zinfo.compress_size = len(data)
+    zinfo.CRC = zlib.crc32(raw)
+    return zinfo, data
+
+
+def _get_compressor(compress_type: int, compresslevel: Optional[int]):
+    """Same compressors with the same settings as ``ZipFile.write()``."""
+    if compress_type == ZIP_DEFLATED:
+        if compresslevel is None:
+            compresslevel = zlib.Z_DEFAULT_COMPRESSION
+        return zlib.compressobj(compresslevel, zlib.DEFLATED, -15)
+    if compress_type == ZIP_BZIP2:
+        return bz2.BZ2Compressor(9 if compresslevel is None else compresslevel)
+    if compress_type == ZIP_LZMA:
+        # Writes the LZMA properties header zip files need
+        return zipfile.LZMACompressor()
+    return None
+
+
+def _write_compressed(zip_file: ZipFile, zinfo: ZipInfo, data: bytes) -> None:
+    """Append an already compressed member to an archive open for writing.
+
+    This mirrors what ``ZipFile.write()`` does, minus the compression. CRC and
+    sizes are already known when the local header is written, so this works
+    for seekable as well as unseekable (streamed) archives.
+
+    The public API can only write data it compresses itself, so the archive's
+    write state (``_lock``, ``_seekable``, ``_writecheck``, ``_didModify``) is
+    used directly. These are the same on all supported Python versions.
+    """
+    zip64 = zinfo.file_size * 1.05 > ZIP64_LIMIT
+    zinfo.flag_bits = 0x00
+    if zinfo.compress_type == ZIP_LZMA:
+        zinfo.flag_bits |= LZMA_EOS_FLAG
+    with zip_file._lock:
+        if zip_file._seekable:
+            zip_file.fp.seek(zip_file.start_dir)
+        zinfo.header_offset = zip_file.fp.tell()
+        zip_file._writecheck(zinfo)
+        zip_file._didModify = True
+        zip_file.fp.write(zinfo.FileHeader(zip64))
+        zip_file.fp.write(data)
+        zip_file.filelist.append(zinfo)
+        zip_file.NameToInfo[zinfo.filename] = zinfo
+        zip_file.start_dir = zip_file.fp.tell()
+
+
+def _get_local_path(pkg_name: str, stable: bool,
+                    zipped_dir: Optional[Path] = None) -> Path:
     # TODO: add support for additional same day versions
     pattern = f"{pkg_name}.*{'' if stable else '.dev'}.zip"
     try:
         zipped_versions = (
-            path for path in ZIPPED_DIR.glob(pattern)
+            path for path in (zipped_dir or ZIPPED_DIR).glob(pattern)
             if db._is_stable(path.stem) == stable
         )
         local_path = max(zipped_versions, key=lambda path: path.stem)
@@ -216,8 +644,15 @@ def _get_server_path(pkg_name: str, local_name: str) -> str:
 def confirm(pkg_name: str) -> bool:
     """Ask for explicit user confirmation before pushing stable package."""
     try:
-        current_stable = db.get_stable(db.get_all_package_versions()[pkg_name])
-    except (KeyError, ValueError):
+        versions = package_index.get_package_versions(pkg_name)
+    except package_index.INDEX_ERRORS as err:
+        logging.warning("Local copy of the package index is broken (%s), "
+                        "fetching it again.", err)
+        package_index.clear_cache()
+        versions = package_index.get_package_versions(pkg_name)
+    try:
+        current_stable = db.get_stable(versions)
+    except ValueError:
         current_stable = "<does not exist>"
 
     proceed = input(
@@ -235,10 +670,14 @@ def push_to_server(
     login: Optional[str] = None,
     password: Optional[Password] = None,
     no_confirm: bool = False,
+    backend: Optional[Backend] = None,
 ) -> None:
     """
     Upload a package to the univie server.
 
+    The package index on the server (see ``irdb.package_index``) is updated
+    after the upload.
+
     Parameters
     ----------
     pkg_name : str
@@ -250,6 +689,11 @@ def push_to_server(
         Univie u:space username.
     password : Optional[str], optional
         Univie u:space password.
+    no_confirm : bool, optional
+        Don't ask for confirmation for stable packages. The default is False.
+    backend : Optional[Backend], optional
+        Upload via this backend (see ``irdb.transport``) instead of to the
+        univie server, `login` and `password` are ignored in that case.
 
     Raises
     ------
@@ -261,10 +705,9 @@ def push_to_server(
     None
 
     """
-    if password is None:
+    if backend is None and password is None:
         raise ValueError("Password is None. Check email for password")
 
-    hostname = "webspace-access.univie.ac.at"
     local_path = _get_local_path(pkg_name, stable)
     server_path = _get_server_path(pkg_name, local_path.name)
 
@@ -275,16 +718,519 @@ def push_to_server(
     ):
         return
 
-    with paramiko.Transport((hostname, 22)) as transport:
-        transport.connect(username=login, password=password.value)
+    with (SFTPBackend(login, password.value) if backend is None
+          else nullcontext(backend)) as backend:
+        upload_resumable(local_path, server_path, backend.connect)
+        with backend.connect() as session:
+            package_index.update_index(session, server_path, local_path)
+    now = dt.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{now}]: Pushed to server: {pkg_name}")
+    return
 
-        with paramiko.SFTPClient.from_transport(transport) as sftp:
-            sftp.chdir("scopesimu68/html/InstPkgSvr/")
-            sftp.put(local_path, server_path, confirm=True)
 
-        now = dt.now().strftime("%Y-%m-%d %H:%M:%S")
-        print(f"[{now}]: Pushed to server: {pkg_name}")
-    return
+def upload_resumable(local_path: Path, server_path: str,
+                     connect: Callable,
+                     retries: int = UPLOAD_RETRIES,
+                     backoff: float = UPLOAD_BACKOFF,
+                     chunk_size: int = UPLOAD_CHUNK_SIZE,
+                     read_back: bool = True,
+                     resume_from: Optional[str] = None) -> None:
+    """
+    Upload a file in chunks, resume after dropped connections, verify it.
+
+    The file is uploaded to ``<server_path>.<sha256[:12]>.part`` first, so
+    a partial file is only ever resumed by the same archive. If the
+    connection drops, a new one is made (after waiting `backoff` seconds,
+    doubled for each further retry) and the upload resumes from the size of
+    the partial remote file. Once complete, the remote file is checked
+    against the sha256 in the local build manifest (or of the local file,
+    if there is no manifest), before the file is renamed to `server_path`
+    atomically. If the check fails, the partial file is removed and the
+    upload restarts from the beginning, which counts as a retry.
+
+    The remote sha256 is computed on the server if it supports that (see
+    ``irdb.transport.Session.sha256``). Otherwise, the remote file is read
+    back and hashed locally, unless `read_back` is False, in which case only
+    its size is checked.
+
+    Parameters
+    ----------
+    local_path : Path
+        Local file to upload.
+    server_path : str
+        Remote path, relative to the server's package root.
+    connect : Callable
+        Called without arguments, must return a context manager yielding a
+        ``irdb.transport.Session``, e.g. ``Backend.connect``.
+    retries : int, optional
+        How often to retry after a dropped connection or failed check.
+    backoff : float, optional
+        Seconds to wait before the first retry.
+    chunk_size : int, optional
+        Bytes per written chunk.
+    read_back : bool, optional
+        Read the whole remote file back to verify it, if the server can't
+        compute its sha256. The default is True.
+    resume_from : str, optional
+        Remote partial file of `local_path` written by other means (e.g.
+        `stream_to_server`), which the upload continues.
+
+    Raises
+    ------
+    ValueError
+        Raised if the uploaded file still doesn't match after all retries.
+
+    """
+    expected = _expected_sha256(local_path)
+    part_path = _part_path(server_path, expected)
+    for attempt in range(retries + 1):
+        try:
+            with connect() as session:
+                if resume_from is not None:
+                    _adopt_partial(session, resume_from, part_path)
+                    resume_from = None
+                _upload_chunks(session, local_path, part_path, chunk_size)
+                if (mismatch := _check_remote(session, part_path, local_path,
+                                              expected, read_back)) is None:
+                    session.rename(part_path, server_path)
+                    return
+                # Start over, the partial file can't be trusted
+                session.remove(part_path)
+            error = ValueError(f"Checksum mismatch for {server_path}: "
+                               f"{mismatch}. Upload removed.")
+        except paramiko.AuthenticationException:
+            raise
+        except (OSError, EOFError, paramiko.SSHException) as err:
+            error = err
+        if attempt == retries:
+            raise error
+        wait = backoff * 2**attempt
+        logging.warning("Upload of %s failed (%s), retrying in %.1f s.",
+                        server_path, error, wait)
+        sleep(wait)
+
+
+class PackageUploader:
+    """Upload several packages concurrently over one backend.
+
+    With the `SFTPBackend`, only one ``paramiko.Transport`` is connected and
+    authenticated, every upload then runs in its own SFTP channel on that
+    transport. At most `max_channels` uploads run at the same time. If the
+    connection drops, uploads are resumed, see `upload_resumable`.
+
+    >>> backend = SFTPBackend(login, password)
+    >>> with PackageUploader(backend, max_channels=4) as uploader:
+    ...     uploader.upload_packages(["Armazones", "ELT", "MICADO"])
+
+    Parameters
+    ----------
+    backend : Backend
+        Where to upload to, see ``irdb.transport``. Closed on exit.
+    max_channels : int, optional
+        Maximum number of concurrent uploads. The default is 4.
+    """
+
+    def __init__(self, backend: Backend, max_channels: int = 4):
+        self.backend = backend
+        self.max_channels = max_channels
+
+    def __enter__(self):
+        self.backend.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.backend.close()
+
+    def upload(self, local_path: Path, server_path: str) -> int:
+        """Upload one package (see `upload_resumable`), return its size.
+
+        The package index on the server is updated afterwards.
+        """
+        upload_resumable(local_path, server_path, self.backend.connect)
+        with self.backend.connect() as session:
+            package_index.update_index(session, server_path, local_path)
+        return local_path.stat().st_size
+
+    def upload_packages(self, pkg_names: list[str], stable: bool = False,
+                        no_confirm: bool = False) -> dict:
+        """
+        Upload the latest compiled versions of several packages.
+
+        Confirmation for stable packages is asked for all packages first,
+        then the uploads run concurrently. A summary with the aggregate
+        throughput is printed at the end.
+
+        Parameters
+        ----------
+        pkg_names : list of str
+            Must have a compiled version locally available.
+        stable : bool, optional
+            Push the latest stable (instead of dev) versions. The default is
+            False.
+        no_confirm : bool, optional
+            Don't ask for confirmation for stable packages. The default is
+            False.
+
+        Raises
+        ------
+        ValueError
+            Raised if no compiled (stable) version of a package is found
+            locally.
+
+        Returns
+        -------
+        sizes : dict
+            {"package_name": uploaded_bytes} for all successful uploads.
+
+        """
+        jobs = {}
+        for pkg_name in pkg_names:
+            local_path = _get_local_path(pkg_name, stable)
+            if (
+                not local_path.stem.endswith("dev")
+                and not no_confirm
+                and not confirm(pkg_name)
+            ):
+                continue
+            jobs[pkg_name] = (local_path,
+                              _get_server_path(pkg_name, local_path.name))
+
+        sizes = {}
+        failed = {}
+        start = perf_counter()
+        with ThreadPoolExecutor(max_workers=self.max_channels) as pool:
+            futures = {pkg_name: pool.submit(self.upload, *job)
+                       for pkg_name, job in jobs.items()}
+            for pkg_name, future in futures.items():
+                try:
+                    sizes[pkg_name] = future.result()
+                except Exception as err:
+                    logging.error("Upload of %s failed: %s", pkg_name, err)
+                    failed[pkg_name] = err
+                    continue
+                now = dt.now().strftime("%Y-%m-%d %H:%M:%S")
+                print(f"[{now}]: Pushed to server: {pkg_name}")
+        elapsed = perf_counter() - start
+
+        total = sum(sizes.values())
+        print(f"Uploaded {len(sizes)} package(s), {total / 2**20:.2f} MB in "
+              f"{elapsed:.2f} s ({total / 2**20 / max(elapsed, 1e-9):.2f} "
+              "MB/s).")
+        if failed:
+            raise next(iter(failed.values()))
+        return sizes
+
+
+def _expected_sha256(local_path: Path) -> str:
+    build_manifest = manifest.load_manifest(local_path)
+    if (build_manifest is not None
+            and build_manifest["size"] == local_path.stat().st_size):
+        return build_manifest["sha256"]
+    return manifest.hash_file(local_path)
+
+
+def _part_path(server_path: str, sha256: str) -> str:
+    return f"{server_path}.{sha256[:12]}.part"
+
+
+def _adopt_partial(session: Session, path: str, part_path: str) -> None:
+    """Rename partial upload `path` to `part_path`, if it exists."""
+    try:
+        session.rename(path, part_path)
+    except FileNotFoundError:
+        pass
+
+
+def _upload_chunks(session: Session, local_path: Path, part_path: str,
+                   chunk_size: int) -> None:
+    """Upload `local_path`, resuming from the size of `part_path`."""
+    try:
+        offset = session.stat(part_path).st_size
+    except FileNotFoundError:
+        offset = 0
+    if offset > local_path.stat().st_size:
+        offset = 0  # broken partial file, start over
+    if offset:
+        logging.info("Resuming upload of %s at byte %d.", part_path, offset)
+
+    with (local_path.open("rb") as src,
+          session.open(part_path, "r+b" if offset else "wb") as dst):
+        src.seek(offset)
+        dst.seek(offset)
+        while chunk := src.read(chunk_size):
+            dst.write(chunk)
+
+
+def _check_remote(session: Session, path: str, local_path: Path,
+                  expected: str, read_back: bool) -> Optional[str]:
+    """Compare remote file to `expected` sha256, return None if it matches.
+
+    Otherwise, return what didn't match.
+    """
+    remote = session.sha256(path)
+    if remote is None and read_back:
+        remote = _remote_sha256(session, path)
+    if remote is not None:
+        return None if remote == expected else (
+            f"expected sha256 {expected}, got {remote}")
+    size = session.stat(path).st_size
+    expected_size = local_path.stat().st_size
+    return None if size == expected_size else (
+        f"expected {expected_size} bytes, got {size}")
+
+
+def _remote_sha256(session: Session, path: str) -> str:
+    sha = hashlib.sha256()
+    with session.open(path, "rb") as file:
+        while chunk := file.read(manifest.CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class _UploadPipe:
+    """Unseekable binary stream, handing chunks to an uploader thread.
+
+    Data written to the pipe is collected into chunks of `chunk_size` bytes,
+    which are passed to the uploader thread via a queue holding at most
+    `max_chunks` chunks. If the queue is full, `write` blocks until the
+    uploader has caught up, so memory use stays bounded.
+
+    Optionally, all data is also written to `local_file`. In that case, an
+    error in the uploader (or a `remote_file` of None) only stops the
+    upload, the error is kept in `error` and the local file is completed.
+    Otherwise, the error is raised on the next `write` or on `close`.
+    """
+
+    def __init__(self, remote_file: Optional[BinaryIO],
+                 local_file: Optional[BinaryIO] = None,
+                 chunk_size: int = 2**20, max_chunks: int = 8):
+        self._remote_file = remote_file
+        self._local_file = local_file
+        self._chunk_size = chunk_size
+        self._queue = queue.Queue(maxsize=max_chunks)
+        self._buffer = bytearray()
+        self._position = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._upload, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close(raise_error=exc_type is None)
+
+    def _upload(self):
+        while (chunk := self._queue.get()) is not None:
+            if self.error is not None or self._remote_file is None:
+                continue  # keep draining so the producer never blocks
+            try:
+                self._remote_file.write(chunk)
+            except Exception as err:
+                self.error = err
+
+    def _check_error(self):
+        if self.error is not None and self._local_file is None:
+            raise self.error
+
+    def write(self, data) -> int:
+        """Buffer `data`, pass full chunks on to the uploader."""
+        self._check_error()
+        if self._local_file is not None:
+            self._local_file.write(data)
+        self._buffer += data
+        self._position += len(data)
+        if len(self._buffer) >= self._chunk_size:
+            self._queue.put(bytes(self._buffer))
+            self._buffer.clear()
+        return len(data)
+
+    def tell(self) -> int:
+        """Return number of bytes written so far."""
+        return self._position
+
+    def seek(self, *args):
+        """Not supported, makes ZipFile write in streaming mode."""
+        raise io.UnsupportedOperation("seek")
+
+    def flush(self) -> None:
+        """Do nothing, chunks are passed on when full or on `close`."""
+
+    def close(self, raise_error: bool = True) -> None:
+        """Pass on remaining data and wait for the uploader to finish."""
+        if self._buffer:
+            self._queue.put(bytes(self._buffer))
+            self._buffer.clear()
+        self._queue.put(None)
+        self._thread.join()
+        if raise_error:
+            self._check_error()
+
+
+def _stream_package(pkg_name: str, zip_name: str,
+                    remote_file: Optional[BinaryIO],
+                    local_file: Optional[BinaryIO] = None,
+                    reproducible: bool = False,
+                    policy: Optional[CompressionPolicy] = None):
+    """Compile package directly into `remote_file` (and `local_file`).
+
+    The archive written is identical to the one `zip_package_folder` creates.
+    Returns the upload error, if the upload failed but `local_file` was
+    completed, see `_UploadPipe`.
+    """
+    src_path = (PKGS_DIR / pkg_name).expanduser().resolve(strict=True)
+    with _UploadPipe(remote_file, local_file) as pipe:
+        with ZipFile(pipe, "w", ZIP_DEFLATED) as zip_file:
+            for file in _collect_package_files(src_path, sort=reproducible):
+                _write_compressed(zip_file, *_compress_file(
+                    file, _arcname(file, src_path), reproducible, policy))
+    logging.debug("Streamed %d bytes of %s.", pipe.tell(), zip_name)
+    return pipe.error
+
+
+def _open_stream(stack: ExitStack, connect: Callable,
+                 path: str) -> Optional[BinaryIO]:
+    """Open remote `path` for writing in `stack`, None if that fails."""
+    try:
+        session = stack.enter_context(connect())
+        return stack.enter_context(session.open(path, "wb"))
+    except paramiko.AuthenticationException:
+        raise
+    except (OSError, EOFError, paramiko.SSHException) as err:
+        logging.warning("Can't stream to %s (%s).", path, err)
+        return None
+
+
+def _close_stream(stack: ExitStack, path: str) -> None:
+    try:
+        stack.close()
+    except (OSError, EOFError, paramiko.SSHException) as err:
+        logging.warning("Streaming to %s interrupted (%s).", path, err)
+
+
+def _remove_partial(connect: Callable, paths: list[str]) -> None:
+    """Don't leave broken packages on the server, if still possible."""
+    try:
+        with connect() as session:
+            for path in paths:
+                try:
+                    session.remove(path)
+                except FileNotFoundError:
+                    pass
+    except (OSError, EOFError, paramiko.SSHException) as err:
+        logging.warning("Can't remove partial uploads %s: %s", paths, err)
+
+
+def stream_to_server(
+    pkg_name: str,
+    stable: bool = False,
+    keep_version: bool = False,
+    login: Optional[str] = None,
+    password: Optional[Password] = None,
+    no_confirm: bool = False,
+    keep_local: bool = True,
+    reproducible: bool = False,
+    policy: Optional[CompressionPolicy] = None,
+    backend: Optional[Backend] = None,
+) -> Optional[str]:
+    """
+    Compile a package and upload it to the univie server in one pass.
+
+    Unlike `make_package` followed by `push_to_server`, the upload doesn't
+    wait for the archive to be complete. Instead, chunks of the archive are
+    uploaded while later files are still being compressed.
+
+    The archive is also written to a temporary local file. If the
+    connection drops while streaming, compiling continues into that file,
+    and the upload is then resumed and verified like in `push_to_server`
+    (see `upload_resumable`). The local file only gets its final name in
+    `ZIPPED_DIR` once the upload succeeded.
+
+    Parameters
+    ----------
+    pkg_name : str
+        Name of the package.
+    stable : bool, optional
+        Create and push a stable release, see `make_package`. The default is
+        False.
+    keep_version : bool, optional
+        Keep the current version number, see `make_package`. The default is
+        False.
+    login : Optional[str], optional
+        Univie u:space username.
+    password : Optional[Password], optional
+        Univie u:space password.
+    no_confirm : bool, optional
+        Don't ask for confirmation for stable packages. The default is False.
+    keep_local : bool, optional
+        Keep the archive (and its build manifest) in `ZIPPED_DIR`, for
+        auditing. The default is True.
+    reproducible : bool, optional
+        Create a byte-reproducible archive, see `zip_package_folder`.
+    policy : CompressionPolicy, optional
+        Per-file compression policy, see `zip_package_folder`.
+    backend : Optional[Backend], optional
+        Upload via this backend instead of to the univie server, see
+        `push_to_server`.
+
+    Returns
+    -------
+    zip_name : str or None
+        Name of the uploaded zip file, None if aborted by the user.
+
+    """
+    if backend is None and password is None:
+        raise ValueError("Password is None. Check email for password")
+
+    if stable and not no_confirm and not confirm(pkg_name):
+        return None
+
+    previous = _load_latest_manifest(pkg_name, stable)
+    zip_name = _set_version(pkg_name, stable, keep_version)
+    server_path = _get_server_path(pkg_name, zip_name)
+    local_path = ZIPPED_DIR / zip_name
+    stream_path = f"{server_path}.stream.part"
+
+    ZIPPED_DIR.mkdir(parents=True, exist_ok=True)
+    # Not named *.zip, so it's never taken for the latest build
+    fd, tmp_name = tempfile.mkstemp(dir=ZIPPED_DIR, prefix=f".{zip_name}.",
+                                    suffix=".part")
+    tmp_path = Path(tmp_name)
+    with (SFTPBackend(login, password.value) if backend is None
+          else nullcontext(backend)) as backend:
+        try:
+            remote = ExitStack()
+            try:
+                with os.fdopen(fd, "wb") as local_file:
+                    error = _stream_package(
+                        pkg_name, zip_name,
+                        _open_stream(remote, backend.connect, stream_path),
+                        local_file, reproducible, policy)
+            finally:
+                _close_stream(remote, stream_path)
+            if error is not None:
+                logging.warning("Streaming %s interrupted (%s), resuming "
+                                "upload.", zip_name, error)
+            upload_resumable(tmp_path, server_path, backend.connect,
+                             resume_from=stream_path)
+            with backend.connect() as session:
+                package_index.update_index(session, server_path, tmp_path)
+        except Exception:
+            _remove_partial(backend.connect, [
+                stream_path,
+                _part_path(server_path, manifest.hash_file(tmp_path))])
+            tmp_path.unlink()
+            raise
+
+    if keep_local:
+        os.replace(tmp_path, local_path)
+        _write_build_manifest(pkg_name, local_path, previous)
+    else:
+        tmp_path.unlink()
+    _log_compiled(zip_name)
+    now = dt.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{now}]: Pushed to server: {pkg_name}")
+    return zip_name
 
 
 def main():
@@ -304,8 +1250,10 @@ def main():
     parser.add_argument(
         "-l",
         dest="username",
-        required=True,
-        help=r"UniVie u:space username - e.g. u\kieranl14.",
+        help=(
+            r"UniVie u:space username - e.g. u\kieranl14. Required for "
+            "uploading, unless --local-mirror is used."
+        ),
     )
     parser.add_argument(
         "-p",
@@ -355,6 +1303,110 @@ def main():
             "prevent that."
         ),
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help=(
+            "Number of worker processes used to compile the packages in "
+            "parallel. Large packages are additionally split into per-file "
+            "compression tasks. The default is 1 (serial)."
+        ),
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        action="store_true",
+        help=(
+            "Skip compiling packages whose content is identical to their "
+            "latest compiled archive (as recorded in the build manifest next "
+            "to it). The version of skipped packages is not bumped."
+        ),
+    )
+    parser.add_argument(
+        "--reproducible",
+        action="store_true",
+        help=(
+            "Create byte-reproducible archives: sorted entries, normalized "
+            "timestamps (SOURCE_DATE_EPOCH if set) and permissions, fixed "
+            "compression settings."
+        ),
+    )
+    parser.add_argument(
+        "--compression",
+        type=get_policy,
+        default=None,
+        metavar="POLICY",
+        help=(
+            "Per-file compression policy, either a name from "
+            "irdb.compression.POLICIES or a policy yaml file. By default, "
+            "all files are deflated at the default level."
+        ),
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILES,
+        default="full",
+        help=(
+            "Build profile. 'runtime' only includes the YAML files and the "
+            "files referenced from them, and reports the bytes saved "
+            "compared to 'full'. Archives of profiles other than 'full' "
+            "are written to _ZIPPED_PACKAGES/<profile> and can't be "
+            "uploaded (yet). The default is 'full'."
+        ),
+    )
+    parser.add_argument(
+        "--delta",
+        action="store_true",
+        help=(
+            "Also create a delta archive against the previous compiled "
+            "version of each package, in _ZIPPED_PACKAGES/deltas."
+        ),
+    )
+    parser.add_argument(
+        "--with-deps",
+        action="store_true",
+        help=(
+            "Also compile and/or upload all packages the specified packages "
+            "depend on (as listed under `packages:` in their default.yaml), "
+            "in dependency order. Independent packages are processed "
+            "together, see -j and --channels."
+        ),
+    )
+    parser.add_argument(
+        "--channels",
+        type=int,
+        default=4,
+        help=(
+            "When uploading several packages, they share one connection and "
+            "up to this many are uploaded concurrently. The default is 4."
+        ),
+    )
+    parser.add_argument(
+        "--local-mirror",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help=(
+            "Upload to this local folder instead of the IRDB server. It gets "
+            "the same layout as the server's InstPkgSvr folder."
+        ),
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help=(
+            "With both -c and -u set, compile and upload each package in one "
+            "pass, uploading archive chunks while later files are still "
+            "being compressed. Can't be combined with -j, -i or --delta."
+        ),
+    )
+    parser.add_argument(
+        "--no-local-copy",
+        action="store_true",
+        help="With --stream, don't keep a local copy of the archive.",
+    )
     parser.add_argument(
         "--no-confirm",
         action="store_true",
@@ -365,18 +1417,67 @@ def main():
     )
 
     args = parser.parse_args()
-    if args.compile:
-        for pkg_name in args.pkg_names:
-            make_package(pkg_name, args.stable, args.keep_version)
-    if args.upload:
-        for pkg_name in args.pkg_names:
-            push_to_server(
+    if args.upload and args.username is None and args.local_mirror is None:
+        parser.error("-l is required for uploading to the IRDB server.")
+    if args.upload and args.profile != "full":
+        parser.error("Only archives of the 'full' profile can be uploaded.")
+    if args.stream and args.compile and args.upload:
+        # Streaming compiles every package itself, serially and in full
+        unsupported = [option for option, value in [
+            ("-j", args.jobs > 1), ("-i", args.incremental),
+            ("--delta", args.delta)] if value]
+        if unsupported:
+            parser.error(f"--stream can't be combined with "
+                         f"{', '.join(unsupported)}.")
+    backend = (LocalBackend(args.local_mirror) if args.local_mirror
+               else None)
+
+    if args.with_deps:
+        waves = dependencies.publish_waves(args.pkg_names)
+        for number, wave in enumerate(waves, 1):
+            print(f"Wave {number}: {', '.join(wave)}")
+    else:
+        waves = [args.pkg_names]
+
+    if args.stream and args.compile and args.upload:
+        for pkg_name in chain.from_iterable(waves):
+            stream_to_server(
                 pkg_name,
                 args.stable,
+                args.keep_version,
+                args.username,
+                args.password,
+                args.no_confirm,
+                keep_local=not args.no_local_copy,
+                reproducible=args.reproducible,
+                policy=args.compression,
+                backend=backend,
+            )
+        return
+    # Each wave only depends on earlier ones, so it's compiled and uploaded
+    # as a whole (in parallel with -j and --channels) before the next one.
+    for pkg_names in waves:
+        if args.compile:
+            make_packages(pkg_names, args.stable, args.keep_version,
+                          args.jobs, args.incremental, args.reproducible,
+                          args.compression, args.delta, args.profile)
+        if args.upload and len(pkg_names) > 1:
+            backend = backend or SFTPBackend(args.username,
+                                             args.password.value)
+            with PackageUploader(backend, args.channels) as uploader:
+                uploader.upload_packages(pkg_names, args.stable,
+                                         args.no_confirm)
+        elif args.upload:
+            push_to_server(
+                pkg_names[0],
+                args.stable,
                 args.username,
                 args.password,
                 args.no_confirm,
+                backend=backend,
             )
+    if backend is not None:
+        backend.close()
     if not args.compile and not args.upload:
         logging.warning(
             "Neither `compile` nor `upload` option was set. "
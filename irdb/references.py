@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Resolve the files referenced in the YAML files of all packages.
+
+ScopeSim looks up a referenced file (e.g. ``filename: TER_ELT_5_mirror.dat``)
+in the folders of all packages loaded for an observation, so a reference
+doesn't have to point to a file in the package of the YAML file itself. Here,
+the search path of a package is the package itself, followed by the packages
+listed under ``packages:`` in its ``default.yaml`` (and their dependencies),
+in that order.
+
+`FileIndex` maps every file path (relative to its package) to the packages
+containing it, so a reference is resolved with one lookup per package in the
+search path. File name patterns like
+
+.. code-block:: yaml
+
+    kwargs:
+      filter_names: [J, H]
+      filename_format: "!INST.filter_file_format"
+
+are expanded with the names in the sibling ``*_names`` list, after looking up
+``!ALIAS.key`` references in the ``properties`` of the package's YAML files.
+
+Run from the IRDB root directory to list all unresolved references::
+
+    python -m irdb.references [PKG ...]
+"""
+
+import argparse
+from itertools import chain
+from typing import Optional
+from dataclasses import dataclass, field
+
+from irdb.catalog import Catalog, get_catalog
+from irdb.utils import iter_references
+
+# Follow chains of !-references at most this deep
+MAX_BANG_DEPTH = 10
+
+
+@dataclass
+class Reference:
+    """A file referenced in a YAML file, and where it was found.
+
+    `location` is ``"PKG/path/to/file"``, or None if the file is missing.
+    `pattern` is the format string, if `filename` was expanded from one.
+    """
+
+    package: str
+    yaml_file: str
+    filename: str
+    location: Optional[str] = None
+    pattern: Optional[str] = None
+
+    @property
+    def missing(self) -> bool:
+        """True if the file wasn't found in the search path."""
+        return self.location is None
+
+
+@dataclass
+class ReferenceGraph:
+    """All references of some packages, see `resolve_references`.
+
+    `unresolved` holds (package, yaml_file, value) of references that can't
+    be resolved statically, e.g. ``!OBS.psf_file`` if no YAML file sets it.
+    """
+
+    references: list = field(default_factory=list)
+    unresolved: list = field(default_factory=list)
+
+    def missing(self, pkg_name: Optional[str] = None) -> list[Reference]:
+        """References to files not found, optionally only of `pkg_name`."""
+        return [ref for ref in self.references if ref.missing
+                and pkg_name in {None, ref.package}]
+
+    def package_edges(self) -> dict[str, set[str]]:
+        """{package: {packages containing files referenced by it}}."""
+        edges = {}
+        for ref in self.references:
+            targets = edges.setdefault(ref.package, set())
+            if not ref.missing:
+                targets.add(ref.location.split("/", 1)[0])
+        return edges
+
+
+class FileIndex:
+    """Index of all files in all packages of `catalog`.
+
+    Parameters
+    ----------
+    catalog : Catalog, optional
+        Defaults to the catalog of this IRDB.
+    """
+
+    def __init__(self, catalog: Optional[Catalog] = None):
+        self.catalog = catalog or get_catalog()
+        self.by_path = {}
+        self.by_name = {}
+        self._properties = {}
+        for pkg_name, pkg_info in self.catalog.items():
+            for rel_path in pkg_info.files:
+                self.by_path.setdefault(rel_path, set()).add(pkg_name)
+                self.by_name.setdefault(rel_path.rsplit("/", 1)[-1],
+                                        []).append(f"{pkg_name}/{rel_path}")
+
+    def search_path(self, pkg_name: str) -> list[str]:
+        """The package, followed by its (transitive) dependencies."""
+        path = [pkg_name]
+        for name in path:
+            if name not in self.catalog:
+                continue
+            path.extend(dep for dep in self.catalog[name].packages
+                        if dep not in path)
+        return path
+
+    def locate(self, filename: str, search_path: list[str]) -> Optional[str]:
+        """Return ``"PKG/filename"`` for the first package containing it."""
+        rel_path = filename.removeprefix("./")
+        packages = self.by_path.get(rel_path, ())
+        for pkg_name in search_path:
+            if pkg_name in packages:
+                return f"{pkg_name}/{rel_path}"
+        return None
+
+    def locations(self, filename: str) -> list[str]:
+        """All files with the same name as `filename`, in any package."""
+        return self.by_name.get(filename.rsplit("/", 1)[-1], [])
+
+    def properties(self, search_path: list[str]) -> dict:
+        """{alias: {key: value}} of the packages in `search_path`.
+
+        The first value found wins. The properties of every package are
+        collected only once per index.
+        """
+        properties = {}
+        for pkg_name in search_path:
+            if pkg_name not in self.catalog:
+                continue
+            if pkg_name not in self._properties:
+                self._properties[pkg_name] = _add_properties(
+                    {}, chain.from_iterable(
+                        self.catalog[pkg_name].yaml_docs.values()))
+            for alias, values in self._properties[pkg_name].items():
+                merged = properties.setdefault(alias, {})
+                for key, value in values.items():
+                    merged.setdefault(key, value)
+        return properties
+
+
+def _add_properties(properties: dict, docs) -> dict:
+    """Add {alias: {key: value}} of `docs` not yet in `properties`."""
+    for doc in docs:
+        if not isinstance(doc, dict) or "alias" not in doc:
+            continue
+        for key, value in (doc.get("properties") or {}).items():
+            properties.setdefault(doc["alias"], {}).setdefault(key, value)
+    return properties
+
+
+def _with_own_properties(properties: dict, docs: list) -> dict:
+    """`properties`, overridden by those of the YAML file being resolved."""
+    own = _add_properties({}, docs)
+    return {**properties, **{alias: {**properties.get(alias, {}), **values}
+                             for alias, values in own.items()}}
+
+
+def _resolve_bang(value, properties: dict):
+    """Follow !ALIAS.key[.subkey] references, None if one can't be found."""
+    for _ in range(MAX_BANG_DEPTH):
+        if not (isinstance(value, str) and value.startswith("!")):
+            return value
+        alias, *keys = value[1:].split(".")
+        value = properties.get(alias)
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+    return None
+
+
+def _pattern_names(docs: list, path: tuple):
+    """Return the names next to the ``filename_format`` at `path`.
+
+    The names are taken from the first ``*_names`` key next to the pattern,
+    or if there's none, from the first ``*_name`` key (e.g. ``filter_name``).
+    """
+    node = docs
+    for key in path[:-1]:
+        node = node[key]
+    keys = [key for key in node if isinstance(key, str)]
+    key = next((key for key in keys if key.endswith("_names")),
+               next((key for key in keys if key.endswith("_name")), None))
+    return node.get(key)
+
+
+def package_references(pkg_name: str, index: FileIndex,
+                       graph: Optional[ReferenceGraph] = None
+                       ) -> ReferenceGraph:
+    """
+    Resolve the references in the YAML files in the folder of one package.
+
+    Parameters
+    ----------
+    pkg_name : str
+        Name of the package.
+    index : FileIndex
+        Index of all packages.
+    graph : ReferenceGraph, optional
+        Add the references to this graph, otherwise a new one is created.
+
+    Returns
+    -------
+    graph : ReferenceGraph
+    """
+    graph = graph if graph is not None else ReferenceGraph()
+    catalog = index.catalog
+    search_path = index.search_path(pkg_name)
+    search_properties = index.properties(search_path)
+    yaml_docs = catalog[pkg_name].yaml_docs
+    # Only YAML files in the package folder itself, like ScopeSim
+    for yaml_file in sorted(name for name in yaml_docs if "/" not in name):
+        properties = _with_own_properties(search_properties,
+                                          yaml_docs[yaml_file])
+
+        def add(filename, pattern=None, yaml_file=yaml_file):
+            if not isinstance(filename, str) or filename.lower() == "none":
+                return
+            graph.references.append(Reference(
+                pkg_name, yaml_file, filename,
+                index.locate(filename, search_path), pattern))
+
+        def unresolved(value, yaml_file=yaml_file):
+            graph.unresolved.append((pkg_name, yaml_file, value))
+
+        docs = yaml_docs[yaml_file]
+        for ref in iter_references(docs):
+            if ref.kind == "file":
+                filename = _resolve_bang(ref.value, properties)
+                # "#effect.kwarg" references are resolved by ScopeSim
+                if ((filename is None and ref.value is not None)
+                        or (isinstance(filename, str)
+                            and filename.startswith(("!", "#")))):
+                    unresolved(ref.value)
+                else:
+                    add(filename)
+
+            # Other *_format keys define patterns, e.g. in properties
+            elif ref.kind == "pattern" and ref.path[-1] == "filename_format":
+                pattern = _resolve_bang(ref.value, properties)
+                names = _resolve_bang(_pattern_names(docs, ref.path),
+                                      properties)
+                if isinstance(names, str):
+                    names = [names]
+                if (not isinstance(pattern, str) or "{}" not in pattern
+                        or not isinstance(names, list)):
+                    unresolved(ref.value)
+                    continue
+                for name in names:
+                    if str(name).lower() != "none":
+                        add(pattern.format(name), pattern)
+    return graph
+
+
+def resolve_references(pkg_names: Optional[list[str]] = None,
+                       index: Optional[FileIndex] = None) -> ReferenceGraph:
+    """
+    Resolve the files referenced by packages, see module docstring.
+
+    Parameters
+    ----------
+    pkg_names : list of str, optional
+        Packages to check, defaults to all packages.
+    index : FileIndex, optional
+        Index of all packages, built from the shared catalog if not given.
+
+    Returns
+    -------
+    graph : ReferenceGraph
+    """
+    index = index or FileIndex()
+    graph = ReferenceGraph()
+    for pkg_name in pkg_names or index.catalog.names():
+        package_references(pkg_name, index, graph)
+    return graph
+
+
+def main():
+    """Execute reference check CLI script."""
+    parser = argparse.ArgumentParser(
+        prog="references",
+        description="List files referenced in YAML files that don't exist.",
+    )
+    parser.add_argument(
+        "pkg_names",
+        nargs="*",
+        help="Packages to check. Default: all packages.",
+    )
+    parser.add_argument(
+        "--unresolved",
+        action="store_true",
+        help="Also list references that can't be resolved statically.",
+    )
+    args = parser.parse_args()
+    index = FileIndex()
+    graph = resolve_references(args.pkg_names, index)
+    for ref in graph.missing():
+        elsewhere = ", ".join(index.locations(ref.filename)) or "nowhere"
+        print(f"{ref.package}/{ref.yaml_file}: {ref.filename} is missing "
+              f"(found: {elsewhere})")
+    if args.unresolved:
+        for pkg_name, yaml_file, value in graph.unresolved:
+            print(f"{pkg_name}/{yaml_file}: can't resolve {value}")
+    print(f"{len(graph.references)} references, "
+          f"{len(graph.missing())} missing, "
+          f"{len(graph.unresolved)} unresolved.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fixtures shared by the irdb tests
+"""
+
+from pathlib import Path
+from collections.abc import Sequence
+
+import pytest
+import yaml
+
+# A 16x16 pixel detector, enough for ScopeSim to build an OpticalTrain
+DETECTOR = {
+    "name": "detector",
+    "class": "DetectorList",
+    "kwargs": {
+        "array_dict": {"id": [1], "x_cen": [0], "y_cen": [0],
+                       "x_size": [16], "y_size": [16], "pixel_size": [0.01],
+                       "angle": [0], "gain": [1]},
+        "x_cen_unit": "mm", "y_cen_unit": "mm", "x_size_unit": "pixel",
+        "y_size_unit": "pixel", "pixel_size_unit": "mm", "angle_unit": "deg",
+        "gain_unit": "electron/adu", "image_plane_id": 0,
+    },
+}
+
+
+class MiniIRDB:
+    """A minimal IRDB in a temporary folder, filled file by file.
+
+    >>> def test_something(mini_irdb):
+    >>>     mini_irdb.write("INST/INST.yaml", "filename: TER_gold.dat")
+    >>>     catalog = Catalog(mini_irdb.root, cache_path=False)
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def write(self, path, text: str = "") -> Path:
+        """Write `text` to `path` (relative to `root`), creating folders."""
+        path = self.root / path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+        return path
+
+    def write_tiny(self, mirror: dict,
+                   extra_modes: Sequence[dict] = ()) -> Path:
+        """
+        Write the TINY instrument package, which ScopeSim can build quickly.
+
+        Parameters
+        ----------
+        mirror : dict
+            Keyword arguments of the "mirror" ``TERCurve`` effect.
+        extra_modes : sequence of dict, optional
+            Mode yamls added after the default mode "img".
+
+        Returns
+        -------
+        path : Path
+            Folder of the package.
+        """
+        self.write("TINY/default.yaml", yaml.safe_dump({
+            "object": "configuration",
+            "alias": "OBS",
+            "name": "TINY_default",
+            "packages": ["TINY"],
+            "yamls": ["TINY.yaml"],
+            "properties": {"modes": ["img"], "dit": 1, "ndit": 1},
+            "mode_yamls": [{"object": "observation", "alias": "OBS",
+                            "name": "img", "yamls": []}, *extra_modes],
+        }))
+        self.write("TINY/TINY.yaml", yaml.safe_dump({
+            "object": "instrument",
+            "alias": "INST",
+            "name": "TINY",
+            "properties": {"temperature": 0, "pixel_scale": 0.1,
+                           "plate_scale": 0.1},
+            "effects": [
+                {"name": "mirror", "class": "TERCurve", "kwargs": mirror},
+                DETECTOR,
+            ],
+        }))
+        return self.root / "TINY"
+
+
+@pytest.fixture(name="mini_irdb")
+def fixture_mini_irdb(tmp_path):
+    """Empty `MiniIRDB` in ``tmp_path / "irdb_root"``."""
+    return MiniIRDB(tmp_path / "irdb_root")
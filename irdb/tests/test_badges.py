@@ -4,8 +4,11 @@
 Tests for irdb.badges
 """
 
+import json
+import logging
 from io import StringIO
 from unittest import mock
+from datetime import datetime as dt
 
 import yaml
 import pytest
@@ -17,6 +20,12 @@ from irdb.badges import (
     NumBadge,
     StrBadge,
     MsgOnlyBadge,
+    HTMLRenderer,
+    JSONRenderer,
+    UTC,
+    make_entries,
+    render,
+    walk_entries,
 )
 from astar_utils import NestedMapping
 
@@ -133,3 +142,169 @@ class TestReport:
             assert "## foo" in markdown
             badge = "[![](https://img.shields.io/badge/bar-bogus-lightgrey)]()"
             assert badge in markdown
+
+
+class TestShards:
+    @pytest.fixture(name="reports_dir")
+    def fixture_reports_dir(self, tmp_path):
+        (tmp_path / "_REPORTS").mkdir()
+        with mock.patch("irdb.badges.PKG_DIR", tmp_path):
+            yield tmp_path / "_REPORTS"
+
+    def test_shard_written_instead_of_report(self, reports_dir):
+        with BadgeReport(shard="gw0") as report:
+            report["!foo.bar"] = "bogus"
+        assert not (reports_dir / "badges.yaml").exists()
+        assert len(list((reports_dir / "shards" / "badges").glob(
+            "gw0-*.yaml"))) == 1
+
+    def test_merge_independent_of_order(self, reports_dir):
+        texts = []
+        for shards in (["gw0", "gw1"], ["gw1", "gw0"]):
+            for shard, (pkg, key) in zip(shards, [("B", "y"), ("A", "x")]):
+                with BadgeReport(shard=shard) as report:
+                    report[f"!{pkg}.{key}"] = "OK"
+                    report["!A.z"] = "found"
+                    report.logs.append(logging.makeLogRecord(
+                        {"levelname": "WARNING", "msg": f"{pkg} %s",
+                         "args": (key,)}))
+            assert BadgeReport.merge_shards() is not None
+            texts.append([(reports_dir / name).read_text(encoding="utf-8")
+                          for name in ("badges.yaml", "badge_report_log.txt")])
+        assert texts[0] == texts[1]
+        assert texts[0][0] == "A:\n  x: OK\n  z: found\nB:\n  y: OK\n"
+        assert texts[0][1] == "WARNING::A x\nWARNING::B y\n"
+        assert not list((reports_dir / "shards").rglob("*.yaml"))
+
+    def test_merge_conflict_keeps_first(self, reports_dir, caplog):
+        for shard, value in [("gw0", "OK"), ("gw1", "error")]:
+            with BadgeReport(shard=shard) as report:
+                report["!foo.bar"] = value
+        assert BadgeReport.merge_shards()["!foo.bar"] == "OK"
+        assert "conflicts" in caplog.text
+
+    def test_merge_all_keeps_reports_apart(self, reports_dir):
+        with BadgeReport(shard="gw0") as report:
+            report["!A.x"] = "OK"
+        with BadgeReport("perf.yaml", "perf.md", extra_reports=(),
+                         logs_filename="perf_log.txt", shard="gw1") as report:
+            report["!A.performance.zip_MiB"] = 1.5
+        reports = BadgeReport.merge_all_shards()
+        assert len(reports) == 2
+        assert (reports_dir / "badges.yaml").read_text(
+            encoding="utf-8") == "A:\n  x: OK\n"
+        assert "zip_MiB" in (reports_dir / "perf.md").read_text(
+            encoding="utf-8")
+        assert (reports_dir / "perf_log.txt").exists()
+        assert not (reports_dir / "perf.html").exists()
+        assert not list((reports_dir / "shards").rglob("*.yaml"))
+
+    def test_merge_without_shards(self, reports_dir):
+        assert BadgeReport.merge_shards() is None
+        assert BadgeReport.merge_all_shards() == []
+        assert not (reports_dir / "badges.yaml").exists()
+
+
+class TestBudgets:
+    @pytest.mark.parametrize("value, colour", [
+        (1, "green"), (2, "green"), (5.5, "orange"), (10, "orange"),
+        (10.1, "red"),
+    ])
+    def test_budget_colours(self, value, colour):
+        budget = NumBadge.get_budget(("A", "performance", "modes", "img"),
+                                     "user_commands_s")
+        badge = Badge("user_commands_s", value)
+        badge.set_budget(*budget)
+        assert badge.colour == colour
+
+    def test_no_budget(self):
+        assert Badge("user_commands_s", 100).colour == "lightblue"
+        assert NumBadge.get_budget(("A", "performance"), "bogus_s") is None
+
+    def test_only_in_section(self):
+        assert NumBadge.get_budget(("A", "performance"), "effects")
+        assert NumBadge.get_budget(("A", "other"), "effects") is None
+        assert NumBadge.get_budget(("A",), "effects") is None
+
+    def test_package_override(self):
+        with mock.patch.dict(NumBadge.package_budgets,
+                             {"A": {"performance": {"effects": (1, 2)}}}):
+            assert NumBadge.get_budget(("A", "performance"),
+                                       "effects") == (1, 2)
+            assert NumBadge.get_budget(("B", "performance"),
+                                       "effects") == (40, 80)
+
+    def test_rendered_by_path(self):
+        entry = {"A": {"performance": {"effects": 100}, "effects": 100}}
+        with StringIO() as str_stream:
+            make_entries(str_stream, entry)
+            markdown = str_stream.getvalue()
+        assert "effects-100-red" in markdown
+        assert "effects-100-lightblue" in markdown
+
+
+class TestRenderers:
+    entry = {
+        "A": {"b": {"c": {"d": {"e": 1, "f": "!OK"}, "g": True}},
+              "h": "error", "empty": {}},
+        "<B>": {"performance": {"zip_MiB": 40.0}},
+    }
+    created = dt(2024, 1, 2, 3, 4, 5, tzinfo=UTC)
+
+    def test_walk_entries(self):
+        events = list(walk_entries({"A": {"b": {"c": 1}, "d": "x"}}))
+        assert events == [
+            ("open", "A", None, 0),
+            ("open", "b", None, 1),
+            ("badge", "c", 1, 2),
+            ("close", "b", None, 1),
+            ("badge", "d", "x", 1),
+            ("close", "A", None, 0),
+        ]
+
+    def test_walk_entries_deep(self):
+        entry = leaf = {}
+        for _ in range(5000):
+            leaf["x"] = leaf = {}
+        leaf["y"] = "ok"
+        assert sum(1 for _ in walk_entries(entry)) == 10001
+
+    def test_markdown(self):
+        with StringIO() as str_stream:
+            render(str_stream, self.entry, created=self.created)
+            markdown = str_stream.getvalue()
+        assert "**Created on UTC 2024-01-02 03:04:05**" in markdown
+        assert "\n  * d: \n    * [![](https://img.shields.io/badge/e-1" \
+            in markdown
+
+    def test_json_same_as_json_dump(self):
+        with StringIO() as str_stream:
+            render(str_stream, self.entry, JSONRenderer, self.created)
+            text = str_stream.getvalue()
+        expected = {"created": self.created.isoformat(), "badges": self.entry}
+        assert text == json.dumps(expected, indent=2) + "\n"
+
+    def test_json_empty(self):
+        with StringIO() as str_stream:
+            render(str_stream, {}, JSONRenderer, self.created)
+            assert json.loads(str_stream.getvalue())["badges"] == {}
+
+    def test_html_self_contained(self):
+        with StringIO() as str_stream:
+            render(str_stream, self.entry, HTMLRenderer, self.created)
+            page = str_stream.getvalue()
+        assert "<img" not in page and "shields.io" not in page
+        assert "<h2>&lt;B&gt;</h2>" in page
+        assert ("<span class=\"key\">zip_MiB</span>"
+                "<span style=\"background:#e05d44\">40.0</span>") in page
+        assert "<span style=\"background:#97ca00\">f</span>" in page
+        assert page.count("<section>") == page.count("</section>") == 6
+        assert page.count("<ul>") == page.count("</ul>") == 1
+
+    def test_report_writes_all_formats(self, temp_dir):
+        with mock.patch("irdb.badges.PKG_DIR", temp_dir):
+            with BadgeReport("all.yaml", "all.md",
+                             extra_reports=["all.html", "all.json"]) as report:
+                report["!foo.bar"] = "bogus"
+        for suffix in ["md", "html", "json"]:
+            assert (temp_dir / f"_REPORTS/all.{suffix}").exists()
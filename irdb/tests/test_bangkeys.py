@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.bangkeys
+"""
+
+from unittest import mock
+
+import pytest
+import yaml
+
+from irdb import bangkeys
+from irdb.catalog import Catalog
+from irdb.references import FileIndex
+
+
+@pytest.fixture(name="index")
+def fixture_index(mini_irdb):
+    pkg_dir = mini_irdb.root
+    mini_irdb.write("INST/default.yaml", yaml.safe_dump({
+        "alias": "OBS",
+        "packages": ["TEL", "INST"],
+        "yamls": ["TEL.yaml", "INST.yaml"],
+        "properties": {"modes": ["ao", "img"], "dit": 1},
+        "mode_yamls": [
+            {"object": "instrument", "alias": "OBS", "name": "ao",
+             "properties": {"psf_file": "PSF_AO.fits"}},
+            {"object": "instrument", "alias": "OBS", "name": "seeing",
+             "properties": {"psf_name": "!OBS.seeing"}},
+            {"object": "observation", "alias": "OBS", "name": "img",
+             "yamls": ["INST_IMG.yaml"],
+             "properties": {"filter_name": "J"}},
+            {"object": "observation", "alias": "OBS", "name": "spec",
+             "yamls": ["INST_SPEC.yaml"]},
+            {"object": "observation", "alias": "OBS", "name": "old",
+             "deprecate": "Don't use this", "yamls": ["gone.yaml"]},
+        ],
+    }))
+    mini_irdb.write("INST/INST.yaml", yaml.safe_dump({
+        "alias": "DET",
+        "properties": {"dit": "!OBS.dit", "layout": {"file_name": "a.dat"}},
+        "effects": [
+            {"kwargs": {"filename": "!DET.layout.file_name",
+                        "psf": "!OBS.psf_file",
+                        "bin_width": "!SIM.spectral.spectral_bin_width"}},
+            {"kwargs": {"mode_properties": {"fast": {"!DET.mindit": 1}}}},
+            {"kwargs": {"mindit": "!DET.mindit"}},
+        ],
+    }))
+    mini_irdb.write("INST/INST_IMG.yaml", yaml.safe_dump({
+        "effects": [{"kwargs": {"current_filter": "!OBS.filter_name"}}],
+    }))
+    mini_irdb.write("INST/INST_SPEC.yaml", yaml.safe_dump({
+        "effects": [{"kwargs": {"current_filter": "!OBS.filter_name",
+                                "area": "!TEL.aera"}}],
+    }))
+    mini_irdb.write("TEL/TEL.yaml", yaml.safe_dump({
+        "alias": "TEL", "properties": {"area": 978},
+    }))
+    return FileIndex(Catalog(pkg_dir, cache_path=False))
+
+
+def test_mode_combinations(index):
+    default_doc = index.catalog["INST"].yaml_docs["default.yaml"][0]
+    combinations = bangkeys.mode_combinations(default_doc)
+    assert {name: [mode["name"] for mode in modes]
+            for name, modes in combinations.items()} == {
+        "ao": ["img", "ao"],
+        "seeing": ["img", "seeing"],
+        "img": ["ao", "img"],
+        "spec": ["ao", "spec"],
+    }
+
+
+def test_check_package(index):
+    issues = bangkeys.check_packages(index=index)
+    assert {(issue.mode, issue.value) for issue in issues} == {
+        ("seeing", "!OBS.psf_file"),
+        ("seeing", "!OBS.seeing"),
+        ("spec", "!OBS.filter_name"),
+        ("spec", "!TEL.aera"),
+    }
+    issue = next(issue for issue in issues if issue.value == "!TEL.aera")
+    assert issue.yaml_file == "INST/INST_SPEC.yaml"
+    assert issue.location == "0:effects[0].kwargs.area"
+
+
+def test_missing_yaml(index):
+    pkg_dir = index.catalog.pkg_dir
+    (pkg_dir / "TEL" / "TEL.yaml").unlink()
+    issues = bangkeys.check_packages(
+        ["INST"], FileIndex(Catalog(pkg_dir, cache_path=False)))
+    assert ("yamls", "TEL.yaml") in {(issue.location, issue.value)
+                                     for issue in issues}
+
+
+def test_sim_keys_skipped_without_scopesim(index):
+    with mock.patch("irdb.bangkeys.scopesim_defaults", return_value=[]):
+        issues = bangkeys.check_packages(["INST"], index)
+    assert "!SIM.spectral.spectral_bin_width" not in {
+        issue.value for issue in issues}
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.catalog
+"""
+
+import os
+from unittest import mock
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+import yaml
+
+from irdb import catalog as cat
+
+
+@pytest.fixture(name="pkg_dir")
+def fixture_pkg_dir(mini_irdb):
+    pkg_dir = mini_irdb.root
+    mini_irdb.write("INST/default.yaml", yaml.safe_dump_all([
+        {"packages": ["TEL", "INST"], "yamls": ["INST.yaml"]},
+        {"effects": [{"kwargs": {"filename": "TER_gold.dat"}}]},
+    ]))
+    mini_irdb.write("INST/INST.yaml", "filename: TRACE.fits")
+    mini_irdb.write("INST/broken.yaml", "a: [b")
+    mini_irdb.write("INST/TER_gold.dat", "data")
+    mini_irdb.write("INST/filters/TC_filter_J.dat", "data")
+    mini_irdb.write("INST/inst_pkgs/OTHER/x.dat", "data")
+    mini_irdb.write("INST/__pycache__/x.pyc", "data")
+    mini_irdb.write("TEL/TEL.yaml", "filename: TER_tel.dat")
+    mini_irdb.write("irdb/utils.py")
+    mini_irdb.write("_REPORTS/report.md")
+    mini_irdb.write(".github/workflow.yml")
+    return pkg_dir
+
+
+@pytest.fixture(name="catalog")
+def fixture_catalog(pkg_dir, tmp_path):
+    return cat.Catalog(pkg_dir, tmp_path / "catalog.pickle")
+
+
+def test_names(catalog):
+    assert catalog.names() == ["INST", "TEL"]
+    assert "INST" in catalog
+    assert "irdb" not in catalog
+    with pytest.raises(KeyError):
+        catalog["_REPORTS"]
+
+
+def test_files(catalog, pkg_dir):
+    inst = catalog["INST"]
+    assert sorted(inst.files) == ["INST.yaml", "TER_gold.dat", "broken.yaml",
+                                  "default.yaml", "filters/TC_filter_J.dat"]
+    assert inst.files["TER_gold.dat"].size == 4
+    assert inst.files["TER_gold.dat"].sha256 == cat.hash_file(
+        pkg_dir / "INST" / "TER_gold.dat")
+    assert inst.glob("*.dat") == [pkg_dir / "INST" / "TER_gold.dat",
+                                  pkg_dir / "INST/filters/TC_filter_J.dat"]
+
+
+def test_yaml_contents(catalog):
+    inst = catalog["INST"]
+    assert inst.yaml_docs["INST.yaml"] == [{"filename": "TRACE.fits"}]
+    assert "broken.yaml" not in inst.yaml_docs
+    assert inst.yaml_errors["broken.yaml"].startswith("ParserError")
+    assert inst.packages == ["TEL", "INST"]
+    assert inst.yamls == ["INST.yaml"]
+    assert inst.referenced_filenames["default.yaml"] == ["TER_gold.dat"]
+    assert catalog["TEL"].packages == []
+
+
+def test_cache_reused(pkg_dir, catalog, tmp_path):
+    catalog["INST"]
+    catalog.save()
+    assert (tmp_path / "catalog.pickle").exists()
+
+    with mock.patch("irdb.catalog.hash_file") as mock_hash:
+        new_catalog = cat.Catalog(pkg_dir, tmp_path / "catalog.pickle")
+        assert new_catalog["INST"] == catalog["INST"]
+    mock_hash.assert_not_called()
+    assert not new_catalog._dirty
+
+
+def test_changed_files_reread(pkg_dir, catalog, tmp_path):
+    catalog["INST"]
+    catalog.save()
+    yaml_path = pkg_dir / "INST" / "INST.yaml"
+    yaml_path.write_text("filename: TRACE_new.fits", encoding="utf-8")
+    os.utime(yaml_path, ns=(0, 0))
+    (pkg_dir / "INST" / "TER_gold.dat").unlink()
+
+    with mock.patch("irdb.catalog.hash_file",
+                    wraps=cat.hash_file) as mock_hash:
+        inst = cat.Catalog(pkg_dir, tmp_path / "catalog.pickle")["INST"]
+    assert [call.args[0] for call in mock_hash.call_args_list] == [yaml_path]
+    assert inst.yaml_docs["INST.yaml"] == [{"filename": "TRACE_new.fits"}]
+    assert "TER_gold.dat" not in inst.files
+
+
+def test_no_disk_cache(pkg_dir):
+    catalog = cat.Catalog(pkg_dir, cache_path=False)
+    assert catalog["TEL"].files
+    catalog.save()
+
+
+def _save_in_process(pkg_dir, cache_path):
+    catalog = cat.Catalog(pkg_dir, cache_path)
+    for pkg_name in catalog:
+        catalog.refresh(pkg_name)
+    catalog.save()
+
+
+def test_concurrent_saves(pkg_dir, tmp_path):
+    cache_path = tmp_path / "catalog.pickle"
+    with ProcessPoolExecutor(4) as pool:
+        for future in [pool.submit(_save_in_process, pkg_dir, cache_path)
+                       for _ in range(8)]:
+            future.result()
+    assert cat.Catalog(pkg_dir, cache_path)["INST"].files
+    # No temporary files left behind
+    assert sorted(os.listdir(tmp_path)) == ["catalog.pickle", "irdb_root"]
+
+
+def test_not_saved_by_forked_process(pkg_dir, tmp_path):
+    catalog = cat.Catalog(pkg_dir, tmp_path / "catalog.pickle")
+    catalog.refresh("TEL")
+    with (mock.patch("irdb.catalog._CATALOG", catalog),
+          mock.patch("irdb.catalog._CATALOG_PID", os.getpid() + 1)):
+        cat._save_catalog()
+    assert not (tmp_path / "catalog.pickle").exists()
+    with (mock.patch("irdb.catalog._CATALOG", catalog),
+          mock.patch("irdb.catalog._CATALOG_PID", os.getpid())):
+        cat._save_catalog()
+    assert (tmp_path / "catalog.pickle").exists()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.compression
+"""
+
+import os
+from zipfile import ZIP_STORED, ZIP_DEFLATED, ZIP_LZMA, ZipFile
+
+import pytest
+
+from irdb.compression import (
+    CompressionPolicy,
+    POLICIES,
+    parse_method,
+    get_policy,
+    benchmark,
+)
+
+
+@pytest.fixture(name="files")
+def fixture_files(tmp_path):
+    text = tmp_path / "curve.dat"
+    text.write_text("# wavelength transmission\n" + "1.0 0.5\n" * 10000,
+                    encoding="utf-8")
+    noise = tmp_path / "noise.fits"
+    noise.write_bytes(os.urandom(2**17))
+    gzipped = tmp_path / "traces.txt.gz"
+    gzipped.write_bytes(os.urandom(1024))
+    return {"text": text, "noise": noise, "gzipped": gzipped}
+
+
+class TestParseMethod:
+    @pytest.mark.parametrize("spec, expected", [
+        ("stored", (ZIP_STORED, None)),
+        ("deflate", (ZIP_DEFLATED, None)),
+        ("deflate:9", (ZIP_DEFLATED, 9)),
+        ("LZMA", (ZIP_LZMA, None)),
+    ])
+    def test_valid(self, spec, expected):
+        assert parse_method(spec) == expected
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_method("bogus")
+
+
+class TestChoose:
+    def test_default(self, files):
+        assert CompressionPolicy().choose(files["noise"]) == (ZIP_DEFLATED,
+                                                              None)
+
+    def test_longest_suffix_wins(self, files):
+        policy = CompressionPolicy(suffixes={".gz": "deflate:1",
+                                             ".txt.gz": "stored"})
+        assert policy.choose(files["gzipped"]) == (ZIP_STORED, None)
+
+    def test_probe_incompressible(self, files):
+        policy = CompressionPolicy(probe=True)
+        assert policy.choose(files["noise"]) == (ZIP_STORED, None)
+
+    def test_probe_compressible(self, files):
+        policy = CompressionPolicy(probe=True)
+        assert policy.choose(files["text"]) == (ZIP_DEFLATED, None)
+
+
+class TestGetPolicy:
+    def test_named(self):
+        assert get_policy("smart") is POLICIES["smart"]
+
+    def test_from_yaml(self, tmp_path, files):
+        path = tmp_path / "policy.yaml"
+        path.write_text("default: lzma\nsuffixes:\n  .dat: deflate:9\n",
+                        encoding="utf-8")
+        policy = get_policy(str(path))
+        assert policy.choose(files["text"]) == (ZIP_DEFLATED, 9)
+        assert policy.choose(files["noise"]) == (ZIP_LZMA, None)
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            get_policy("bogus")
+
+
+def test_zip_package_folder_uses_policy(tmp_path):
+    from irdb.publish import zip_package_folder
+    policy = CompressionPolicy("lzma", {".dat": "stored"})
+    zip_path = zip_package_folder("test_package", "test_package.policy",
+                                  policy=policy, zipped_dir=tmp_path)
+    with ZipFile(zip_path) as zip_file:
+        assert zip_file.testzip() is None
+        types = {zinfo.filename: zinfo.compress_type
+                 for zinfo in zip_file.infolist() if not zinfo.is_dir()}
+    assert types["test_package/TC_filter_Ks.dat"] == ZIP_STORED
+    assert types["test_package/default.yaml"] == ZIP_LZMA
+
+
+def test_benchmark_reports_all_policies():
+    results = benchmark(["test_package"])
+    assert [row["policy"] for row in results] == list(POLICIES)
+    assert all(row["size"] > 0 for row in results)
+    assert all(row["build"] >= 0 and row["extract"] >= 0 for row in results)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.dedup
+"""
+
+import os
+from unittest import mock
+
+import pytest
+
+from irdb import dedup
+
+
+@pytest.fixture(name="packages")
+def fixture_packages(tmp_path):
+    files = {
+        "METIS/TER_mirror_gold.dat": "gold",
+        "HAWKI/TER_mirror_gold.dat": "gold",
+        "MICADO/filters/gold.dat": "gold",
+        "ELT/TER_ELT_mirror_mgf2agal.dat": "mgf2agal" * 10,
+        "HST/TER_ELT_mirror_mgf2agal.dat": "mgf2agal" * 10,
+        "METIS/unique.dat": "unique",
+        "METIS/empty.dat": "",
+        "HAWKI/empty.dat": "",
+    }
+    for name, text in files.items():
+        path = tmp_path / "pkgs" / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    return tmp_path / "pkgs"
+
+
+def test_find_duplicates(packages):
+    groups = dedup.find_duplicates([packages])
+    assert [len(group.files) for group in groups] == [2, 3]
+    assert groups[0].wasted == 80
+    assert groups[1].wasted == 8
+    assert packages / "MICADO" / "filters" / "gold.dat" in groups[1].files
+
+
+def test_unique_sizes_not_hashed(packages):
+    (packages / "METIS" / "unique.dat").write_text("x" * 1000)
+    with mock.patch("irdb.dedup.hash_file",
+                    wraps=dedup.hash_file) as mock_hash:
+        dedup.find_duplicates([packages])
+    hashed = [call.args[0] for call in mock_hash.call_args_list]
+    assert len(hashed) == 5
+    assert packages / "METIS" / "unique.dat" not in hashed
+
+
+def test_link_to_store(packages, tmp_path):
+    store = tmp_path / "store"
+    assert dedup.link_to_store([packages], store) == 4 + 4 + 80
+    gold = [packages / "METIS" / "TER_mirror_gold.dat",
+            packages / "HAWKI" / "TER_mirror_gold.dat",
+            packages / "MICADO" / "filters" / "gold.dat"]
+    assert all(os.path.samefile(gold[0], file) for file in gold[1:])
+    assert gold[0].read_text() == "gold"
+    assert os.stat(gold[0]).st_nlink == 4
+    # Running again changes nothing
+    assert dedup.link_to_store([packages], store) == 0
+
+
+def test_link_requires_paths(tmp_path, capsys):
+    store = tmp_path / "store"
+    with (mock.patch("sys.argv", ["dedup", "--link", str(store)]),
+          mock.patch("irdb.dedup.link_to_store") as link):
+        with pytest.raises(SystemExit):
+            dedup.main()
+    assert "--link requires explicit paths" in capsys.readouterr().err
+    link.assert_not_called()
+
+
+def test_link_given_paths(packages, tmp_path, capsys):
+    store = tmp_path / "store"
+    with mock.patch("sys.argv",
+                    ["dedup", str(packages), "--link", str(store)]):
+        dedup.main()
+    assert "Saved" in capsys.readouterr().out
+    assert store.is_dir()
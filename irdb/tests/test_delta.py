@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.delta
+"""
+
+from zipfile import ZipFile
+
+import pytest
+
+from irdb import manifest
+from irdb.delta import make_delta, apply_delta, delta_name
+
+BASE = {
+    "bogus/bogus.yaml": b"alias: INST",
+    "bogus/version.yaml": b"version: 2023-07-20.dev",
+    "bogus/data/TER_unchanged.dat": b"1 0.5\n" * 100,
+    "bogus/data/TER_changed.dat": b"1 0.9\n",
+    "bogus/data/TER_deleted.dat": b"1 0.1\n",
+}
+TARGET = {
+    "bogus/bogus.yaml": b"alias: INST",
+    "bogus/version.yaml": b"version: 2023-07-21.dev",
+    "bogus/data/TER_unchanged.dat": b"1 0.5\n" * 100,
+    "bogus/data/TER_changed.dat": b"1 0.8\n",
+    "bogus/data/new/TER_added.dat": b"1 0.7\n",
+}
+
+
+def _make_zip(path, files):
+    with ZipFile(path, "w") as zip_file:
+        for name, data in files.items():
+            zip_file.writestr(name, data)
+    return path
+
+
+@pytest.fixture(name="zips")
+def fixture_zips(tmp_path):
+    return (_make_zip(tmp_path / "bogus.2023-07-20.dev.zip", BASE),
+            _make_zip(tmp_path / "bogus.2023-07-21.dev.zip", TARGET))
+
+
+@pytest.fixture(name="extracted_base")
+def fixture_extracted_base(tmp_path, zips):
+    pkg_root = tmp_path / "inst_pkgs"
+    with ZipFile(zips[0]) as zip_file:
+        zip_file.extractall(pkg_root)
+    return pkg_root
+
+
+class TestMakeDelta:
+    def test_name(self, zips):
+        assert delta_name(*zips) == "bogus.2023-07-20.dev_2023-07-21.dev.zip"
+
+    def test_contains_only_changes(self, zips):
+        delta_path = make_delta(*zips)
+        assert delta_path.parent.name == "deltas"
+        with ZipFile(delta_path) as zip_file:
+            names = set(zip_file.namelist())
+        assert names == {"delta.yaml", "bogus/version.yaml",
+                         "bogus/data/TER_changed.dat",
+                         "bogus/data/new/TER_added.dat"}
+
+    def test_uses_build_manifest(self, zips, tmp_path):
+        entries = {name: {"size": 0, "mtime": 0, "sha256": "bogus"}
+                   for name in BASE}
+        manifest.write_manifest(zips[0], entries)
+        delta_path = make_delta(*zips, delta_dir=tmp_path)
+        with ZipFile(delta_path) as zip_file:
+            # All hashes differ from the fake base manifest
+            assert len(zip_file.namelist()) == len(TARGET) + 1
+
+
+class TestApplyDelta:
+    def test_result_equals_target(self, zips, extracted_base):
+        apply_delta(extracted_base, make_delta(*zips))
+        files = {path.relative_to(extracted_base).as_posix(): path.read_bytes()
+                 for path in extracted_base.rglob("*") if path.is_file()}
+        assert files == TARGET
+
+    def test_repeatable(self, zips, extracted_base):
+        delta_path = make_delta(*zips)
+        apply_delta(extracted_base, delta_path)
+        apply_delta(extracted_base, delta_path)
+
+    def test_wrong_base_raises(self, zips, extracted_base):
+        (extracted_base / "bogus/data/TER_changed.dat").write_bytes(b"foo")
+        with pytest.raises(ValueError, match="doesn't match"):
+            apply_delta(extracted_base, make_delta(*zips))
+        # nothing was touched
+        assert (extracted_base / "bogus/data/TER_deleted.dat").exists()
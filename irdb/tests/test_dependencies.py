@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.dependencies
+"""
+
+import pytest
+import yaml
+
+from irdb import dependencies
+
+
+@pytest.fixture(name="packages")
+def fixture_packages(tmp_path):
+    """MICADO-like stack with two independent instruments."""
+    stacks = {
+        "Armazones": None,
+        "ELT": None,
+        "MORFEO": None,
+        "MICADO": ["Armazones", "ELT", "MORFEO", "MICADO"],
+        "MICADO_Sci": ["Armazones", "ELT", "MORFEO", "MICADO", "MICADO_Sci"],
+        "METIS": ["Armazones", "ELT", "METIS"],
+    }
+    packages = {}
+    for pkg_name, deps in stacks.items():
+        pkg_path = tmp_path / pkg_name
+        pkg_path.mkdir()
+        if deps is not None:
+            docs = [{"object": "configuration", "packages": deps},
+                    {"name": "mode"}]
+            (pkg_path / "default.yaml").write_text(
+                yaml.safe_dump_all(docs), encoding="utf-8")
+        packages[pkg_name] = pkg_path
+    return packages
+
+
+def test_load_graph(packages):
+    graph = dependencies.load_graph(packages)
+    assert graph["ELT"] == set()
+    assert graph["MICADO"] == {"Armazones", "ELT", "MORFEO"}
+
+
+def test_waves(packages):
+    graph = dependencies.load_graph(packages)
+    waves = dependencies.publish_waves(["MICADO_Sci", "METIS"], graph)
+    assert waves == [["Armazones", "ELT", "MORFEO"], ["METIS", "MICADO"],
+                     ["MICADO_Sci"]]
+
+
+def test_waves_without_deps(packages):
+    graph = dependencies.load_graph(packages)
+    waves = dependencies.publish_waves(["MICADO_Sci", "ELT", "METIS"], graph,
+                                       with_deps=False)
+    assert waves == [["ELT"], ["METIS", "MICADO_Sci"]]
+
+
+def test_missing_dependency(packages):
+    graph = dependencies.load_graph(packages)
+    graph["METIS"].add("WCU")
+    with pytest.raises(ValueError, match=r"WCU \(needed by METIS\)"):
+        dependencies.publish_waves(["METIS"], graph)
+
+
+def test_unknown_package(packages):
+    graph = dependencies.load_graph(packages)
+    with pytest.raises(ValueError, match="Unknown package"):
+        dependencies.publish_waves(["bogus"], graph)
+
+
+def test_cycle(packages):
+    graph = dependencies.load_graph(packages)
+    graph["ELT"].add("MICADO")
+    with pytest.raises(ValueError, match="ELT -> MICADO -> ELT"):
+        dependencies.publish_waves(["MICADO"], graph)
+
+
+def test_irdb_packages_have_no_cycles():
+    waves = dependencies.publish_waves(["MICADO_Sci", "METIS", "MOSAIC"])
+    assert waves[0] == ["Armazones", "ELT", "MORFEO"]
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.fileversions
+"""
+
+import datetime as dt
+from unittest import mock
+
+import pytest
+
+from irdb import fileversions
+from irdb.fileversions import IRDBFile, read_header, validate_files
+
+DAT_TEXT = """\
+# name: TER_test
+# date_created: 2022-01-01
+#   date_modified: 2022-02-01
+# changes:
+#   - 2022-02-01 (OC) new curve
+
+wavelength transmission
+# wavelength_unit: um
+0.5 0.9
+
+1.0 0.8
+2.0 0.7
+"""
+
+
+@pytest.fixture(name="dat_file")
+def fixture_dat_file(tmp_path):
+    path = tmp_path / "TER_test.dat"
+    path.write_text(DAT_TEXT, encoding="utf-8")
+    return path
+
+
+def test_read_header(dat_file):
+    header = read_header(dat_file)
+    assert header.colnames == ["wavelength", "transmission"]
+    assert header.n_rows is None
+    assert header.meta["date_modified"] == dt.date(2022, 2, 1)
+    assert header.meta["changes"] == ["2022-02-01 (OC) new curve"]
+    # Comments below the column names belong to the header
+    assert header.meta["wavelength_unit"] == "um"
+
+
+def test_read_header_counts_rows(dat_file):
+    assert read_header(dat_file, count_rows=True).n_rows == 3
+
+
+def test_from_file(dat_file):
+    dat = IRDBFile.from_file(dat_file)
+    assert dat.name == "TER_test.dat"
+    assert dat.date_created == dt.date(2022, 1, 1)
+    assert dat.last_change.author == "OC"
+    dat.validate_dates()
+
+
+def test_from_file_without_yaml_header(tmp_path):
+    path = tmp_path / "TRACE.dat"
+    path.write_text("# Trace file\nwave x\n1 2\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="not a yaml mapping"):
+        IRDBFile.from_file(path)
+
+
+@pytest.fixture(name="dat_files")
+def fixture_dat_files(dat_file):
+    conflict = dat_file.with_name("TER_conflict.dat")
+    conflict.write_text(DAT_TEXT.replace("2022-02-01 (OC)", "2022-03-01 (OC)"),
+                        encoding="utf-8")
+    unreadable = dat_file.with_name("TRACE.dat")
+    unreadable.write_text("# Trace file\nwave x\n1 2\n", encoding="utf-8")
+    return [dat_file, conflict, unreadable]
+
+
+def test_validate_files(dat_files, tmp_path):
+    checks = validate_files(dat_files, cache_path=tmp_path / "cache.pickle")
+    # Sorted by file name
+    assert [(check.file, check.status) for check in checks] == [
+        (str(dat_files[1]), "conflict"),
+        (str(dat_files[0]), "ok"),
+        (str(dat_files[2]), "unreadable"),
+    ]
+    assert checks[0].last_change == dt.date(2022, 3, 1)
+    assert "not equal" in checks[0].reason
+
+
+def test_validate_files_cached(dat_files, tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    checks = validate_files(dat_files, cache_path=cache_path)
+    dat_files[1].write_text(DAT_TEXT, encoding="utf-8")
+    with mock.patch("irdb.fileversions._check_file",
+                    wraps=fileversions._check_file) as mock_check:
+        new_checks = validate_files(dat_files, cache_path=cache_path)
+    assert mock_check.call_count == 1
+    assert new_checks[0].status == "ok"
+    assert new_checks[1:] == checks[1:]
+
+
+def test_validate_files_subset_keeps_cache(dat_files, tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    validate_files(dat_files, cache_path=cache_path)
+    dat_files[1].write_text(DAT_TEXT, encoding="utf-8")
+    validate_files(dat_files[1:2], cache_path=cache_path)
+    cached = fileversions._load_checks(cache_path)
+    assert sorted(name for name, _ in cached) == sorted(
+        str(file) for file in dat_files)
+    # Only the current result of the changed file is kept
+    assert [check.status for (name, _), check in cached.items()
+            if name == str(dat_files[1])] == ["ok"]
+
+
+def test_deleted_files_dropped_from_cache(dat_files, tmp_path):
+    cache_path = tmp_path / "cache.pickle"
+    validate_files(dat_files, cache_path=cache_path)
+    dat_files[2].unlink()
+    dat_files[1].write_text(DAT_TEXT, encoding="utf-8")
+    validate_files(dat_files[1:2], cache_path=cache_path)
+    cached = fileversions._load_checks(cache_path)
+    assert sorted(name for name, _ in cached) == sorted(
+        str(file) for file in dat_files[:2])
+
+
+def test_validate_files_parallel(dat_files):
+    assert (validate_files(dat_files, jobs=2, cache_path=None)
+            == validate_files(dat_files, jobs=1, cache_path=None))
+
+
+def test_jobs_default_to_cpu_count(dat_files):
+    with (mock.patch("irdb.fileversions.os.cpu_count", return_value=3),
+          mock.patch("irdb.fileversions.ProcessPoolExecutor",
+                     wraps=fileversions.ProcessPoolExecutor) as mock_pool):
+        validate_files(dat_files, cache_path=None)
+    mock_pool.assert_called_once_with(max_workers=3)
+
+
+def test_results_table(dat_files):
+    table = fileversions.results_table(
+        validate_files(dat_files, cache_path=None))
+    assert table.colnames == ["file", "status", "reason", "date_created",
+                              "date_modified", "last_change"]
+    assert list(table["status"]) == ["conflict", "ok", "unreadable"]
+    assert list(table["last_change"]) == ["2022-03-01", "2022-02-01", ""]
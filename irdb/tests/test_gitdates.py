@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.gitdates
+"""
+
+import os
+import shutil
+import subprocess
+import datetime as dt
+
+import pytest
+
+from irdb import gitdates
+from irdb.catalog import Catalog
+
+pytestmark = pytest.mark.skipif(shutil.which("git") is None,
+                                reason="git not installed")
+
+
+def _commit(repo, date, files):
+    for name, text in files.items():
+        path = repo / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text, encoding="utf-8")
+    env = {**os.environ, "GIT_AUTHOR_DATE": f"{date}T12:00:00",
+           "GIT_COMMITTER_DATE": f"{date}T12:00:00"}
+    subprocess.run(["git", "add", *files], cwd=repo, check=True)
+    subprocess.run(["git", "-c", "user.name=Test", "-c", "user.email=t@t",
+                    "commit", "-q", "-m", f"Commit {date}"],
+                   cwd=repo, check=True, env=env)
+
+
+@pytest.fixture(name="repo")
+def fixture_repo(tmp_path):
+    repo = tmp_path / "irdb_root"
+    repo.mkdir()
+    subprocess.run(["git", "init", "-q"], cwd=repo, check=True)
+    _commit(repo, "2022-01-10", {
+        "INST/TER_a.dat": "# date_modified: 2022-01-10\nwave\n1\n",
+        "INST/TER_b.dat": "# date_modified: 2022-01-10\nwave\n1\n",
+        "INST/INST.yaml": "date_modified: 2022-01-10\n",
+        "INST/README.md": "Not checked",
+    })
+    _commit(repo, "2022-03-01", {
+        "INST/TER_b.dat": "# date_modified: 2022-01-10\nwave\n2\n",
+        "INST/INST.yaml": "date_modified: 2022-02-28\nname: x\n",
+        "INST/README.md": "Still not checked",
+    })
+    (repo / "INST" / "TER_new.dat").write_text(
+        "# date_modified: 2020-01-01\nwave\n1\n", encoding="utf-8")
+    return repo
+
+
+def test_last_commit_dates(repo):
+    assert gitdates.last_commit_dates(repo) == {
+        "INST/TER_a.dat": dt.date(2022, 1, 10),
+        "INST/TER_b.dat": dt.date(2022, 3, 1),
+        "INST/INST.yaml": dt.date(2022, 3, 1),
+        "INST/README.md": dt.date(2022, 3, 1),
+    }
+
+
+def test_find_stale_headers(repo):
+    catalog = Catalog(repo, cache_path=False)
+    stale = gitdates.find_stale_headers(catalog=catalog)
+    assert [(header.file, header.days) for header in stale] == [
+        ("INST/INST.yaml", 1), ("INST/TER_b.dat", 50)]
+    assert gitdates.find_stale_headers(1, catalog) == stale[1:]
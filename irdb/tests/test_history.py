@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.history
+"""
+
+import sqlite3
+from datetime import datetime as dt
+
+import pytest
+
+from irdb import history
+
+
+def _badges(load_time, zip_size=1.0):
+    return {
+        "METIS": {
+            "package_type": "observation",
+            "structure": {"TER_x.dat": "missing"},
+            "performance": {
+                "zip_MiB": zip_size,
+                "modes": {"lss_n": {"optical_train_s": load_time,
+                                    "build": "error"}},
+            },
+        },
+        "ELT": {"performance": {"zip_MiB": 2.0}},
+    }
+
+
+@pytest.fixture(name="db_path")
+def fixture_db_path(tmp_path):
+    db_path = tmp_path / "history.sqlite"
+    for day, load_time in enumerate([10, 11, 9, 10, 30, 31], start=1):
+        history.record_run(_badges(load_time), f"commit{day}",
+                           dt(2024, 1, day), db_path, "performance")
+    return db_path
+
+
+def test_flatten_badges():
+    assert list(history.flatten_badges(_badges(5))) == [
+        ("METIS", "package_type", "observation"),
+        ("METIS", "structure/TER_x.dat", "missing"),
+        ("METIS", "performance/zip_MiB", 1.0),
+        ("METIS", "performance/modes/lss_n/optical_train_s", 5),
+        ("METIS", "performance/modes/lss_n/build", "error"),
+        ("ELT", "performance/zip_MiB", 2.0),
+    ]
+
+
+def test_trend(db_path):
+    rows = history.trend("METIS", "*/optical_train_s", db_path)
+    assert [value for *_, value in rows] == [10, 11, 9, 10, 30, 31]
+    assert rows[0][:2] == ("2024-01-01T00:00:00", "commit1")
+    assert history.trend("METIS", "structure/*", db_path)[-1][-1] == "missing"
+
+
+def test_jumps(db_path):
+    rows = history.jumps("METIS", "performance/*", db_path=db_path)
+    assert rows == [("2024-01-05T00:00:00", "commit5",
+                     "performance/modes/lss_n/optical_train_s", 10, 30)]
+
+
+def test_regressions(db_path):
+    found = history.regressions(window=4, db_path=db_path)
+    assert [(reg.package, reg.metric, reg.median) for reg in found] == [
+        ("METIS", "performance/modes/lss_n/optical_train_s", 10.5)]
+    assert found[0].ratio == pytest.approx(31 / 10.5)
+    assert not history.regressions(window=1, db_path=db_path)
+
+
+def test_regressions_need_two_runs(tmp_path):
+    db_path = tmp_path / "history.sqlite"
+    assert not history.regressions(db_path=db_path)
+    history.record_run(_badges(10), "commit", db_path=db_path,
+                       report="performance")
+    assert not history.regressions(db_path=db_path)
+
+
+def test_interleaved_reports(tmp_path):
+    db_path = tmp_path / "history.sqlite"
+    for day, load_time in enumerate([10, 11, 9, 10, 30, 31], start=1):
+        # Every test session records the performance and the badges report
+        history.record_run(_badges(load_time), f"commit{day}",
+                           dt(2024, 1, day), db_path, "performance")
+        history.record_run({"METIS": {"package_type": "observation"}},
+                           f"commit{day}", dt(2024, 1, day), db_path)
+    found = history.regressions(window=4, db_path=db_path)
+    assert [(reg.package, reg.metric, reg.median) for reg in found] == [
+        ("METIS", "performance/modes/lss_n/optical_train_s", 10.5)]
+    assert not history.regressions(window=4, db_path=db_path,
+                                   report="badges")
+    assert len(history.trend("METIS", db_path=db_path,
+                             report="badges")) == 6
+    assert len(history.jumps("METIS", "performance/*", db_path=db_path,
+                             report="performance")) == 1
+
+
+def test_runs_without_report_kept(tmp_path):
+    db_path = tmp_path / "history.sqlite"
+    with sqlite3.connect(db_path) as connection:
+        connection.execute("CREATE TABLE runs (id INTEGER PRIMARY KEY, "
+                           "commit_hash TEXT, created TEXT NOT NULL)")
+        connection.execute("INSERT INTO runs (commit_hash, created) "
+                           "VALUES ('old', '2024-01-01T00:00:00')")
+    connection.close()
+    history.record_run({"ELT": {"package_type": "support"}}, "new",
+                       db_path=db_path, report="performance")
+    connection = history.connect(db_path)
+    assert connection.execute(
+        "SELECT commit_hash, report FROM runs ORDER BY id").fetchall() == [
+            ("old", "badges"), ("new", "performance")]
+    connection.close()
+
+
+def test_append_only(db_path):
+    connection = history.connect(db_path)
+    for statement in ["UPDATE badges SET number = 0", "DELETE FROM runs"]:
+        with pytest.raises(sqlite3.IntegrityError, match="append-only"):
+            connection.execute(statement)
+    connection.close()
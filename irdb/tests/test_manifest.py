@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.manifest
+"""
+
+import hashlib
+from unittest import mock
+
+import pytest
+
+from irdb import manifest
+
+
+@pytest.fixture(name="src_path")
+def fixture_src_path(tmp_path):
+    src_path = tmp_path / "bogus_package"
+    (src_path / "sub").mkdir(parents=True)
+    (src_path / "foo.dat").write_text("foo", encoding="utf-8")
+    (src_path / "sub" / "bar.yaml").write_text("bar: 42", encoding="utf-8")
+    return src_path
+
+
+def _files(src_path):
+    return sorted(src_path.rglob("*"))
+
+
+class TestScanFiles:
+    def test_keys_relative_to_parent(self, src_path):
+        entries = manifest.scan_files(src_path, _files(src_path))
+        assert set(entries) == {"bogus_package/foo.dat",
+                                "bogus_package/sub/bar.yaml"}
+
+    def test_hash_correct(self, src_path):
+        entries = manifest.scan_files(src_path, _files(src_path))
+        expected = hashlib.sha256(b"foo").hexdigest()
+        assert entries["bogus_package/foo.dat"]["sha256"] == expected
+
+    def test_reuses_cached_hash(self, src_path):
+        previous = manifest.scan_files(src_path, _files(src_path))
+        with mock.patch("irdb.manifest.hash_file") as mock_hash:
+            entries = manifest.scan_files(src_path, _files(src_path), previous)
+            mock_hash.assert_not_called()
+        assert entries == previous
+
+    def test_rehashes_changed_file(self, src_path):
+        previous = manifest.scan_files(src_path, _files(src_path))
+        (src_path / "foo.dat").write_text("foobar", encoding="utf-8")
+        entries = manifest.scan_files(src_path, _files(src_path), previous)
+        assert not manifest.same_content(entries, previous)
+
+
+class TestManifestFile:
+    def test_roundtrip(self, src_path, tmp_path):
+        zip_path = tmp_path / "bogus_package.2023-07-20.dev.zip"
+        zip_path.write_bytes(b"not really a zip")
+        entries = manifest.scan_files(src_path, _files(src_path))
+        path = manifest.write_manifest(zip_path, entries)
+        assert path.name == "bogus_package.2023-07-20.dev.manifest.yaml"
+        loaded = manifest.load_manifest(zip_path)
+        assert loaded["archive"] == zip_path.name
+        assert loaded["sha256"] == manifest.hash_file(zip_path)
+        assert loaded["files"] == entries
+
+    def test_missing_returns_none(self, tmp_path):
+        assert manifest.load_manifest(tmp_path / "bogus.zip") is None
+
+
+def test_same_content_ignores():
+    entries = {"a": {"sha256": "1"}, "b": {"sha256": "2"}}
+    other = {"a": {"sha256": "1"}, "b": {"sha256": "3"}}
+    assert not manifest.same_content(entries, other)
+    assert manifest.same_content(entries, other, ignore={"b"})
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import os
 import logging
 from pathlib import Path
 
@@ -9,9 +10,11 @@ import yaml
 from scopesim.effects.data_container import DataContainer
 from astropy.io.ascii import InconsistentTableError
 
-from irdb.utils import get_packages, recursive_filename_search
+from irdb.utils import get_packages
+from irdb.catalog import get_catalog
+from irdb.references import resolve_references
 from irdb.badges import BadgeReport
-from irdb.fileversions import IRDBFile
+from irdb.fileversions import validate_files
 
 # HACK: This is necessary because scopesim has import side effects that mess up
 #       logging here, specifically capture. Once that's solved, the following
@@ -29,14 +32,40 @@ pytestmark = pytest.mark.badges
 # and: https://pytest-dependency.readthedocs.io/en/stable/advanced.html
 
 
+# Referenced files that are missing from the IRDB, remove them when fixed
+KNOWN_MISSING_FILES = {
+    "GTC": {"PSF_GTC_OSIRIS.fits"},
+    "METIS": {"Leiden_atmo_ter.fits", "QE_detector_Aquarius.dat",
+              "FPA_linearity_Aquarius.dat"},
+}
+
+
+def _set_file_badge(badges, pkg_name, group, filename, value):
+    # File names contain dots, so no bang-string. Creates the group if no
+    # other test did on this (xdist) worker.
+    badges.setdefault(pkg_name, {}).setdefault(group, {})[filename] = value
+
+
 @pytest.fixture(name="pkg_dir", scope="module")
 def fixture_pkg_dir():
     return Path(__file__).parent.parent.parent
 
 
+@pytest.fixture(name="references", scope="module")
+def fixture_references():
+    return resolve_references()
+
+
+@pytest.fixture(name="date_checks", scope="module")
+def fixture_date_checks():
+    # One process per CPU, unless pytest-xdist already runs one per CPU
+    return validate_files(jobs=1 if os.getenv("PYTEST_XDIST_WORKER") else 0)
+
+
 @pytest.fixture(name="badges", scope="module")
 def fixture_badges():
-    with BadgeReport() as report:
+    # One shard per xdist worker, merged in conftest.pytest_sessionfinish
+    with BadgeReport(shard=os.getenv("PYTEST_XDIST_WORKER", "main")) as report:
         yield report
 
 
@@ -89,66 +118,37 @@ class TestFileStructureOfPackages:
             badges[f"!{pkg_name}.structure.self_named_yaml"] = "not found"
         assert result, pkg_name
 
-    @pytest.mark.xfail(
-        reason=("Most of the missing files seem to exist in other packages "
-                "though, so they are probably okay.")
-    )
-    def test_all_files_referenced_in_yamls_exist(self, package, badges):
-        missing_files = []
+    def test_all_files_referenced_in_yamls_exist(self, package, badges,
+                                                 references):
         pkg_name, pkg_path = package
         yaml_files = list(pkg_path.glob("*.yaml"))
-        for yaml_file in yaml_files:
-            with yaml_file.open(encoding="utf-8") as file:
-                # An error here shouldn't pass silently. If this regularly
-                # produces [the same] error(s), *that* error(s) should be
-                # caught and handled accordingly!
-                # Additionally: should test_all_yaml_files_readable assert
-                # that these files don't produce any errors? Hmmm
-                # try:
-                yaml_dicts = list(yaml.full_load_all(file))
-                # except Exception:
-                #     yaml_dicts = []
-
-            fnames = []
-            for yaml_dict in yaml_dicts:
-                fnames.extend(recursive_filename_search(yaml_dict))
-
-            for fname in fnames:
-                if fname is None:
-                    continue
-                if not isinstance(fname, (list, tuple)):
-                    fname = [fname]
-                for fn in fname:
-                    if fn.lower() != "none" and not fn.startswith("!"):
-                        full_fname = pkg_path / fn
-                        if not full_fname.exists():
-                            badges[pkg_name]["structure"][fn] = "missing"
-                            # Since with the parametrisation, we only have one
-                            # missing_files list per pkg, don't need full name.
-                            # missing_files.append(str(full_fname))
-                            missing_files.append(fn)
+        # Files may be in any package in the search path, see irdb.references
+        missing_files = sorted({ref.filename for ref
+                                in references.missing(pkg_name)})
+        for fn in missing_files:
+            _set_file_badge(badges, pkg_name, "structure", fn, "missing")
 
         if not yaml_files:
             badges[f"!{pkg_name}.structure.no_files_referenced"] = "!NONE"
         elif yaml_files and not missing_files:
             badges[f"!{pkg_name}.structure.no_missing_files"] = "!OK"
+        if missing_files and set(missing_files) <= KNOWN_MISSING_FILES.get(
+                pkg_name, set()):
+            pytest.xfail(f"{pkg_name}: known missing files {missing_files}")
         assert not missing_files, f"{pkg_name}: {missing_files=}"
 
     def test_all_yaml_files_readable(self, package, badges):
         yamls_bad = []
         pkg_name, pkg_path = package
         yaml_files = list(pkg_path.glob("*.yaml"))
+        yaml_errors = get_catalog()[pkg_name].yaml_errors
         for yaml_file in yaml_files:
-            with yaml_file.open(encoding="utf-8") as file:
-                try:
-                    _ = list(yaml.full_load_all(file))
-                except Exception:
-                    # TODO: maybe Exception is too general? This used to be a
-                    #       bare except anyway...
-                    # TODO: maybe record *what* error was produced here,
-                    #       similar to how we do in test_all_dat_files_readable
-                    yamls_bad.append(str(yaml_file))
-                    badges[f"!{pkg_name}.contents"][yaml_file.name] = "error"
+            if yaml_file.name in yaml_errors:
+                # TODO: maybe record *what* error was produced here,
+                #       similar to how we do in test_all_dat_files_readable
+                yamls_bad.append(str(yaml_file))
+                _set_file_badge(badges, pkg_name, "contents",
+                                yaml_file.name, "error")
 
         if not yaml_files:
             badges[f"!{pkg_name}.contents.no_yaml_files"] = "!NONE"
@@ -169,7 +169,7 @@ class TestPackageDatFiles:
                    "value_error": [],
                    "unexpected_error": []}
         pkg_name, pkg_path = package
-        fns_dat = list(pkg_path.rglob("*.dat"))
+        fns_dat = get_catalog()[pkg_name].glob("*.dat")
         assert fns_dat
         for fn_dat in fns_dat:
             fn_loc = fn_dat.relative_to(pkg_dir)
@@ -179,18 +179,21 @@ class TestPackageDatFiles:
             except InconsistentTableError as err:
                 logging.error("%s InconsistentTableError %s", str(fn_loc), err)
                 bad_files.append(str(fn_loc))
-                badges[f"!{fn_loc.parts[0]}.contents"][fn_loc.name] = "error"
+                _set_file_badge(badges, fn_loc.parts[0], "contents",
+                                fn_loc.name, "error")
                 how_bad["inconsistent_table_error"].append(str(fn_loc))
             except ValueError as err:
                 logging.error("%s ValeError %s", str(fn_loc), err)
                 bad_files.append(str(fn_loc))
-                badges[f"!{fn_loc.parts[0]}.contents"][fn_loc.name] = "error"
+                _set_file_badge(badges, fn_loc.parts[0], "contents",
+                                fn_loc.name, "error")
                 how_bad["value_error"].append(str(fn_loc))
             except Exception as err:
                 logging.error("%s Unexpected Exception %s %s", str(fn_loc),
                               err.__class__, err)
                 bad_files.append(str(fn_loc))
-                badges[f"!{fn_loc.parts[0]}.contents"][fn_loc.name] = "error"
+                _set_file_badge(badges, fn_loc.parts[0], "contents",
+                                fn_loc.name, "error")
                 how_bad["unexpected_error"].append(str(fn_loc))
         if any(how_bad.values()):
             logging.info(how_bad)
@@ -203,37 +206,33 @@ class TestPackageDatFiles:
                 "critical inconsistencies, which would pollute the tests, so "
                 "xfail this for now, report is generated regardless.")
     )
-    def test_all_dat_files_consistent(self, package, pkg_dir, badges, caplog):
+    def test_all_dat_files_consistent(self, package, date_checks, badges,
+                                      caplog):
         bad_files = []
         how_bad = {"file_read_error": [],
                    "value_error": [],
                    "unexpected_error": []}
-        # fns_dat = list(IRDBFile.from_folder(pkg_dir))
         pkg_name, pkg_path = package
-        fns_dat = list(pkg_path.rglob("*.dat"))
-        assert fns_dat
-        for fn_dat in fns_dat:
-            fn_loc = fn_dat.relative_to(pkg_dir)
-            try:
-                dat_file = IRDBFile.from_file(fn_dat)
-            except Exception as err:
-                logging.error("%s Error reading dat file %s", str(fn_loc), err)
-                # bad_files.append(str(fn_loc))
-                how_bad["file_read_error"].append(str(fn_loc))
-
-            try:
-                dat_file.validate_dates()
-            except ValueError as err:
-                logging.error("%s ValeError %s", str(fn_loc), err)
-                bad_files.append(str(fn_loc))
-                badges[f"!{fn_loc.parts[0]}.dates"][dat_file.name] = "conflict"
-                how_bad["value_error"].append(str(fn_loc))
-            except Exception as err:
-                logging.error("%s Unexpected Exception %s %s", str(fn_loc),
-                              err.__class__, err)
-                bad_files.append(str(fn_loc))
-                badges[f"!{fn_loc.parts[0]}.dates"][dat_file.name] = "error"
-                how_bad["unexpected_error"].append(str(fn_loc))
+        checks = [check for check in date_checks
+                  if check.file.startswith(f"{pkg_name}/")]
+        assert checks
+        for check in checks:
+            fn_name = Path(check.file).name
+            if check.status == "unreadable":
+                logging.error("%s Error reading dat file %s", check.file,
+                              check.reason)
+                how_bad["file_read_error"].append(check.file)
+            elif check.status == "conflict":
+                logging.error("%s ValeError %s", check.file, check.reason)
+                bad_files.append(check.file)
+                _set_file_badge(badges, pkg_name, "dates", fn_name, "conflict")
+                how_bad["value_error"].append(check.file)
+            elif check.status == "error":
+                logging.error("%s Unexpected Exception %s", check.file,
+                              check.reason)
+                bad_files.append(check.file)
+                _set_file_badge(badges, pkg_name, "dates", fn_name, "error")
+                how_bad["unexpected_error"].append(check.file)
         if any(how_bad.values()):
             logging.info(how_bad)
         badges.logs.extend(caplog.records)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.package_index
+"""
+
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+from zipfile import ZipFile
+
+import pytest
+import yaml
+import httpx
+
+from irdb import package_index, manifest
+from irdb.transport import LocalBackend
+
+
+def _make_zip(path, pkg_name, version=None, packages=None):
+    with ZipFile(path, "w") as zip_file:
+        if version is not None:
+            zip_file.writestr(f"{pkg_name}/version.yaml",
+                              yaml.safe_dump(version))
+        if packages is not None:
+            zip_file.writestr(f"{pkg_name}/default.yaml",
+                              "---\n" + yaml.safe_dump({"packages": packages})
+                              + "---\nname: mode\n")
+    return path
+
+
+@pytest.fixture(name="backend")
+def fixture_backend(tmp_path):
+    return LocalBackend(tmp_path / "InstPkgSvr")
+
+
+class TestIndexEntry:
+    def test_dependencies_and_version(self, tmp_path):
+        zip_path = _make_zip(
+            tmp_path / "METIS.2024-02-01.dev.zip", "METIS",
+            {"version": "2024-02-01.dev", "release": "dev",
+             "timestamp": "2024-02-01 10:12:45"},
+            ["Armazones", "ELT", "METIS"])
+        entry = package_index.index_entry("METIS", zip_path, "abc", 42)
+        assert entry == {"size": 42, "sha256": "abc", "release": "dev",
+                         "timestamp": "2024-02-01 10:12:45",
+                         "dependencies": ["Armazones", "ELT"]}
+
+    def test_without_yamls(self, tmp_path):
+        zip_path = _make_zip(tmp_path / "foo.2024-02-01.zip", "foo")
+        entry = package_index.index_entry("foo", zip_path, "abc", 42)
+        assert entry["dependencies"] == []
+        index = package_index.add_to_index({}, "locations/foo.2024-02-01.zip",
+                                           entry)
+        assert index["packages"]["foo"]["2024-02-01"]["release"] == "stable"
+
+
+class TestUpdateIndex:
+    def test_adds_versions(self, backend, tmp_path):
+        for version in ["2024-02-01", "2024-01-01.dev"]:
+            zip_path = _make_zip(tmp_path / f"ELT.{version}.zip", "ELT",
+                                 packages=["Armazones", "ELT"])
+            with backend.connect() as session:
+                session.put(zip_path, f"telescopes/{zip_path.name}")
+                package_index.update_index(
+                    session, f"telescopes/{zip_path.name}", zip_path)
+
+        index = yaml.safe_load(
+            (backend.root / package_index.INDEX_NAME).read_text())
+        versions = index["packages"]["ELT"]
+        assert list(versions) == ["2024-01-01.dev", "2024-02-01"]
+        assert versions["2024-02-01"]["file"] == \
+            "telescopes/ELT.2024-02-01.zip"
+        assert versions["2024-02-01"]["sha256"] == manifest.hash_file(zip_path)
+        assert versions["2024-02-01"]["dependencies"] == ["Armazones"]
+        assert not (backend.root / f"{package_index.INDEX_NAME}.part").exists()
+
+    def test_reads_back_without_local_copy(self, backend, tmp_path):
+        zip_path = _make_zip(tmp_path / "ELT.2024-02-01.zip", "ELT")
+        with backend.connect() as session:
+            session.put(zip_path, "telescopes/ELT.2024-02-01.zip")
+            index = package_index.update_index(
+                session, "telescopes/ELT.2024-02-01.zip")
+        entry = index["packages"]["ELT"]["2024-02-01"]
+        assert entry["size"] == zip_path.stat().st_size
+        assert entry["sha256"] == manifest.hash_file(zip_path)
+
+    def test_seeded_from_server_listing(self, backend, tmp_path):
+        old = _make_zip(tmp_path / "Armazones.2023-01-01.zip", "Armazones")
+        zip_path = _make_zip(tmp_path / "ELT.2024-02-01.zip", "ELT")
+        with backend.connect() as session:
+            session.put(old, "locations/Armazones.2023-01-01.zip")
+            session.put(zip_path, "telescopes/ELT.2024-02-01.zip")
+            index = package_index.update_index(
+                session, "telescopes/ELT.2024-02-01.zip", zip_path)
+        assert list(index["packages"]) == ["Armazones", "ELT"]
+        seeded = index["packages"]["Armazones"]["2023-01-01"]
+        assert seeded["file"] == "locations/Armazones.2023-01-01.zip"
+        assert seeded["size"] == old.stat().st_size
+        assert seeded["release"] == "stable"
+        assert seeded["sha256"] is None
+        assert index["packages"]["ELT"]["2024-02-01"]["sha256"] == \
+            manifest.hash_file(zip_path)
+
+    def test_merges_concurrent_update(self, backend, tmp_path):
+        with backend.connect() as session:
+            with session.open(package_index.INDEX_NAME, "wb") as file:
+                file.write(b"packages: {}\n")
+        other = {"packages": {"MICADO": {"2024-01-01": {"file": "bogus"}}}}
+        read_index = package_index._read_index
+        calls = []
+
+        def read_and_interfere(session):
+            calls.append(session)
+            if len(calls) == 2:
+                # Another publisher replaces the index in the meantime
+                with session.open(package_index.INDEX_NAME, "wb") as file:
+                    file.write(yaml.safe_dump(other).encode())
+            return read_index(session)
+
+        zip_path = _make_zip(tmp_path / "ELT.2024-02-01.zip", "ELT")
+        with (backend.connect() as session,
+              mock.patch("irdb.package_index._read_index",
+                         read_and_interfere)):
+            package_index.update_index(
+                session, "telescopes/ELT.2024-02-01.zip", zip_path)
+        index = yaml.safe_load(
+            (backend.root / package_index.INDEX_NAME).read_text())
+        assert list(index["packages"]) == ["ELT", "MICADO"]
+        assert len(calls) == 5
+        assert not list(backend.root.glob("*.part"))
+
+    def test_redone_if_replaced_after_rename(self, backend, tmp_path):
+        other = {"packages": {"MICADO": {"2024-01-01": {"file": "bogus"}}}}
+        read_index = package_index._read_index
+        calls = []
+
+        def read_and_interfere(session):
+            calls.append(session)
+            if len(calls) == 3:
+                # Another publisher renames its index right after ours
+                with session.open(package_index.INDEX_NAME, "wb") as file:
+                    file.write(yaml.safe_dump(other).encode())
+            return read_index(session)
+
+        zip_path = _make_zip(tmp_path / "ELT.2024-02-01.zip", "ELT")
+        with (backend.connect() as session,
+              mock.patch("irdb.package_index._read_index",
+                         read_and_interfere),
+              mock.patch("irdb.package_index.seed_index", return_value={})):
+            package_index.update_index(
+                session, "telescopes/ELT.2024-02-01.zip", zip_path)
+        index = yaml.safe_load(
+            (backend.root / package_index.INDEX_NAME).read_text())
+        assert list(index["packages"]) == ["ELT", "MICADO"]
+        assert len(calls) == 6
+        assert not list(backend.root.glob("*.part"))
+
+
+class TestLoadIndex:
+    @staticmethod
+    def _client(responses):
+        def handler(request):
+            responses.append(request)
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(
+                200, text=yaml.safe_dump({"packages": {"ELT": {"1": {}}}}),
+                headers={"ETag": '"v1"'})
+        return httpx.Client(base_url="https://bogus/",
+                            transport=httpx.MockTransport(handler))
+
+    def test_revalidates_cached_copy(self, tmp_path):
+        requests = []
+        with mock.patch("irdb.package_index.create_client",
+                        lambda url: self._client(requests)):
+            first = package_index.get_all_package_versions("https://bogus/",
+                                                           tmp_path)
+            second = package_index.get_all_package_versions("https://bogus/",
+                                                            tmp_path)
+        assert first == second == {"ELT": ["1"]}
+        assert len(requests) == 2
+        assert requests[1].headers["If-None-Match"] == '"v1"'
+
+    def test_offline_uses_cached_copy(self, tmp_path):
+        with mock.patch("irdb.package_index.create_client",
+                        lambda url: self._client([])):
+            package_index.load_index("https://bogus/", tmp_path)
+
+        def offline(request):
+            raise httpx.ConnectError("offline")
+        client = httpx.Client(base_url="https://bogus/",
+                              transport=httpx.MockTransport(offline))
+        with mock.patch("irdb.package_index.create_client",
+                        lambda url: client):
+            index = package_index.load_index("https://bogus/", tmp_path)
+        assert index == {"packages": {"ELT": {"1": {}}}}
+
+    def test_concurrent_lookups(self, tmp_path):
+        with mock.patch("irdb.package_index.create_client",
+                        lambda url: self._client([])):
+            with ThreadPoolExecutor(8) as pool:
+                results = list(pool.map(
+                    lambda _: package_index.load_index("https://bogus/",
+                                                       tmp_path), range(16)))
+        assert all(index == {"packages": {"ELT": {"1": {}}}}
+                   for index in results)
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "index.yaml", "index.yaml.meta"]
+
+    def test_falls_back_to_crawling(self, tmp_path):
+        client = httpx.Client(
+            base_url="https://bogus/",
+            transport=httpx.MockTransport(lambda req: httpx.Response(404)))
+        with (mock.patch("irdb.package_index.create_client",
+                         lambda url: client),
+              mock.patch("irdb.package_index.db.get_all_package_versions",
+                         return_value={"ELT": ["2"]}) as mock_crawl):
+            assert package_index.get_all_package_versions(
+                "https://bogus/", tmp_path) == {"ELT": ["2"]}
+            mock_crawl.assert_called_once()
+
+    def test_package_missing_from_index(self, tmp_path):
+        with (mock.patch("irdb.package_index.load_index",
+                         return_value={"packages": {"ELT": {"1": {}}}}),
+              mock.patch("irdb.package_index.db.get_all_package_versions",
+                         return_value={"ELT": ["1"], "METIS": ["2"]}
+                         ) as mock_crawl):
+            assert package_index.get_package_versions(
+                "ELT", "https://bogus/", tmp_path) == ["1"]
+            mock_crawl.assert_not_called()
+            assert package_index.get_package_versions(
+                "METIS", "https://bogus/", tmp_path) == ["2"]
+            assert package_index.get_package_versions(
+                "bogus", "https://bogus/", tmp_path) == []
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Performance badges of all packages, see irdb.performance
+"""
+
+import os
+
+import pytest
+
+from irdb.utils import get_packages
+from irdb.references import resolve_references
+from irdb.badges import BadgeReport, NumBadge
+from irdb.performance import measure_package, add_badges
+
+# Builds all modes of all packages, so not part of the badges run, see
+# .github/workflows/badge_report.yml
+pytestmark = [pytest.mark.performance, pytest.mark.slow]
+
+
+@pytest.fixture(name="references", scope="module")
+def fixture_references():
+    return resolve_references()
+
+
+@pytest.fixture(name="badges", scope="module")
+def fixture_badges():
+    # One shard per xdist worker, merged in conftest.pytest_sessionfinish
+    with BadgeReport("performance.yaml", "performance.md",
+                     extra_reports=("performance.html", "performance.json"),
+                     logs_filename="performance_log.txt",
+                     shard=os.getenv("PYTEST_XDIST_WORKER", "main")) as report:
+        yield report
+
+
+def _over_budget(entry: dict, path: tuple[str, ...]) -> list[str]:
+    over = []
+    for key, value in entry.items():
+        if isinstance(value, dict):
+            over.extend(_over_budget(value, (*path, key)))
+            continue
+        budget = NumBadge.get_budget(path, key)
+        if budget is not None and value > budget[1]:
+            over.append(f"{'.'.join(path[2:] + (key,))}={value}")
+    return over
+
+
+@pytest.mark.parametrize("package", list(get_packages()),
+                         ids=lambda package: package[0])
+class TestPackagePerformance:
+    def test_modes_build_within_budget(self, package, references, badges,
+                                       caplog):
+        pkg_name, _ = package
+        metrics = measure_package(pkg_name, references)
+        add_badges(badges, metrics)
+        badges.logs.extend(caplog.records)
+
+        over = _over_budget(badges[pkg_name]["performance"],
+                            (pkg_name, "performance"))
+        assert not over, f"{pkg_name} over budget: {over}"
+        errors = [mode.mode for mode in metrics.modes
+                  if mode.error and not mode.download_error]
+        assert not errors, f"{pkg_name} modes can't be built: {errors}"
+        downloads = [mode.mode for mode in metrics.modes
+                     if mode.download_error]
+        if downloads:
+            # The report is generated regardless
+            pytest.xfail(f"{pkg_name} modes need to download data: "
+                         f"{downloads}")
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.performance
+"""
+
+from io import StringIO
+from unittest import mock
+
+import httpx
+import pytest
+import yaml
+
+from irdb import performance as perf
+from irdb.badges import BadgeReport, make_entries
+from irdb.catalog import Catalog
+
+
+@pytest.fixture(name="catalog")
+def fixture_catalog(mini_irdb):
+    mini_irdb.write_tiny({"filename": "TER_mirror.dat"}, [
+        {"object": "observation", "alias": "OBS", "name": "broken",
+         "yamls": ["broken.yaml"]},
+    ])
+    mini_irdb.write("TINY/TER_mirror.dat",
+                    "# wavelength_unit: um\nwavelength transmission "
+                    "emissivity\n0.5 1 0\n2.5 1 0\n")
+    mini_irdb.write("TINY/broken.yaml", yaml.safe_dump({
+        "alias": "INST",
+        "effects": [{"name": "bogus", "class": "NoSuchEffect"}],
+    }))
+    mini_irdb.write("TINY/unused.dat", "x" * 1000)
+    return Catalog(mini_irdb.root, cache_path=False)
+
+
+def test_measure_package(catalog):
+    metrics = perf.measure_package("TINY", catalog=catalog)
+    assert metrics.referenced_bytes == catalog["TINY"].files[
+        "TER_mirror.dat"].size
+    assert 0 < metrics.zip_size < catalog["TINY"].size
+
+    img, broken = metrics.modes
+    assert img.mode == "img"
+    assert img.error is None
+    assert img.n_effects == 2
+    assert img.user_commands_time > 0 and img.optical_train_time > 0
+    assert img.memory_peak > 0
+    assert broken.mode == "broken"
+    assert broken.error is not None
+    assert not broken.download_error
+
+
+def test_no_build(catalog):
+    metrics = perf.measure_package("TINY", catalog=catalog, build=False)
+    assert metrics.modes == []
+
+
+def test_default_modes(catalog):
+    metrics = perf.measure_mode("TINY", "default", None, catalog.pkg_dir)
+    assert metrics.error is None
+    assert metrics.n_effects == 2
+
+
+def test_download_error(catalog):
+    with mock.patch("scopesim.OpticalTrain",
+                    side_effect=httpx.ConnectError("offline")):
+        metrics = perf.measure_mode("TINY", "img", ["img"], catalog.pkg_dir)
+    assert metrics.error == "ConnectError: offline"
+    assert metrics.download_error
+
+
+def test_add_badges():
+    report = BadgeReport()
+    metrics = perf.PackageMetrics("TINY", 3 * perf.MiB, 40 * perf.MiB, [
+        perf.ModeMetrics("img", 0.5, 1.234, 100 * perf.MiB, 2),
+        perf.ModeMetrics("broken", 0.5, None, 50 * perf.MiB, None, "Error"),
+    ])
+    perf.add_badges(report, metrics)
+    assert report["TINY"]["performance"] == {
+        "referenced_MiB": 3.0,
+        "zip_MiB": 40.0,
+        "modes": {
+            "img": {"user_commands_s": 0.5, "optical_train_s": 1.23,
+                    "memory_peak_MiB": 100.0, "effects": 2},
+            "broken": {"user_commands_s": 0.5, "memory_peak_MiB": 50.0,
+                       "build": "error"},
+        },
+    }
+    with StringIO() as str_stream:
+        make_entries(str_stream, report.dic)
+        markdown = str_stream.getvalue()
+    assert "referenced_MiB-3.0-green" in markdown
+    assert "zip_MiB-40.0-red" in markdown
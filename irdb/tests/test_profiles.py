@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.profiles
+"""
+
+import pytest
+import yaml
+
+from irdb import profiles
+
+
+@pytest.fixture(name="src_path")
+def fixture_src_path(mini_irdb):
+    src_path = mini_irdb.root / "INST"
+    mini_irdb.write("INST/default.yaml", yaml.safe_dump_all([
+        {"packages": ["TEL", "INST"],
+         "properties": {"trace_file": "TRACE_new.fits",
+                        "filter_file_format": "filters/TC_filter_{}.dat"}},
+        {"effects": [{"kwargs": {"filename": "!OBS.trace_file"}},
+                     {"kwargs": {"filename": "LIST_mirrors.dat"}},
+                     {"kwargs": {"filename": "psfs"}}]},
+    ]))
+    mini_irdb.write("INST/version.yaml", "version: 2024-01-01")
+    mini_irdb.write("INST/LIST_mirrors.dat",
+                    "# comment TER_unused.dat\nname filename\n"
+                    "M1 TER_gold.dat\n")
+    for name in ["TRACE_new.fits", "TRACE_old.fits", "TER_gold.dat",
+                 "TER_unused.dat", "filters/TC_filter_J.dat",
+                 "filters/TC_filter_H.dat", "filters/README",
+                 "psfs/psf_1.fits", "psfs/sub/psf_2.fits", "docs/manual.pdf",
+                 "code/make_traces.py", "tests/test_inst.py"]:
+        mini_irdb.write(f"INST/{name}", "data")
+    mini_irdb.write("TEL/TEL.yaml", "filename: TER_tel.dat")
+    mini_irdb.write("TEL/TER_tel.dat", "data")
+    mini_irdb.write("TEL/TER_other.dat", "data")
+    return src_path
+
+
+def _selected(src_path, profile):
+    files = sorted(src_path.rglob("*"))
+    return {file.relative_to(src_path).as_posix()
+            for file in profiles.select_files(src_path, files, profile)
+            if file.is_file()}
+
+
+def test_full_keeps_all(src_path):
+    assert len(_selected(src_path, "full")) == 15
+
+
+def test_runtime(src_path):
+    assert _selected(src_path, "runtime") == {
+        "default.yaml", "version.yaml", "LIST_mirrors.dat", "TER_gold.dat",
+        "TRACE_new.fits", "filters/TC_filter_J.dat",
+        "filters/TC_filter_H.dat", "psfs/psf_1.fits", "psfs/sub/psf_2.fits",
+    }
+
+
+def test_runtime_keeps_folders_of_kept_files(src_path):
+    files = sorted(src_path.rglob("*"))
+    selected = profiles.select_files(src_path, files, "runtime")
+    assert src_path / "filters" in selected
+    assert src_path / "docs" not in selected
+
+
+def test_references_from_dependent_packages(src_path, mini_irdb):
+    tel_path = src_path.parent / "TEL"
+    mini_irdb.write("INST/INST.yaml", "filename: TER_other.dat")
+    assert _selected(tel_path, "runtime") == {"TEL.yaml", "TER_tel.dat",
+                                              "TER_other.dat"}
+
+
+def test_unknown_profile(src_path):
+    with pytest.raises(ValueError, match="Unknown build profile"):
+        profiles.select_files(src_path, [], "bogus")
+
+
+def test_profile_sizes(src_path):
+    sizes = profiles.profile_sizes(src_path, sorted(src_path.rglob("*")))
+    assert sizes["full"][0] == 15
+    assert sizes["runtime"][0] == 9
+    line = profiles.format_savings("INST", sizes, "runtime")
+    assert line.startswith("INST: runtime profile keeps 9 of 15 files")
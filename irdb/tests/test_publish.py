@@ -31,18 +31,24 @@ Control flow of publish script, pseudocode:
     warning
 """
 
+import os
+import shutil
+import hashlib
 from functools import partial
+from contextlib import contextmanager
+from zipfile import ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA, ZipFile
 # from pathlib import Path
 # from datetime import datetime as dt
 
-from io import StringIO
+from io import StringIO, BytesIO
 from unittest import mock
 import builtins
 
 import pytest
-# import yaml
+import yaml
 
 from .. import publish as pub
+from ..transport import LocalBackend, LocalSession
 
 # argv mock reference:
 # https://stackoverflow.com/questions/48359957/pytest-with-argparse-how-to-test-user-is-prompted-for-confirmation
@@ -138,6 +144,18 @@ def test_confirm(from_user, result):
             assert prompt == mock_stdout.getvalue().strip("\n")
 
 
+def test_confirm_with_broken_cached_index(caplog):
+    versions = mock.Mock(side_effect=[yaml.YAMLError("broken"),
+                                      ["2023-07-10"]])
+    with (mock.patch("irdb.package_index.get_package_versions", versions),
+          mock.patch("irdb.package_index.clear_cache") as mock_clear,
+          mock.patch.object(builtins, "input", return_value="y") as prompt):
+        assert pub.confirm("test_package")
+    mock_clear.assert_called_once()
+    assert "(2023-07-10)" in prompt.call_args.args[0]
+    assert "broken" in caplog.text
+
+
 @pytest.fixture(name="default_argv", scope="function")
 def fixture_default_argv():
     return ["", "-l", "fake_username", "-p", "fake_password", "test_package"]
@@ -183,7 +201,11 @@ def test_make_package_called(default_argv, argv, called, args):
             if called:
                 mock_mkpkg.assert_called_once_with("test_package",
                                                    args["stable"],
-                                                   args["keep_version"])
+                                                   args["keep_version"],
+                                                   reproducible=False,
+                                                   policy=None,
+                                                   delta=False,
+                                                   profile="full")
             else:
                 mock_mkpkg.assert_not_called()
 
@@ -204,21 +226,219 @@ def test_push_to_server_called(default_argv, argv, called, args):
                 mock_phsvr.assert_called_once_with("test_package",
                                                    args["stable"],
                                                    "fake_username", pwd,
-                                                   args["no_confirm"])
+                                                   args["no_confirm"],
+                                                   backend=None)
             else:
                 mock_phsvr.assert_not_called()
 
 
 def test_multiple_packages(default_argv):
     argv = ["foo_package", "bar_package", "-c", "-u"]
+    pkg_names = ["test_package", "foo_package", "bar_package"]
     with mock.patch("sys.argv", default_argv + argv):
         with mock.patch("irdb.publish.make_package") as mock_mkpkg:
-            with mock.patch("irdb.publish.push_to_server") as mock_phsvr:
+            with (mock.patch("irdb.publish.push_to_server") as mock_phsvr,
+                  mock.patch("irdb.publish.PackageUploader") as mock_upl):
                 pub.main()
                 assert mock_mkpkg.call_count == 3
-                assert mock_phsvr.call_count == 3
                 assert "bar_package" in mock_mkpkg.call_args[0]
-                assert "bar_package" in mock_phsvr.call_args[0]
+                # Several packages share one session instead
+                mock_phsvr.assert_not_called()
+                uploader = mock_upl.return_value.__enter__.return_value
+                uploader.upload_packages.assert_called_once_with(
+                    pkg_names, False, False)
+
+
+def test_local_mirror(tmp_path):
+    argv = ["", "test_package", "-u", "-p", "", "--local-mirror",
+            str(tmp_path)]
+    with mock.patch("sys.argv", argv):
+        with mock.patch("irdb.publish.push_to_server") as mock_phsvr:
+            pub.main()
+            backend = mock_phsvr.call_args.kwargs["backend"]
+            assert isinstance(backend, LocalBackend)
+            assert backend.root == tmp_path
+
+
+def test_with_deps_in_waves(default_argv):
+    argv = ["-c", "-u", "--with-deps"]
+    waves = [["Armazones", "ELT"], ["test_package"]]
+    with mock.patch("sys.argv", default_argv + argv):
+        with (mock.patch("irdb.dependencies.publish_waves",
+                         return_value=waves),
+              mock.patch("irdb.publish.make_packages") as mock_mkpkgs,
+              mock.patch("irdb.publish.PackageUploader") as mock_upl,
+              mock.patch("irdb.publish.push_to_server") as mock_phsvr):
+            pub.main()
+    assert [call.args[0] for call in mock_mkpkgs.call_args_list] == waves
+    uploader = mock_upl.return_value.__enter__.return_value
+    uploader.upload_packages.assert_called_once_with(
+        ["Armazones", "ELT"], False, False)
+    assert mock_phsvr.call_args.args[0] == "test_package"
+
+
+def test_upload_requires_username():
+    with mock.patch("sys.argv", ["", "test_package", "-u", "-p", ""]):
+        with pytest.raises(SystemExit):
+            pub.main()
+
+
+@pytest.mark.parametrize("large_size", [0, 2**40])
+def test_parallel_build_identical_to_serial(tmp_path, large_size):
+    zip_name = "test_package.2023-07-21.dev.zip"
+    with mock.patch("irdb.publish.ZIPPED_DIR", tmp_path):
+        serial = pub.zip_package_folder("test_package", zip_name).read_bytes()
+        with (mock.patch("irdb.publish._set_version",
+                         mock.Mock(return_value=zip_name)),
+              mock.patch("irdb.publish.LARGE_PACKAGE_SIZE", large_size)):
+            zip_names = pub.make_packages(["test_package"], jobs=2)
+    assert zip_names == {"test_package": zip_name}
+    assert (tmp_path / zip_name).read_bytes() == serial
+
+
+@pytest.mark.parametrize("compress_type",
+                         [ZIP_STORED, ZIP_DEFLATED, ZIP_BZIP2, ZIP_LZMA])
+def test_precompressed_identical_to_write(tmp_path, compress_type):
+    file = tmp_path / "data.txt"
+    file.write_text("0 1 2 3\n" * 1000, encoding="utf-8")
+    policy = mock.Mock(choose=mock.Mock(return_value=(compress_type, None)))
+    with ZipFile(tmp_path / "written.zip", "w") as zip_file:
+        zip_file.write(file, "pkg/data.txt", compress_type=compress_type)
+    with ZipFile(tmp_path / "precompressed.zip", "w") as zip_file:
+        pub._write_file(zip_file, file, "pkg/data.txt", policy=policy)
+    assert ((tmp_path / "precompressed.zip").read_bytes()
+            == (tmp_path / "written.zip").read_bytes())
+
+
+def test_incremental_skips_unchanged(tmp_path):
+    zip_name = "test_package.2023-07-21.dev.zip"
+    with (mock.patch("irdb.publish.ZIPPED_DIR", tmp_path),
+          mock.patch("irdb.publish._set_version",
+                     mock.Mock(return_value=zip_name))):
+        pub.make_packages(["test_package"], incremental=True)
+        manifest_name = "test_package.2023-07-21.dev.manifest.yaml"
+        assert (tmp_path / manifest_name).exists()
+        with mock.patch("irdb.publish.zip_package_folder") as mock_zip:
+            zip_names = pub.make_packages(["test_package"], incremental=True)
+            mock_zip.assert_not_called()
+    assert zip_names == {"test_package": zip_name}
+
+
+@pytest.fixture(name="pkgs_dir")
+def fixture_pkgs_dir(tmp_path):
+    """Copy of test_package in a temporary PKGS_DIR, so it can be changed."""
+    pkgs_dir = tmp_path / "pkgs"
+    shutil.copytree(pub.PKGS_DIR / "test_package", pkgs_dir / "test_package",
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    (tmp_path / "zips").mkdir()
+    with (mock.patch("irdb.publish.PKGS_DIR", pkgs_dir),
+          mock.patch("irdb.publish.ZIPPED_DIR", tmp_path / "zips")):
+        yield pkgs_dir
+
+
+def _sha256(path):
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+class TestReproducible:
+    def test_same_digest_after_touch(self, pkgs_dir):
+        zip_path = pub.zip_package_folder("test_package", "first",
+                                          reproducible=True)
+        first = _sha256(zip_path)
+        for path in (pkgs_dir / "test_package").rglob("*"):
+            os.utime(path, (1e9, 1e9))
+        (pkgs_dir / "test_package" / "default.yaml").chmod(0o600)
+        zip_path = pub.zip_package_folder("test_package", "second",
+                                          reproducible=True)
+        assert _sha256(zip_path) == first
+
+    def test_changed_content_changes_digest(self, pkgs_dir):
+        first = _sha256(pub.zip_package_folder("test_package", "first",
+                                               reproducible=True))
+        with (pkgs_dir / "test_package" / "default.yaml").open("a") as file:
+            file.write("\n")
+        second = _sha256(pub.zip_package_folder("test_package", "second",
+                                                reproducible=True))
+        assert first != second
+
+    def test_source_date_epoch(self, pkgs_dir):
+        with mock.patch.dict("os.environ",
+                             {"SOURCE_DATE_EPOCH": "1000000000"}):
+            zip_path = pub.zip_package_folder("test_package", "epoch",
+                                              reproducible=True)
+        with ZipFile(zip_path) as zip_file:
+            dates = {zinfo.date_time for zinfo in zip_file.infolist()}
+        assert dates == {(2001, 9, 9, 1, 46, 40)}
+
+    def test_sorted_and_normalized(self, pkgs_dir):
+        zip_path = pub.zip_package_folder("test_package", "sorted",
+                                          reproducible=True)
+        with ZipFile(zip_path) as zip_file:
+            infos = zip_file.infolist()
+        names = [zinfo.filename for zinfo in infos]
+        assert names == sorted(names)
+        assert all(zinfo.date_time == pub.REPRODUCIBLE_DATE_TIME
+                   for zinfo in infos)
+        assert {zinfo.external_attr >> 16 for zinfo in infos
+                if not zinfo.is_dir()} == {0o100644}
+
+    def test_parallel_identical(self, pkgs_dir):
+        zip_name = "test_package.2023-07-21.dev.zip"
+        serial = _sha256(pub.zip_package_folder("test_package", "serial",
+                                                reproducible=True))
+        with (mock.patch("irdb.publish._set_version",
+                         mock.Mock(return_value=zip_name)),
+              mock.patch("irdb.publish.LARGE_PACKAGE_SIZE", 0)):
+            pub.make_packages(["test_package"], jobs=2, reproducible=True)
+        assert _sha256(pub.ZIPPED_DIR / zip_name) == serial
+
+
+def test_make_package_delta(pkgs_dir):
+    zip_names = ["test_package.2023-07-20.dev.zip",
+                 "test_package.2023-07-21.dev.zip"]
+    with mock.patch("irdb.publish._set_version", side_effect=zip_names):
+        pub.make_package("test_package", delta=True)
+        (pkgs_dir / "test_package" / "new_file.dat").write_text("1 2\n")
+        pub.make_package("test_package", delta=True)
+    delta_path = (pub.ZIPPED_DIR / "deltas" /
+                  "test_package.2023-07-20.dev_2023-07-21.dev.zip")
+    with ZipFile(delta_path) as zip_file:
+        assert zip_file.namelist() == ["delta.yaml",
+                                       "test_package/new_file.dat"]
+
+
+def test_runtime_profile(pkgs_dir, capsys):
+    (pkgs_dir / "test_package" / "docs").mkdir()
+    (pkgs_dir / "test_package" / "docs" / "manual.pdf").write_bytes(
+        b"%PDF" * 1000)
+    with mock.patch("irdb.publish._set_version",
+                    return_value="test_package.2023-07-21.dev.zip"):
+        for jobs in (1, 2):
+            pub.make_packages(["test_package"], jobs=jobs, profile="runtime")
+    zip_path = pub.ZIPPED_DIR / "runtime" / "test_package.2023-07-21.dev.zip"
+    with ZipFile(zip_path) as zip_file:
+        names = zip_file.namelist()
+    assert "test_package/TC_filter_Ks.dat" in names
+    assert "test_package/default.yaml" in names
+    assert not any("docs" in name for name in names)
+    assert not (pub.ZIPPED_DIR / "test_package.2023-07-21.dev.zip").exists()
+    assert "runtime profile keeps" in capsys.readouterr().out
+
+
+def test_runtime_profile_not_uploaded(default_argv):
+    with mock.patch("sys.argv", default_argv + ["-u", "--profile",
+                                                "runtime"]):
+        with pytest.raises(SystemExit):
+            pub.main()
+
+
+def test_jobs_passed_to_make_packages(default_argv):
+    with mock.patch("sys.argv", default_argv + ["-c", "-j", "4"]):
+        with mock.patch("irdb.publish.make_packages") as mock_mkpkgs:
+            pub.main()
+            mock_mkpkgs.assert_called_once_with(["test_package"], False,
+                                                False, 4, False, False,
+                                                None, False, "full")
 
 
 def test_warning_no_action(default_argv, caplog):
@@ -227,3 +447,307 @@ def test_warning_no_action(default_argv, caplog):
     with mock.patch("sys.argv", default_argv):
         pub.main()
         assert warnmsg in caplog.text
+
+
+class _FailingRemote:
+    def write(self, data):
+        raise OSError("Connection lost")
+
+
+class TestStreamPackage:
+    def test_identical_to_zip_package_folder(self, tmp_path):
+        zip_name = "test_package.2023-07-21.dev.zip"
+        expected = pub.zip_package_folder("test_package", zip_name,
+                                          zipped_dir=tmp_path).read_bytes()
+        remote, local = BytesIO(), BytesIO()
+        pub._stream_package("test_package", zip_name, remote, local)
+        assert remote.getvalue() == expected
+        assert local.getvalue() == expected
+
+    def test_small_chunks_bounded_queue(self):
+        remote = BytesIO()
+        with pub._UploadPipe(remote, chunk_size=3, max_chunks=1) as pipe:
+            for _ in range(100):
+                pipe.write(b"ab")
+        assert remote.getvalue() == b"ab" * 100
+
+    def test_upload_error_raised(self):
+        with pytest.raises(OSError, match="Connection lost"):
+            pub._stream_package("test_package", "bogus.zip",
+                                _FailingRemote())
+
+    def test_upload_error_with_local_copy(self):
+        local = BytesIO()
+        error = pub._stream_package("test_package", "bogus.zip",
+                                    _FailingRemote(), local)
+        assert isinstance(error, OSError)
+        assert local.getvalue()
+
+    def test_cli_stream(self, default_argv):
+        argv = default_argv + ["-c", "-u", "--stream", "--no-local-copy"]
+        with mock.patch("sys.argv", argv):
+            with (mock.patch("irdb.publish.stream_to_server") as mock_stream,
+                  mock.patch("irdb.publish.make_packages") as mock_mkpkgs):
+                pub.main()
+                mock_mkpkgs.assert_not_called()
+                assert mock_stream.call_args.kwargs["keep_local"] is False
+
+    @pytest.mark.parametrize("option", [["-j", "2"], ["-i"], ["--delta"]])
+    def test_cli_stream_rejects_options(self, default_argv, option, capsys):
+        argv = default_argv + ["-c", "-u", "--stream"] + option
+        with (mock.patch("sys.argv", argv),
+              mock.patch("irdb.publish.stream_to_server") as mock_stream):
+            with pytest.raises(SystemExit):
+                pub.main()
+        mock_stream.assert_not_called()
+        assert f"--stream can't be combined with {option[0]}" in \
+            capsys.readouterr().err
+
+
+class _DroppingFile:
+    """Local file that raises EOFError once the connection's budget is used."""
+
+    def __init__(self, file, server):
+        self._file = file
+        self._server = server
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._file.close()
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def write(self, data):
+        budget = self._server.budget
+        if budget is not None and len(data) > budget:
+            self._file.write(data[:budget])
+            self._server.budget = 0
+            raise EOFError("Connection dropped")
+        if budget is not None:
+            self._server.budget -= len(data)
+        return self._file.write(data)
+
+
+class _DroppingSession(LocalSession):
+    def __init__(self, server):
+        super().__init__(server.root)
+        self.server = server
+
+    def open(self, path, mode="rb"):
+        return _DroppingFile(super().open(path, mode), self.server)
+
+
+class StandInServer(LocalBackend):
+    """Local backend with connections that drop.
+
+    Every connection may write at most `budget` bytes before it "drops".
+    """
+
+    def __init__(self, root, budget=None):
+        super().__init__(root)
+        self.budget_per_connection = budget
+        self.budget = budget
+        self.connections = 0
+
+    @contextmanager
+    def connect(self):
+        self.connections += 1
+        self.budget = self.budget_per_connection
+        yield _DroppingSession(self)
+
+
+@pytest.fixture(name="upload_file")
+def fixture_upload_file(tmp_path):
+    (tmp_path / "local").mkdir()
+    (tmp_path / "remote" / "instruments").mkdir(parents=True)
+    path = tmp_path / "local" / "bogus.2023-07-21.dev.zip"
+    path.write_bytes(os.urandom(10000))
+    return path
+
+
+class TestUploadResumable:
+    def test_upload_without_drops(self, upload_file, tmp_path):
+        server = StandInServer(tmp_path / "remote")
+        pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                             server.connect, chunk_size=1000)
+        remote = tmp_path / "remote" / "instruments" / "bogus.zip"
+        assert remote.read_bytes() == upload_file.read_bytes()
+        assert not list(remote.parent.glob("*.part"))
+        assert server.connections == 1
+
+    def test_resumes_after_drops(self, upload_file, tmp_path):
+        server = StandInServer(tmp_path / "remote", budget=3500)
+        with mock.patch("irdb.publish.sleep") as mock_sleep:
+            pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                                 server.connect, backoff=1.,
+                                 chunk_size=1000)
+        remote = tmp_path / "remote" / "instruments" / "bogus.zip"
+        assert remote.read_bytes() == upload_file.read_bytes()
+        # 10000 bytes at 3500 per connection -> 3 connections, 2 retries
+        assert server.connections == 3
+        assert [call.args[0] for call in mock_sleep.call_args_list] == [1, 2]
+
+    def test_gives_up_after_retries(self, upload_file, tmp_path):
+        server = StandInServer(tmp_path / "remote", budget=1000)
+        with mock.patch("irdb.publish.sleep"):
+            with pytest.raises(EOFError):
+                pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                                     server.connect, retries=2,
+                                     chunk_size=1000)
+        assert server.connections == 3
+
+    def test_checksum_mismatch(self, upload_file, tmp_path):
+        server = StandInServer(tmp_path / "remote")
+        with (mock.patch("irdb.publish._expected_sha256",
+                         return_value="bogus"),
+              mock.patch("irdb.publish.sleep")):
+            with pytest.raises(ValueError, match="Checksum mismatch"):
+                pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                                     server.connect, retries=2)
+        # Every attempt starts over
+        assert server.connections == 3
+        assert not list((tmp_path / "remote" / "instruments").iterdir())
+
+    def test_stale_part_of_other_build_ignored(self, upload_file, tmp_path):
+        instruments = tmp_path / "remote" / "instruments"
+        (instruments / "bogus.zip.part").write_bytes(os.urandom(2000))
+        server = StandInServer(tmp_path / "remote")
+        pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                             server.connect)
+        assert (instruments / "bogus.zip").read_bytes() == \
+            upload_file.read_bytes()
+
+    def test_corrupt_part_restarted(self, upload_file, tmp_path):
+        sha = pub.manifest.hash_file(upload_file)
+        part = (tmp_path / "remote" /
+                pub._part_path("instruments/bogus.zip", sha))
+        part.write_bytes(os.urandom(2000))
+        server = StandInServer(tmp_path / "remote")
+        with mock.patch("irdb.publish.sleep"):
+            pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                                 server.connect)
+        remote = tmp_path / "remote" / "instruments" / "bogus.zip"
+        assert remote.read_bytes() == upload_file.read_bytes()
+        assert server.connections == 2
+
+    @pytest.mark.parametrize("read_back", [True, False])
+    def test_without_server_side_hash(self, upload_file, tmp_path,
+                                      read_back):
+        server = StandInServer(tmp_path / "remote")
+        with (mock.patch.object(LocalSession, "sha256", return_value=None),
+              mock.patch("irdb.publish._remote_sha256",
+                         wraps=pub._remote_sha256) as mock_read_back):
+            pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                                 server.connect, read_back=read_back)
+        assert mock_read_back.called == read_back
+        remote = tmp_path / "remote" / "instruments" / "bogus.zip"
+        assert remote.read_bytes() == upload_file.read_bytes()
+
+    def test_corrupt_tail_without_server_side_hash(self, upload_file,
+                                                   tmp_path):
+        sha = pub.manifest.hash_file(upload_file)
+        part = (tmp_path / "remote" /
+                pub._part_path("instruments/bogus.zip", sha))
+        # Complete size, so nothing is left to resume
+        part.write_bytes(upload_file.read_bytes()[:-100] + bytes(100))
+        server = StandInServer(tmp_path / "remote")
+        with (mock.patch.object(LocalSession, "sha256", return_value=None),
+              mock.patch("irdb.publish.sleep")):
+            pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                                 server.connect)
+        remote = tmp_path / "remote" / "instruments" / "bogus.zip"
+        assert remote.read_bytes() == upload_file.read_bytes()
+        assert server.connections == 2
+
+    def test_uses_manifest_checksum(self, upload_file):
+        pub.manifest.write_manifest(upload_file, {})
+        with mock.patch("irdb.manifest.hash_file") as mock_hash:
+            pub._expected_sha256(upload_file)
+            mock_hash.assert_not_called()
+
+    def test_replaces_existing(self, upload_file, tmp_path):
+        remote = tmp_path / "remote" / "instruments" / "bogus.zip"
+        remote.write_bytes(b"old version")
+        server = StandInServer(tmp_path / "remote")
+        pub.upload_resumable(upload_file, "instruments/bogus.zip",
+                             server.connect)
+        assert remote.read_bytes() == upload_file.read_bytes()
+
+
+class TestStreamToServer:
+    @staticmethod
+    def _stream(server):
+        with (mock.patch("irdb.publish._get_server_path",
+                         lambda pkg, name: f"instruments/{name}"),
+              mock.patch("irdb.publish._set_version",
+                         return_value="test_package.2023-07-21.dev.zip")):
+            return pub.stream_to_server("test_package", backend=server)
+
+    def test_uploaded_and_kept(self, pkgs_dir, tmp_path):
+        (tmp_path / "remote" / "instruments").mkdir(parents=True)
+        zip_name = self._stream(StandInServer(tmp_path / "remote"))
+        remote = tmp_path / "remote" / "instruments" / zip_name
+        assert remote.read_bytes() == (pub.ZIPPED_DIR / zip_name).read_bytes()
+        assert not list(remote.parent.glob("*.part"))
+        local = pub.ZIPPED_DIR / zip_name
+        assert sorted(pub.ZIPPED_DIR.iterdir()) == sorted([
+            local, pub.manifest.manifest_path(local)])
+
+    def test_resumed_after_drops(self, pkgs_dir, tmp_path):
+        (tmp_path / "remote" / "instruments").mkdir(parents=True)
+        server = StandInServer(tmp_path / "remote", budget=2000)
+        with mock.patch("irdb.publish.sleep"):
+            zip_name = self._stream(server)
+        remote = tmp_path / "remote" / "instruments" / zip_name
+        assert remote.read_bytes() == (pub.ZIPPED_DIR / zip_name).read_bytes()
+        assert server.connections > 2
+
+    def test_failed_upload_leaves_nothing(self, pkgs_dir, tmp_path):
+        (tmp_path / "remote" / "instruments").mkdir(parents=True)
+        server = StandInServer(tmp_path / "remote", budget=100)
+        with mock.patch("irdb.publish.sleep"):
+            with pytest.raises(EOFError):
+                self._stream(server)
+        assert not list((tmp_path / "remote" / "instruments").iterdir())
+        assert not list(pub.ZIPPED_DIR.iterdir())
+
+
+class TestPackageUploader:
+    def test_uploads_all_packages(self, pkgs_dir, tmp_path, capsys):
+        sizes = {}
+        for pkg_name in ["foo", "bar", "baz"]:
+            zip_path = pub.ZIPPED_DIR / f"{pkg_name}.2023-07-21.dev.zip"
+            with ZipFile(zip_path, "w") as zip_file:
+                zip_file.writestr(f"{pkg_name}/data.bin", os.urandom(1000))
+            sizes[pkg_name] = zip_path.stat().st_size
+        (tmp_path / "remote" / "instruments").mkdir(parents=True)
+        server = StandInServer(tmp_path / "remote")
+        folders = {"foo": "instruments", "bar": "instruments",
+                   "baz": "instruments"}
+        with (mock.patch("irdb.publish._get_server_path",
+                         lambda pkg, name: f"{folders[pkg]}/{name}"),
+              pub.PackageUploader(server, 2) as uploader):
+            assert uploader.upload_packages(["foo", "bar", "baz"]) == sizes
+        remote = sorted(path.name for path in
+                        (tmp_path / "remote" / "instruments").iterdir())
+        assert remote == ["bar.2023-07-21.dev.zip", "baz.2023-07-21.dev.zip",
+                          "foo.2023-07-21.dev.zip"]
+        index = yaml.safe_load(
+            (tmp_path / "remote" / pub.package_index.INDEX_NAME).read_text())
+        assert list(index["packages"]) == ["bar", "baz", "foo"]
+        assert "MB/s" in capsys.readouterr().out
+
+    def test_declined_stable_not_uploaded(self, pkgs_dir, tmp_path):
+        (pub.ZIPPED_DIR / "foo.2023-07-21.zip").write_bytes(b"foo")
+        server = StandInServer(tmp_path)
+        with (mock.patch("irdb.publish.confirm", return_value=False),
+              pub.PackageUploader(server, 2) as uploader):
+            assert uploader.upload_packages(["foo"], stable=True) == {}
+        assert server.connections == 0
+
+    def test_no_password(self):
+        with pytest.raises(ValueError):
+            pub.push_to_server("test_package", login="fake_username")
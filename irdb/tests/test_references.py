@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.references
+"""
+
+from unittest import mock
+
+import pytest
+import yaml
+
+from irdb import references
+from irdb.catalog import Catalog
+from irdb.references import FileIndex, resolve_references
+
+
+@pytest.fixture(name="index")
+def fixture_index(mini_irdb):
+    pkg_dir = mini_irdb.root
+    mini_irdb.write("INST/default.yaml", yaml.safe_dump_all([
+        {"packages": ["TEL", "INST"], "yamls": ["INST.yaml"]},
+        {"alias": "OBS", "properties": {"trace_file": "TRACE.fits",
+                                        "filter_name": "J"}},
+    ]))
+    mini_irdb.write("INST/INST.yaml", yaml.safe_dump_all([
+        {"alias": "INST",
+         "properties": {"filter_file_format": "filters/TC_filter_{}.dat"}},
+        {"alias": "DET",
+         "properties": {"layout": {"file_name": "FPA_layout.dat"}},
+         "effects": [
+             {"kwargs": {"filename": "TER_tel.dat"}},
+             {"kwargs": {"filename": "!OBS.trace_file"}},
+             {"kwargs": {"filename": "!DET.layout.file_name"}},
+             {"kwargs": {"filename": "!OBS.psf_file"}},
+             {"kwargs": {"filename": "#other_effect.filename"}},
+             {"kwargs": {"file_name": ["TER_gone.dat", None]}},
+             {"kwargs": {"filter_names": ["J", "H"],
+                         "filename_format": "!INST.filter_file_format"}},
+             {"kwargs": {"filter_name": "!OBS.filter_name",
+                         "filename_format": "filters/TC_filter_{}.dat"}},
+         ]},
+    ]))
+    for name in ["TRACE.fits", "FPA_layout.dat", "filters/TC_filter_J.dat"]:
+        mini_irdb.write(f"INST/{name}", "data")
+    mini_irdb.write("TEL/TEL.yaml", "filename: TER_tel.dat")
+    mini_irdb.write("TEL/TER_tel.dat", "data")
+    mini_irdb.write("OTHER/TER_gone.dat", "data")
+    return FileIndex(Catalog(pkg_dir, cache_path=False))
+
+
+def test_search_path(index):
+    assert index.search_path("INST") == ["INST", "TEL"]
+    assert index.search_path("TEL") == ["TEL"]
+
+
+def test_resolved(index):
+    graph = resolve_references(["INST"], index)
+    locations = {ref.filename: ref.location for ref in graph.references}
+    assert locations == {
+        "TER_tel.dat": "TEL/TER_tel.dat",
+        "TRACE.fits": "INST/TRACE.fits",
+        "FPA_layout.dat": "INST/FPA_layout.dat",
+        "TER_gone.dat": None,
+        "filters/TC_filter_J.dat": "INST/filters/TC_filter_J.dat",
+        "filters/TC_filter_H.dat": None,
+    }
+    assert graph.package_edges() == {"INST": {"INST", "TEL"}}
+
+
+def test_missing(index):
+    graph = resolve_references(index=index)
+    missing = graph.missing("INST")
+    assert [ref.filename for ref in missing] == ["TER_gone.dat",
+                                                 "filters/TC_filter_H.dat"]
+    assert missing[1].pattern == "filters/TC_filter_{}.dat"
+    assert not graph.missing("TEL")
+    assert index.locations("TER_gone.dat") == ["OTHER/TER_gone.dat"]
+
+
+def test_unresolved(index):
+    graph = resolve_references(["INST"], index)
+    assert [value for *_, value in graph.unresolved] == [
+        "!OBS.psf_file", "#other_effect.filename"]
+
+
+def test_properties_collected_once_per_package(index):
+    with mock.patch("irdb.references._add_properties",
+                    wraps=references._add_properties) as add_properties:
+        resolve_references(index=index)
+        resolve_references(index=index)
+    catalog = index.catalog
+    n_yaml_files = sum(1 for pkg_name in catalog.names()
+                       for name in catalog[pkg_name].yaml_docs
+                       if "/" not in name)
+    # Once per package, plus once per resolved YAML file and run
+    assert add_properties.call_count == (len(catalog.names())
+                                         + 2 * n_yaml_files)
+
+
+def test_own_properties_first(index):
+    properties = index.properties(["INST", "TEL"])
+    own = references._with_own_properties(
+        properties, [{"alias": "OBS", "properties": {"filter_name": "H"}}])
+    assert own["OBS"]["filter_name"] == "H"
+    assert own["OBS"]["trace_file"] == "TRACE.fits"
+    assert properties["OBS"]["filter_name"] == "J"
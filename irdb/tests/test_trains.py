@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.trains
+"""
+
+import pytest
+
+from irdb.catalog import Catalog
+from irdb.trains import OpticalTrainCache
+
+
+@pytest.fixture(name="pkg_dir")
+def fixture_pkg_dir(mini_irdb):
+    mini_irdb.write_tiny({"wavelength": [0.5, 2.5], "transmission": [1, 1],
+                          "emissivity": [0, 0], "wavelength_unit": "um"})
+    return mini_irdb.root
+
+
+@pytest.fixture(name="cache")
+def fixture_cache(pkg_dir):
+    return OpticalTrainCache(Catalog(pkg_dir, cache_path=False))
+
+
+def test_built_once_and_copied(cache):
+    first = cache("TINY", ["img"])
+    first["mirror"].include = False
+    second = cache("TINY", ["img"])
+    assert cache.builds == 1
+    assert second is not first
+    assert second["mirror"].include
+    assert cache.get("TINY", ["img"], copy_train=False) is cache.get(
+        "TINY", ["img"], copy_train=False)
+
+
+def test_properties_are_part_of_key(cache):
+    train = cache("TINY", properties={"!OBS.dit": 2, "!OBS.ndit": 3})
+    assert train.cmds["!OBS.dit"] == 2
+    cache("TINY", properties={"!OBS.ndit": 3, "!OBS.dit": 2})
+    assert cache.builds == 1
+    assert cache("TINY", properties={"!OBS.dit": 5}).cmds["!OBS.dit"] == 5
+    assert cache.builds == 2
+
+
+def test_pickled_between_sessions(pkg_dir, mini_irdb, tmp_path):
+    cache_dir = tmp_path / "trains"
+    OpticalTrainCache(Catalog(pkg_dir, cache_path=False), cache_dir)(
+        "TINY", ["img"])
+    assert len(list(cache_dir.glob("TINY-*.pickle"))) == 1
+
+    cache = OpticalTrainCache(Catalog(pkg_dir, cache_path=False), cache_dir)
+    assert len(cache("TINY", ["img"]).effects) == 2
+    assert cache.builds == 0
+
+    mini_irdb.write("TINY/TER_new.dat", "data")
+    cache = OpticalTrainCache(Catalog(pkg_dir, cache_path=False), cache_dir)
+    cache("TINY", ["img"])
+    assert cache.builds == 1
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests for irdb.transport
+"""
+
+import hashlib
+from unittest import mock
+from zipfile import ZipFile
+
+import pytest
+
+from irdb import transport
+from irdb.publish import upload_resumable, PackageUploader
+
+
+@pytest.fixture(name="backend")
+def fixture_backend(tmp_path):
+    return transport.LocalBackend(tmp_path / "InstPkgSvr")
+
+
+class TestLocalSession:
+    def test_put_and_stat(self, backend, tmp_path):
+        local = tmp_path / "foo.zip"
+        local.write_bytes(b"foo")
+        with backend.connect() as session:
+            session.put(local, "instruments/foo.zip")
+            assert session.stat("instruments/foo.zip").st_size == 3
+        assert (backend.root / "instruments" / "foo.zip").read_bytes() == \
+            b"foo"
+
+    def test_stat_missing(self, backend):
+        with backend.connect() as session:
+            with pytest.raises(FileNotFoundError):
+                session.stat("instruments/foo.zip")
+
+    def test_rename_replaces(self, backend):
+        with backend.connect() as session:
+            with session.open("locations/foo.zip", "wb") as file:
+                file.write(b"old")
+            with session.open("locations/foo.zip.part", "wb") as file:
+                file.write(b"new")
+            session.rename("locations/foo.zip.part", "locations/foo.zip")
+            assert session.listdir("locations") == ["foo.zip"]
+            with session.open("locations/foo.zip") as file:
+                assert file.read() == b"new"
+
+    def test_remove(self, backend):
+        with backend.connect() as session:
+            with session.open("foo.zip", "wb") as file:
+                file.write(b"foo")
+            session.remove("foo.zip")
+            assert session.listdir() == []
+
+    def test_sha256(self, backend):
+        with backend.connect() as session:
+            with session.open("foo.zip", "wb") as file:
+                file.write(b"foo")
+            assert session.sha256("foo.zip") == hashlib.sha256(
+                b"foo").hexdigest()
+
+
+class TestSFTPSession:
+    def test_rename_uses_posix_rename(self):
+        sftp = mock.Mock()
+        transport.SFTPSession(sftp).rename("foo.part", "foo")
+        sftp.posix_rename.assert_called_once_with("foo.part", "foo")
+        sftp.rename.assert_not_called()
+
+    def test_rename_without_posix_rename(self):
+        sftp = mock.Mock()
+        sftp.posix_rename.side_effect = OSError("Operation unsupported")
+        transport.SFTPSession(sftp).rename("foo.part", "foo")
+        sftp.remove.assert_called_once_with("foo")
+        sftp.rename.assert_called_once_with("foo.part", "foo")
+
+    def test_writes_pipelined(self):
+        sftp = mock.Mock()
+        file = transport.SFTPSession(sftp).open("foo", "wb")
+        file.set_pipelined.assert_called_once_with(True)
+
+    def test_sha256_on_server(self):
+        sftp = mock.MagicMock()
+        file = sftp.open.return_value.__enter__.return_value
+        file.check.return_value = bytes.fromhex("ab12")
+        assert transport.SFTPSession(sftp).sha256("foo") == "ab12"
+        file.check.assert_called_once_with("sha256")
+
+    def test_sha256_unsupported(self):
+        sftp = mock.MagicMock()
+        file = sftp.open.return_value.__enter__.return_value
+        file.check.side_effect = OSError("Operation unsupported")
+        assert transport.SFTPSession(sftp).sha256("foo") is None
+
+
+def test_upload_to_local_mirror(backend, tmp_path):
+    local = tmp_path / "bogus.2023-07-21.dev.zip"
+    local.write_bytes(b"bogus" * 1000)
+    upload_resumable(local, f"instruments/{local.name}", backend.connect,
+                     chunk_size=1000)
+    with backend.connect() as session:
+        assert session.listdir("instruments") == [local.name]
+    assert (backend.root / "instruments" / local.name).read_bytes() == \
+        local.read_bytes()
+
+
+def test_uploader_with_local_mirror(backend, tmp_path):
+    local = tmp_path / "bogus.2023-07-21.dev.zip"
+    with ZipFile(local, "w") as zip_file:
+        zip_file.writestr("bogus/default.yaml", "packages: [bogus]")
+    with PackageUploader(backend) as uploader:
+        assert uploader.upload(local, f"instruments/{local.name}") == \
+            local.stat().st_size
+    assert (backend.root / "instruments" / local.name).exists()
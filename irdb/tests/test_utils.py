@@ -2,15 +2,30 @@
 # -*- coding: utf-8 -*-
 """
 Tests for irdb.utils
-
-Does currently not test utils.recursive_filename_search()
 """
 
 from pathlib import Path
 
 import pytest
+import yaml
+
+from irdb.utils import get_packages, iter_references, recursive_filename_search
 
-from irdb.utils import get_packages
+YAML_TEXT = """
+alias: INST
+properties:
+  filter_file_format: filters/TC_filter_{}.dat
+  gain:
+    1: 2.0
+---
+effects:
+- kwargs:
+    filename: "!OBS.trace_file"
+- kwargs:
+    file_name: [TER_a.dat, TER_b.dat]
+    filename_format: "!INST.filter_file_format"
+    date_format: "%Y"
+"""
 
 
 @pytest.fixture(name="packages", scope="class")
@@ -36,3 +51,32 @@ class TestGetPackages:
     @pytest.mark.usefixtures("packages")
     def test_only_includes_dirs(self, packages):
         assert all(path.is_dir() for path in packages.values())
+
+
+class TestIterReferences:
+    def test_yields_all_kinds_with_paths(self):
+        refs = iter_references(yaml.safe_load_all(YAML_TEXT))
+        assert [(ref.kind, ref.value, ref.location) for ref in refs] == [
+            ("pattern", "filters/TC_filter_{}.dat",
+             "0:properties.filter_file_format"),
+            ("file", "!OBS.trace_file", "1:effects[0].kwargs.filename"),
+            ("bang", "!OBS.trace_file", "1:effects[0].kwargs.filename"),
+            ("file", "TER_a.dat", "1:effects[1].kwargs.file_name[0]"),
+            ("file", "TER_b.dat", "1:effects[1].kwargs.file_name[1]"),
+            ("pattern", "!INST.filter_file_format",
+             "1:effects[1].kwargs.filename_format"),
+            ("bang", "!INST.filter_file_format",
+             "1:effects[1].kwargs.filename_format"),
+        ]
+
+    def test_is_lazy(self):
+        def docs():
+            yield {"filename": "a.dat"}
+            raise RuntimeError("read too far")
+
+        assert next(iter_references(docs())).value == "a.dat"
+
+    def test_recursive_filename_search(self):
+        doc = list(yaml.safe_load_all(YAML_TEXT))[1]
+        assert recursive_filename_search(doc) == [
+            "!OBS.trace_file", "TER_a.dat", "TER_b.dat"]
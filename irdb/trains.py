@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Build every ScopeSim optical train only once per test session.
+
+Many instrument tests build ``UserCommands`` and ``OpticalTrain`` for the
+same instrument and modes, which takes much longer than the tests
+themselves. `OpticalTrainCache` builds each combination of
+
+- instrument package,
+- modes (``set_modes``),
+- property overrides (passed to ``UserCommands(properties=...)``)
+
+once and hands out deep copies, so tests can change (e.g. include or
+exclude effects, observe) their copy without affecting other tests.
+
+Optionally, the built trains are pickled to disk (``CACHE_DIR/trains``) and
+reused in the next session. A pickle is only used if the files of the
+instrument's packages (see ``irdb.references.FileIndex.search_path``) and the
+ScopeSim version are unchanged. Trains that can't be pickled are only cached
+in memory.
+
+The root ``conftest.py`` provides the session-scoped ``optical_train``
+fixture, disk caching is enabled with ``pytest --pickle-trains``:
+
+>>> def test_something(optical_train):
+>>>     metis = optical_train("METIS", ["img_lm"], {"!OBS.dit": 1})
+"""
+
+import os
+import copy
+import json
+import pickle
+import hashlib
+import logging
+import tempfile
+from pathlib import Path
+from typing import Optional
+from contextlib import contextmanager
+
+from irdb.catalog import Catalog, get_catalog
+from irdb.references import FileIndex
+from irdb.utils import CACHE_DIR
+
+TRAINS_DIR = CACHE_DIR / "trains"
+
+
+@contextmanager
+def local_packages(pkg_dir: Path):
+    """Let ScopeSim load the packages from `pkg_dir` in this context."""
+    # Only needed here, the rest of the module works without ScopeSim.
+    import scopesim
+
+    config = scopesim.rc.__config__
+    old_path = config["!SIM.file.local_packages_path"]
+    config["!SIM.file.local_packages_path"] = str(pkg_dir)
+    try:
+        yield scopesim
+    finally:
+        config["!SIM.file.local_packages_path"] = old_path
+
+
+def _key(instrument: str, modes: Optional[list[str]],
+         properties: Optional[dict]) -> str:
+    """Hashable, stable key, property overrides in any order are the same."""
+    return json.dumps([instrument, list(modes) if modes else None,
+                       properties or {}], sort_keys=True, default=str)
+
+
+class OpticalTrainCache:
+    """Build optical trains once and hand out copies, see module docstring.
+
+    Parameters
+    ----------
+    catalog : Catalog, optional
+        Catalog of the packages, defaults to the catalog of this IRDB. The
+        trains are built from its folder.
+    cache_dir : Path, optional
+        Folder for pickled trains. The default is None, which only caches
+        the trains in memory.
+
+    Attributes
+    ----------
+    builds : int
+        Number of trains built (not loaded from memory or disk) so far.
+    """
+
+    def __init__(self, catalog: Optional[Catalog] = None,
+                 cache_dir: Optional[Path] = None):
+        self.catalog = catalog or get_catalog()
+        self.cache_dir = cache_dir
+        self.builds = 0
+        self._trains = {}
+        self._index = None
+
+    def fingerprint(self, instrument: str) -> str:
+        """Hash of the files of all packages used by `instrument`."""
+        # Only needed for the disk cache, which is optional.
+        import scopesim
+
+        if self._index is None:
+            self._index = FileIndex(self.catalog)
+        sha = hashlib.sha256(str(scopesim.__version__).encode())
+        for pkg_name in self._index.search_path(instrument):
+            if pkg_name not in self.catalog:
+                continue
+            for rel_path, info in sorted(self.catalog[pkg_name].files.items()):
+                sha.update(f"{pkg_name}/{rel_path}:{info.sha256}\n".encode())
+        return sha.hexdigest()
+
+    def _pickle_path(self, key: str, instrument: str) -> Path:
+        name = hashlib.sha256(
+            f"{key}\n{self.fingerprint(instrument)}".encode()).hexdigest()
+        return self.cache_dir / f"{instrument}-{name[:32]}.pickle"
+
+    def _load(self, path: Path):
+        try:
+            with path.open("rb") as file:
+                return pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logging.warning("Can't load pickled train %s: %s", path, err)
+            return None
+
+    def _save(self, path: Path, train) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                pickle.dump(train, file, protocol=pickle.HIGHEST_PROTOCOL)
+            # Atomic, so parallel sessions never read half a file
+            os.replace(tmp_path, path)
+        except Exception as err:
+            logging.warning("Can't pickle train %s: %s", path.stem, err)
+            os.unlink(tmp_path)
+
+    def _build(self, instrument: str, modes: Optional[list[str]],
+               properties: Optional[dict]):
+        kwargs = {"set_modes": modes} if modes else {}
+        with local_packages(self.catalog.pkg_dir) as scopesim:
+            cmds = scopesim.UserCommands(use_instrument=instrument,
+                                         properties=properties or {},
+                                         **kwargs)
+            train = scopesim.OpticalTrain(cmds)
+        self.builds += 1
+        return train
+
+    def get(self, instrument: str, modes: Optional[list[str]] = None,
+            properties: Optional[dict] = None, copy_train: bool = True):
+        """
+        Return an optical train, building it only if needed.
+
+        Parameters
+        ----------
+        instrument : str
+            Name of the instrument package.
+        modes : list of str, optional
+            Modes, by default the default modes of the instrument.
+        properties : dict, optional
+            Property overrides, e.g. ``{"!OBS.dit": 1}``.
+        copy_train : bool, optional
+            If True (default), return a deep copy that can be changed freely.
+            If False, return the shared instance, which must not be changed.
+
+        Returns
+        -------
+        train : scopesim.OpticalTrain
+            The ``UserCommands`` are available as ``train.cmds``.
+        """
+        key = _key(instrument, modes, properties)
+        if key not in self._trains:
+            path = (None if self.cache_dir is None
+                    else self._pickle_path(key, instrument))
+            train = None if path is None else self._load(path)
+            if train is None:
+                train = self._build(instrument, modes, properties)
+                if path is not None:
+                    self._save(path, train)
+            self._trains[key] = train
+        train = self._trains[key]
+        return copy.deepcopy(train) if copy_train else train
+
+    __call__ = get
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Transport backends for publishing packages.
+
+A `Backend` connects to a package server. Each call to ``connect()`` returns
+a context manager yielding a `Session`, which offers the few file operations
+needed for publishing (open, put, stat, rename, listdir, remove, sha256).
+Paths are relative to the server's package root, i.e.
+``"<folder>/<zip_name>"`` as in ``server_folders.yaml``.
+
+Two backends are available:
+
+* `SFTPBackend` for the IRDB server (the default in ``irdb.publish``), which
+  keeps one authenticated transport open and opens a new SFTP channel per
+  session.
+* `LocalBackend` for a package mirror in a local folder, with the same
+  ``InstPkgSvr/<folder>/<zip_name>`` layout. Also useful to run and benchmark
+  the upload logic without network access.
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, BinaryIO
+from contextlib import contextmanager
+from abc import ABC, abstractmethod
+
+import paramiko
+
+HOSTNAME = "webspace-access.univie.ac.at"
+SERVER_ROOT = "scopesimu68/html/InstPkgSvr/"
+
+
+class Session(ABC):
+    """File operations on a package server, paths relative to its root."""
+
+    @abstractmethod
+    def open(self, path: str, mode: str = "rb") -> BinaryIO:
+        """Open remote file, mode as for builtin ``open`` (binary only)."""
+
+    @abstractmethod
+    def stat(self, path: str) -> os.stat_result:
+        """Return stat result of remote file, raise FileNotFoundError."""
+
+    @abstractmethod
+    def rename(self, old: str, new: str) -> None:
+        """Rename remote file, replacing `new` if it exists."""
+
+    @abstractmethod
+    def listdir(self, path: str = ".") -> list[str]:
+        """Return names of the entries in remote folder `path`."""
+
+    @abstractmethod
+    def remove(self, path: str) -> None:
+        """Remove remote file, raise FileNotFoundError if not present."""
+
+    def put(self, local_path: Path, path: str) -> None:
+        """Upload local file in one go (no resume, see ``publish``)."""
+        with local_path.open("rb") as src, self.open(path, "wb") as dst:
+            shutil.copyfileobj(src, dst, 2**20)
+
+    def sha256(self, path: str) -> Optional[str]:
+        """Return sha256 of remote file computed on the server, if possible.
+
+        None if the server can't compute it, reading the file back is left
+        to the caller.
+        """
+        return None
+
+
+class Backend(ABC):
+    """Connection to a package server, see module docstring."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    @abstractmethod
+    def connect(self):
+        """Return context manager yielding a new `Session`."""
+
+    def close(self) -> None:
+        """Release any connections kept open by the backend."""
+
+
+class SFTPSession(Session):
+    """Session on one SFTP channel, wrapping ``paramiko.SFTPClient``."""
+
+    def __init__(self, sftp: paramiko.SFTPClient):
+        self.sftp = sftp
+
+    def open(self, path: str, mode: str = "rb") -> BinaryIO:
+        file = self.sftp.open(path, mode)
+        if "r" not in mode:
+            # Don't wait for the server to acknowledge every write
+            file.set_pipelined(True)
+        return file
+
+    def stat(self, path: str):
+        return self.sftp.stat(path)
+
+    def rename(self, old: str, new: str) -> None:
+        try:
+            # Atomic on servers supporting the OpenSSH extension
+            self.sftp.posix_rename(old, new)
+        except OSError:
+            # Plain SFTP rename fails if the target exists
+            try:
+                self.sftp.remove(new)
+            except FileNotFoundError:
+                pass
+            self.sftp.rename(old, new)
+
+    def listdir(self, path: str = ".") -> list[str]:
+        return self.sftp.listdir(path)
+
+    def remove(self, path: str) -> None:
+        self.sftp.remove(path)
+
+    def put(self, local_path: Path, path: str) -> None:
+        self.sftp.put(local_path, path, confirm=True)
+
+    def sha256(self, path: str) -> Optional[str]:
+        # Needs the "check-file" extension, which e.g. OpenSSH lacks
+        try:
+            with self.sftp.open(path, "rb") as file:
+                return file.check("sha256").hex()
+        except OSError as err:
+            logging.debug("No server-side sha256 for %s: %s", path, err)
+            return None
+
+
+class SFTPBackend(Backend):
+    """SFTP server, by default the IRDB server.
+
+    One ``paramiko.Transport`` is connected and authenticated on first use
+    and shared by all sessions (each one a separate SFTP channel), so
+    several sessions can be used concurrently from different threads. The
+    transport is reconnected if it dropped.
+
+    Parameters
+    ----------
+    login : Optional[str]
+        Username.
+    password : str
+        Password.
+    hostname : str, optional
+        The default is the univie server.
+    root : str, optional
+        Package root folder on the server.
+    port : int, optional
+        The default is 22.
+    """
+
+    def __init__(self, login: Optional[str], password: str,
+                 hostname: str = HOSTNAME, root: str = SERVER_ROOT,
+                 port: int = 22):
+        self.login = login
+        self.password = password
+        self.hostname = hostname
+        self.root = root
+        self.port = port
+        self._transport = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        # Connect right away, so wrong credentials are noticed early
+        self._get_transport()
+        return self
+
+    def _get_transport(self) -> paramiko.Transport:
+        with self._lock:
+            if self._transport is None or not self._transport.is_active():
+                if self._transport is not None:
+                    self._transport.close()
+                self._transport = paramiko.Transport((self.hostname,
+                                                      self.port))
+                self._transport.connect(username=self.login,
+                                        password=self.password)
+            return self._transport
+
+    @contextmanager
+    def connect(self):
+        sftp = paramiko.SFTPClient.from_transport(self._get_transport())
+        with sftp:
+            sftp.chdir(self.root)
+            yield SFTPSession(sftp)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._transport is not None:
+                self._transport.close()
+                self._transport = None
+
+
+class LocalSession(Session):
+    """Session on a local folder."""
+
+    def __init__(self, root: Path):
+        self.root = root
+
+    def open(self, path: str, mode: str = "rb") -> BinaryIO:
+        if "r" not in mode:
+            (self.root / path).parent.mkdir(parents=True, exist_ok=True)
+        return (self.root / path).open(mode)
+
+    def stat(self, path: str) -> os.stat_result:
+        return (self.root / path).stat()
+
+    def rename(self, old: str, new: str) -> None:
+        os.replace(self.root / old, self.root / new)
+
+    def listdir(self, path: str = ".") -> list[str]:
+        return sorted(os.listdir(self.root / path))
+
+    def remove(self, path: str) -> None:
+        (self.root / path).unlink()
+
+    def sha256(self, path: str) -> Optional[str]:
+        sha = hashlib.sha256()
+        with (self.root / path).open("rb") as file:
+            while chunk := file.read(2**20):
+                sha.update(chunk)
+        return sha.hexdigest()
+
+
+class LocalBackend(Backend):
+    """Package server in a local folder, e.g. an internal mirror.
+
+    Parameters
+    ----------
+    root : Path
+        Folder corresponding to ``InstPkgSvr`` on the server, packages are
+        stored in its subfolders as listed in ``server_folders.yaml``.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    @contextmanager
+    def connect(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        yield LocalSession(self.root)
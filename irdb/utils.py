@@ -1,41 +1,134 @@
 # -*- coding: utf-8 -*-
 """TBA."""
 
+import os
 from pathlib import Path
+from typing import Any, Iterable, Iterator
+from dataclasses import dataclass
 
 
 PKG_DIR = Path(__file__).parent.parent
+# For local caches (package index, catalog)
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME",
+                                Path.home() / ".cache")) / "irdb"
+# Keys of referenced files in yaml files, compared in lower case
+FILE_KEYS = {"filename", "file_name"}
 
 
 def get_packages():
     """
     Return a dictionary with all packages in the IRDB.
 
+    Packages are taken from the shared catalog (see ``irdb.catalog``), which
+    also holds their files and YAML contents.
+
     Returns
     -------
     pkgs : dict
         {"packge_name" : "path_to_package"}
     """
     # TODO: update docstring for generator
-    for pkg_path in PKG_DIR.iterdir():
-        specials = {"irdb", "docs"}
-        # NOTE: Previously, only folders with a self-named yaml file were
-        #       considered packages by this function. This caused some packages
-        #       to 'slip under the radar' by the tests, and also defeated the
-        #       purpose of test_all_packages_have_a_self_named_yaml.
-        # if (pkg_path / f"{pkg_path.name}.yaml").exists():
-        if (
-            pkg_path.is_dir()
-            and not pkg_path.name.startswith((".", "_"))
-            and pkg_path.name not in specials
-        ):
-            yield pkg_path.name, pkg_path
+    # Imported here to avoid a circular import, the catalog uses this module.
+    from irdb.catalog import get_catalog
+
+    # NOTE: Previously, only folders with a self-named yaml file were
+    #       considered packages by this function. This caused some packages
+    #       to 'slip under the radar' by the tests, and also defeated the
+    #       purpose of test_all_packages_have_a_self_named_yaml.
+    catalog = get_catalog()
+    for pkg_name in catalog:
+        yield pkg_name, catalog.pkg_dir / pkg_name
+
+
+@dataclass(frozen=True)
+class YamlReference:
+    """A reference found in YAML documents, see `iter_references`.
+
+    `kind` is one of:
+
+    - ``"file"``: value of a ``filename`` or ``file_name`` key
+    - ``"bang"``: a ``!ALIAS.key`` string, anywhere
+    - ``"pattern"``: value of a file name format key, e.g.
+      ``filename_format`` or ``filter_file_format``
+
+    `path` is the position of the value, starting with the index of the
+    document, e.g. ``(1, "effects", 3, "kwargs", "filename")``.
+    """
+
+    kind: str
+    value: Any
+    path: tuple
+
+    @property
+    def location(self) -> str:
+        """`path` as a string, e.g. ``"1:effects[3].kwargs.filename"``."""
+        doc_index, *keys = self.path
+        text = "".join(f"[{key}]" if isinstance(key, int) else f".{key}"
+                       for key in keys)
+        return f"{doc_index}:{text.lstrip('.')}"
+
+
+def _is_file_key(key) -> bool:
+    return isinstance(key, str) and key.lower() in FILE_KEYS
+
+
+def _is_pattern_key(key) -> bool:
+    return (isinstance(key, str) and key.lower().endswith("_format")
+            and "file" in key.lower())
+
+
+def iter_references(docs: Iterable) -> Iterator[YamlReference]:
+    """
+    Yield all file, !-string and file name pattern references in `docs`.
+
+    The documents are walked with an explicit stack, one at a time, so
+    `docs` can be a generator like ``yaml.safe_load_all(file)``. References
+    of a mapping are yielded before those nested deeper in it.
+
+    Parameters
+    ----------
+    docs : Iterable
+        The documents of a yaml file.
+
+    Yields
+    ------
+    ref : YamlReference
+    """
+    for doc_index, doc in enumerate(docs):
+        stack = [((doc_index,), doc)]
+        while stack:
+            path, entry = stack.pop()
+            if isinstance(entry, str):
+                if entry.startswith("!"):
+                    yield YamlReference("bang", entry, path)
+                continue
+            if isinstance(entry, list):
+                stack.extend((path + (index,), item) for index, item
+                             in reversed(list(enumerate(entry))))
+                continue
+            if not isinstance(entry, dict):
+                continue
+
+            for key, value in entry.items():
+                if _is_file_key(key) and isinstance(value, list):
+                    for index, item in enumerate(value):
+                        yield YamlReference("file", item,
+                                            path + (key, index))
+                elif _is_file_key(key):
+                    yield YamlReference("file", value, path + (key,))
+                elif _is_pattern_key(key) and isinstance(value, str):
+                    yield YamlReference("pattern", value, path + (key,))
+            stack.extend((path + (key,), value) for key, value
+                         in reversed(entry.items()))
 
 
 def recursive_filename_search(entry):
     """
     Search through a yaml dict looking for the keyword "filename".
 
+    Lists of filenames are flattened. See `iter_references` for all kinds
+    of references and their positions.
+
     Parameters
     ----------
     entry : dict
@@ -47,16 +140,5 @@ def recursive_filename_search(entry):
         List of all filenames found
 
     """
-    fnames = []
-    if isinstance(entry, list):
-        for item in entry:
-            fnames.extend(recursive_filename_search(item))
-
-    if isinstance(entry, dict):
-        for key, value in entry.items():
-            if key.lower() in {"filename", "file_name"}:
-                fnames.append(value)
-            elif isinstance(value, (dict, list)):
-                fnames.extend(recursive_filename_search(value))
-
-    return fnames
+    return [ref.value for ref in iter_references([entry])
+            if ref.kind == "file"]